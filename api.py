@@ -1,107 +1,436 @@
-from flask import Flask, request, jsonify
-from database import Session, Appointment, Client
+import argparse
+import base64
+import csv
+import functools
+import io
+import json
+import logging
+import signal
+import socket
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from flask import Flask, Response, request, jsonify
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from database import engine, config, Appointment, Client, get_last_change, get_data_version
+from change_feed import change_feed, read_changes, is_behind_log, Reset
+from appointment_service import (save_appointment, remove_appointment, apply_batch, find_overlaps,
+                                 format_minute, default_duration, AppointmentConflict, AppointmentNotFound)
+from sqlalchemy import select, tuple_
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
+from sqlalchemy.orm import scoped_session, sessionmaker, joinedload
+from datetime import datetime, timezone
+
+def setup_logger():
+    logger = logging.getLogger('api')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'api.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
 
 app = Flask(__name__)
 
+# Una sesión por hilo del servidor; se libera al terminar cada pedido
+Session = scoped_session(sessionmaker(bind=engine))
+
+# SQLite admite un solo escritor: las escrituras de la API se hacen de a una
+# (sin esperas de busy_timeout entre hilos), las lecturas siguen en paralelo con WAL
+write_lock = threading.Lock()
+
+@app.teardown_appcontext
+def remove_session(exception=None):
+    Session.remove()
+
+def serialized_write(view):
+    """Ejecuta la vista con write_lock tomado y avisa del cambio a los streams de /changes"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            with write_lock:
+                return view(*args, **kwargs)
+        finally:
+            change_feed.notify()
+    return wrapper
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+APPOINTMENT_FIELDS = ('id', 'date', 'time', 'duration', 'client_id', 'status', 'price', 'confirmed', 'comment')
+CLIENT_FIELDS = ('id', 'lastname', 'name', 'address', 'phone', 'dog_name', 'breed', 'comments')
+
+# Filas que trae cada vuelta del cursor en las exportaciones
+EXPORT_CHUNK_SIZE = 1000
+
+# Respuestas de los listados guardadas para la versión de datos actual
+RESPONSE_CACHE_SIZE = 128
+
+# Operaciones aceptadas en un solo POST /appointments/batch
+MAX_BATCH_SIZE = 1000
+
+# Segundos sin cambios tras los que un stream de /changes manda un comentario,
+# para que los proxies no corten la conexión y se detecten los clientes que se fueron
+SSE_HEARTBEAT_S = 15
+# Espera que se le sugiere al navegador (EventSource) antes de reconectarse
+SSE_RETRY_MS = 2000
+
+# Campo del JSON: (columna de Appointment, conversión)
+APPOINTMENT_COLUMNS = {
+    'date': ('date', lambda value: datetime.strptime(value, '%Y-%m-%d').date()),
+    'time': ('time', lambda value: datetime.strptime(value, '%H:%M').time()),
+    'duration': ('duration', lambda value: None if value is None else parse_duration(value)),
+    'client_id': ('client_id', lambda value: value),
+    'status': ('status', lambda value: value),
+    'price': ('price', lambda value: value),
+    'confirmed': ('confirmed', lambda value: value),
+    'comment': ('appoint_comment', lambda value: value),
+}
+
+# Campos que se pueden omitir al crear un turno (la duración sale del servicio)
+OPTIONAL_APPOINTMENT_FIELDS = ('duration',)
+
+def parse_duration(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError(f"Duración inválida: {value}")
+    return value
+
+def appointment_values(data, partial=False):
+    """
+    Convierte el JSON recibido en los valores de columna de Appointment. Con
+    partial=True solo se convierten los campos presentes (ediciones parciales).
+    Si viene el servicio sin duración, la duración es la del servicio (como en
+    el diálogo del calendario), también al editar un turno que ya la tenía.
+    """
+    values = {
+        column: convert(data[field])
+        for field, (column, convert) in APPOINTMENT_COLUMNS.items()
+        if field in data or not (partial or field in OPTIONAL_APPOINTMENT_FIELDS)
+    }
+    if 'status' in values and 'duration' not in values:
+        values['duration'] = default_duration(values['status'])
+    return values
+
+def appointment_to_dict(appointment, fields=APPOINTMENT_FIELDS, include_client=False):
+    """
+    Convierte un turno en el JSON de la API, con solo los campos pedidos. Con
+    include_client se agrega el cliente en 'client' (tiene que venir ya cargado)
+    """
+    values = {
+        'id': appointment.id,
+        'date': appointment.date.strftime('%Y-%m-%d'),
+        'time': appointment.time.strftime('%H:%M'),
+        'duration': appointment.duration,
+        'client_id': appointment.client_id,
+        'status': appointment.status,
+        'price': appointment.price,
+        'confirmed': appointment.confirmed,
+        'comment': appointment.appoint_comment
+    }
+    result = {field: values[field] for field in fields}
+    if include_client:
+        result['client'] = client_to_dict(appointment.client) if appointment.client else None
+    return result
+
+def parse_include(value):
+    """`include=client` embebe el cliente de cada turno"""
+    if not value:
+        return False
+    if value != 'client':
+        raise ValueError(f"include desconocido: {value}")
+    return True
+
+def appointment_query(session, include_client):
+    query = session.query(Appointment)
+    if include_client:
+        # El cliente viene en la misma consulta (LEFT OUTER JOIN), no una consulta por turno
+        query = query.options(joinedload(Appointment.client))
+    return query
+
+def parse_fields(value):
+    if not value:
+        return APPOINTMENT_FIELDS
+    fields = tuple(field.strip() for field in value.split(',') if field.strip())
+    unknown = [field for field in fields if field not in APPOINTMENT_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    return fields
+
+def parse_bool(value):
+    if value.lower() in ('1', 'true'):
+        return True
+    if value.lower() in ('0', 'false'):
+        return False
+    raise ValueError(f"Valor booleano inválido: {value}")
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit tiene que ser mayor que cero")
+    return min(limit, MAX_PAGE_SIZE)
+
+def encode_cursor(appointment):
+    """El cursor es la posición (fecha, hora, id) del último turno devuelto, opaca para el cliente"""
+    position = [appointment.date.isoformat(), appointment.time.isoformat(), appointment.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        date, time, appointment_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.strptime(date, '%Y-%m-%d').date(),
+                datetime.strptime(time, '%H:%M:%S').time(), int(appointment_id))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {e}")
+
+def appointment_filters(args):
+    """
+    Condiciones de los parámetros date_from, date_to, client_id, confirmed y
+    status. Las fechas son rangos sobre ix_appointments_date_time (o sobre
+    ix_appointments_client_id_date si se filtra por cliente).
+    """
+    conditions = []
+    if 'date_from' in args:
+        conditions.append(Appointment.date >= datetime.strptime(args['date_from'], '%Y-%m-%d').date())
+    if 'date_to' in args:
+        conditions.append(Appointment.date <= datetime.strptime(args['date_to'], '%Y-%m-%d').date())
+    if 'client_id' in args:
+        conditions.append(Appointment.client_id == int(args['client_id']))
+    if 'confirmed' in args:
+        conditions.append(Appointment.confirmed == parse_bool(args['confirmed']))
+    if 'status' in args:
+        conditions.append(Appointment.status == args['status'])
+    return conditions
+
+class ResponseCache:
+    """
+    Respuestas ya armadas por URL, válidas mientras no cambie la versión de
+    datos: cuando aparece una versión nueva se descarta todo.
+    """
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, version, key):
+        with self.lock:
+            if version != self.version:
+                return None
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, version, key, entry):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+response_cache = ResponseCache()
+
+def current_data_version():
+    """Versión y fecha del último cambio, con una sola consulta a change_log (sin el ORM)"""
+    session = Session()
+    try:
+        version, changed_at = get_last_change(session.connection())
+    finally:
+        session.close()
+    if changed_at is not None:
+        # current_timestamp de SQLite está en UTC
+        changed_at = datetime.strptime(str(changed_at)[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return version, changed_at
+
+def conditional(cache=False):
+    """
+    Agrega ETag (versión de change_log) y Last-Modified a las respuestas 200 y
+    contesta 304 a If-None-Match / If-Modified-Since sin ejecutar la vista.
+    Con cache=True la respuesta se guarda en response_cache para la URL completa.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version, changed_at = current_data_version()
+            etag = f"v{version}"
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = (changed_at is not None and request.if_modified_since is not None
+                                and changed_at <= request.if_modified_since)
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                key = request.full_path
+                cached = response_cache.get(version, key) if cache else None
+                if cached is not None:
+                    body, next_cursor = cached
+                    response = Response(body, mimetype='application/json')
+                    if next_cursor:
+                        response.headers['X-Next-Cursor'] = next_cursor
+                else:
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if cache:
+                        response_cache.put(version, key, (response.get_data(), response.headers.get('X-Next-Cursor')))
+
+            response.set_etag(etag)
+            if changed_at is not None:
+                response.last_modified = changed_at
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/appointments', methods=['GET'])
+@conditional(cache=True)
 def get_appointments():
+    """
+    Turnos ordenados por fecha, hora e id, de a `limit` por página (100 por
+    defecto, 1000 como máximo). Si hay más, el header X-Next-Cursor trae el
+    valor de `cursor` para pedir la página siguiente. `fields` elige los
+    campos de cada turno (separados por coma) e `include=client` agrega los
+    datos del cliente.
+    """
+    try:
+        conditions = appointment_filters(request.args)
+        limit = parse_limit(request.args.get('limit'))
+        fields = parse_fields(request.args.get('fields'))
+        include_client = parse_include(request.args.get('include'))
+        if 'cursor' in request.args:
+            # Paginación por posición: no recorre las páginas anteriores como OFFSET
+            conditions.append(tuple_(Appointment.date, Appointment.time, Appointment.id)
+                              > tuple_(*decode_cursor(request.args['cursor'])))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     session = Session()
-    appointments = session.query(Appointment).all()
-    session.close()
-    return jsonify([{
-        'id': appt.id,
-        'date': appt.date.strftime('%Y-%m-%d'),
-        'time': appt.time.strftime('%H:%M'),
-        'client_id': appt.client_id,
-        'status': appt.status,
-        'price': appt.price,
-        'confirmed': appt.confirmed,
-        'comment': appt.appoint_comment
-    } for appt in appointments])
+    try:
+        appointments = (appointment_query(session, include_client)
+                        .filter(*conditions)
+                        .order_by(Appointment.date, Appointment.time, Appointment.id)
+                        .limit(limit + 1)
+                        .all())
+    finally:
+        session.close()
+
+    response = jsonify([appointment_to_dict(appt, fields, include_client) for appt in appointments[:limit]])
+    if len(appointments) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(appointments[limit - 1])
+    return response
+
+@app.route('/appointments/overlaps', methods=['GET'])
+@conditional(cache=True)
+def get_overlaps():
+    """
+    Turnos superpuestos entre date_from y date_to (inclusive): un elemento
+    {date, start, end, ids} por cada grupo de turnos que se pisan en un día.
+    """
+    try:
+        start = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date()
+    except KeyError as e:
+        return jsonify({'error': f"Falta el parámetro {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    session = Session()
+    try:
+        overlaps = find_overlaps(session, start, end)
+    finally:
+        session.close()
+    return jsonify([{'date': overlap.date.strftime('%Y-%m-%d'), 'start': format_minute(overlap.start_minute),
+                     'end': format_minute(overlap.end_minute), 'ids': overlap.appointment_ids}
+                    for overlap in overlaps])
 
 @app.route('/appointments/<int:appointment_id>', methods=['GET'])
+@conditional()
 def get_appointment(appointment_id):
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        include_client = parse_include(request.args.get('include'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     session = Session()
-    appointment = session.query(Appointment).get(appointment_id)
+    appointment = appointment_query(session, include_client).filter(Appointment.id == appointment_id).one_or_none()
     session.close()
     if appointment:
-        return jsonify({
-            'id': appointment.id,
-            'date': appointment.date.strftime('%Y-%m-%d'),
-            'time': appointment.time.strftime('%H:%M'),
-            'client_id': appointment.client_id,
-            'status': appointment.status,
-            'price': appointment.price,
-            'confirmed': appointment.confirmed,
-            'comment': appointment.appoint_comment
-        })
+        return jsonify(appointment_to_dict(appointment, fields, include_client))
     return jsonify({'error': 'Appointment not found'}), 404
 
 @app.route('/appointments', methods=['POST'])
+@serialized_write
 def create_appointment():
     data = request.json
+    try:
+        values = appointment_values(data)
+    except KeyError as e:
+        return jsonify({'error': f"Falta el campo {e.args[0]}"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f"Turno inválido: {e}"}), 400
     session = Session()
-    new_appointment = Appointment(
-        date=datetime.strptime(data['date'], '%Y-%m-%d').date(),
-        time=datetime.strptime(data['time'], '%H:%M').time(),
-        client_id=data['client_id'],
-        status=data['status'],
-        price=data['price'],
-        confirmed=data['confirmed'],
-        appoint_comment=data['comment']
-    )
-    session.add(new_appointment)
     try:
-        session.commit()
+        # Pasar por appointment_service para que se actualice el caché de turnos
+        save_appointment(session, values)
     except IntegrityError:
         session.rollback()
         return jsonify({'error': 'Integrity error'}), 400
+    except AppointmentConflict as e:
+        return jsonify({'error': str(e), 'conflict_id': e.conflict_id}), 409
     finally:
         session.close()
     return jsonify({'message': 'Appointment created successfully'}), 201
 
 @app.route('/appointments/<int:appointment_id>', methods=['PUT'])
+@serialized_write
 def update_appointment(appointment_id):
     data = request.json
+    try:
+        values = appointment_values(data)
+    except KeyError as e:
+        return jsonify({'error': f"Falta el campo {e.args[0]}"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f"Turno inválido: {e}"}), 400
     session = Session()
-    appointment = session.query(Appointment).get(appointment_id)
-    if not appointment:
-        session.close()
+    try:
+        save_appointment(session, values, appointment_id)
+    except AppointmentNotFound:
         return jsonify({'error': 'Appointment not found'}), 404
-
-    appointment.date = data['date']
-    appointment.time = data['time']
-    appointment.client_id = data['client_id']
-    appointment.status = data['status']
-    appointment.price = data['price']
-    appointment.confirmed = data['confirmed']
-    appointment.appoint_comment = data['comment']
-    
-    session.commit()
-    session.close()
+    except AppointmentConflict as e:
+        return jsonify({'error': str(e), 'conflict_id': e.conflict_id}), 409
+    finally:
+        session.close()
     return jsonify({'message': 'Appointment updated successfully'})
 
 @app.route('/appointments/<int:appointment_id>', methods=['DELETE'])
+@serialized_write
 def delete_appointment(appointment_id):
     session = Session()
-    appointment = session.query(Appointment).get(appointment_id)
-    if not appointment:
+    try:
+        changes = remove_appointment(session, appointment_id)
+    finally:
         session.close()
+    if not changes.deleted:
         return jsonify({'error': 'Appointment not found'}), 404
-
-    session.delete(appointment)
-    session.commit()
-    session.close()
     return jsonify({'message': 'Appointment deleted successfully'})
 
-@app.route('/clients', methods=['GET'])
-def get_clients():
-    session = Session()
-    clients = session.query(Client).all()
-    session.close()
-    return jsonify([{
+def client_to_dict(client):
+    return {
         'id': client.id,
         'lastname': client.lastname,
         'name': client.name,
@@ -110,7 +439,367 @@ def get_clients():
         'dog_name': client.dog_name,
         'breed': client.breed,
         'comments': client.comments
-    } for client in clients])
+    }
+
+BATCH_STATUS = {'created': 201, 'updated': 200, 'deleted': 200, 'not_found': 404, 'conflict': 409, 'error': 400}
+
+def batch_operation(item):
+    """Convierte un elemento del lote en la operación (op, id, valores) de apply_batch"""
+    op = item.get('op')
+    if op == 'create':
+        return 'create', None, appointment_values(item['data'])
+    if op == 'update':
+        values = appointment_values(item['data'], partial=True)
+        if not values:
+            raise ValueError("La edición no tiene campos")
+        return 'update', int(item['id']), values
+    if op == 'delete':
+        return 'delete', int(item['id']), None
+    raise ValueError(f"Operación desconocida: {op}")
+
+@app.route('/appointments/batch', methods=['POST'])
+@serialized_write
+def batch_appointments():
+    """
+    Aplica una lista de operaciones en una sola transacción:
+        {"op": "create", "data": {...turno...}}
+        {"op": "update", "id": 5, "data": {...campos a cambiar...}}
+        {"op": "delete", "id": 5}
+    Devuelve un resultado por operación ({index, op, status, id, error}) con
+    200 si todas se aplicaron o 207 si alguna falló.
+    """
+    items = request.json
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Se espera una lista de operaciones'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Máximo {MAX_BATCH_SIZE} operaciones por lote'}), 413
+
+    results = [None] * len(items)
+    operations, positions = [], []
+    for index, item in enumerate(items):
+        try:
+            operations.append(batch_operation(item))
+            positions.append(index)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            results[index] = {'index': index, 'op': item.get('op') if isinstance(item, dict) else None,
+                              'status': 400, 'error': f"Operación inválida: {e}"}
+
+    if operations:
+        session = Session()
+        try:
+            batch_results, _ = apply_batch(session, operations)
+        finally:
+            session.close()
+        for index, (op, _, _), result in zip(positions, operations, batch_results):
+            results[index] = {'index': index, 'op': op, 'status': BATCH_STATUS[result.status], 'id': result.appointment_id}
+            if result.error:
+                results[index]['error'] = result.error
+
+    failed = any(result['status'] >= 400 for result in results)
+    return jsonify({'results': results}), 207 if failed else 200
+
+@app.route('/clients', methods=['GET'])
+@conditional(cache=True)
+def get_clients():
+    session = Session()
+    clients = session.query(Client).all()
+    session.close()
+    return jsonify([client_to_dict(client) for client in clients])
+
+def export_rows(statement, to_dict):
+    """
+    Recorre statement con un cursor del lado del servidor, de a
+    EXPORT_CHUNK_SIZE filas, sin armar la lista completa en memoria
+    """
+    session = Session()
+    try:
+        result = session.execute(statement.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        for partition in result.partitions():
+            yield [to_dict(row) for row in partition]
+    finally:
+        session.close()
+
+def ndjson_chunks(chunks):
+    for rows in chunks:
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows)
+
+def csv_chunks(chunks, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Si no hubo filas todavía queda el encabezado
+    if buffer.getvalue():
+        yield buffer.getvalue()
+
+def export_response(name, statement, to_dict, fields):
+    """
+    Respuesta en streaming (transfer-encoding chunked) en NDJSON (por defecto)
+    o CSV según ?format=, con uso de memoria constante sea cual sea el tamaño de la tabla
+    """
+    export_format = request.args.get('format', 'ndjson')
+    chunks = export_rows(statement, to_dict)
+    if export_format == 'ndjson':
+        return Response(ndjson_chunks(chunks), mimetype='application/x-ndjson')
+    if export_format == 'csv':
+        response = Response(csv_chunks(chunks, fields), mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename={name}.csv'
+        return response
+    chunks.close()
+    return jsonify({'error': f"Formato desconocido: {export_format}"}), 400
+
+@app.route('/export/appointments', methods=['GET'])
+def export_appointments():
+    statement = select(Appointment.__table__).order_by(Appointment.id)
+    return export_response('appointments', statement, appointment_to_dict, APPOINTMENT_FIELDS)
+
+@app.route('/export/clients', methods=['GET'])
+def export_clients():
+    statement = select(Client.__table__).order_by(Client.id)
+    return export_response('clients', statement, client_to_dict, CLIENT_FIELDS)
+
+def parse_version(value):
+    version = int(value)
+    if version < 0:
+        raise ValueError("La versión no puede ser negativa")
+    return version
+
+@app.route('/changes', methods=['GET'])
+def get_changes():
+    """
+    Cambios de turnos y clientes posteriores a la versión `since` (a lo sumo
+    `limit`). `version` es el valor de `since` para el próximo pedido y `more`
+    indica si quedaron cambios sin devolver. Sin `since` solo se devuelve la
+    versión actual, para empezar a seguir los cambios desde ahí. Si esos
+    cambios ya no están en el registro (o se restauró un backup) responde 410:
+    hay que volver a leer todo.
+    """
+    try:
+        since = parse_version(request.args['since']) if 'since' in request.args else None
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    session = Session()
+    try:
+        connection = session.connection()
+        version = get_data_version(connection)
+        if since is None:
+            return jsonify({'version': version, 'more': False, 'changes': []})
+        if is_behind_log(connection, since, version):
+            return jsonify({'error': "Los cambios pedidos ya no están disponibles", 'version': version}), 410
+        changes = read_changes(connection, since, limit + 1)
+    finally:
+        session.close()
+
+    more = len(changes) > limit
+    changes = changes[:limit]
+    next_version = changes[-1].version if changes else version
+    # Los cambios ya vienen en JSON: se unen sin volver a serializarlos
+    body = (f'{{"version": {next_version}, "more": {json.dumps(more)}, '
+            f'"changes": [{", ".join(change.data for change in changes)}]}}')
+    return Response(body, mimetype='application/json')
+
+def sse_message(change):
+    if isinstance(change, Reset):
+        return f"id: {change.version}\nevent: reset\ndata: {json.dumps({'version': change.version})}\n\n"
+    return f"id: {change.version}\nevent: change\ndata: {change.data}\n\n"
+
+def change_events(subscription, since):
+    """
+    Eventos SSE de una suscripción: primero los cambios posteriores a `since`
+    leídos de la base, después los que reparte change_feed. Cada evento lleva
+    su versión como id, así el navegador se reconecta con Last-Event-ID sin
+    perder ni repetir cambios.
+    """
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        last_version = subscription.version
+        if since is not None:
+            last_version = since
+            while True:
+                changes = change_feed.read(last_version, EXPORT_CHUNK_SIZE)
+                if isinstance(changes, Reset):
+                    yield sse_message(changes)
+                    last_version = changes.version
+                    break
+                if not changes:
+                    break
+                yield ''.join(sse_message(change) for change in changes)
+                last_version = changes[-1].version
+
+        while True:
+            changes = subscription.get(timeout=SSE_HEARTBEAT_S)
+            if changes is None:
+                break
+            if isinstance(changes, Reset):
+                last_version = changes.version
+                yield sse_message(changes)
+            elif changes:
+                # La cola puede traer cambios ya enviados al ponerse al día
+                pending = [change for change in changes if change.version > last_version]
+                if pending:
+                    last_version = pending[-1].version
+                    yield ''.join(sse_message(change) for change in pending)
+            else:
+                yield ": ping\n\n"
+    finally:
+        subscription.cancel()
+
+@app.route('/changes/stream', methods=['GET'])
+def stream_changes():
+    """
+    Server-Sent Events con los cambios de turnos y clientes (evento `change`,
+    con el mismo JSON que GET /changes) a medida que ocurren. Con el
+    encabezado Last-Event-ID o el parámetro `since` empieza enviando los
+    cambios posteriores a esa versión. El evento `reset` avisa que hay que
+    volver a leer todo.
+    """
+    try:
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        since = parse_version(since) if since is not None else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    subscription = change_feed.subscribe()
+    if subscription is None:
+        return jsonify({'error': "Demasiados streams abiertos"}), 503
+    response = Response(change_events(subscription, since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Respuestas que quedan abiertas: ThreadPoolWSGIServer las atiende fuera del pool
+STREAM_PATHS = ('/changes/stream',)
+
+class RequestHandler(WSGIRequestHandler):
+    # Una conexión por pedido: con keep-alive un cliente inactivo ocuparía un hilo del pool
+    protocol_version = "HTTP/1.0"
+    # True cuando el pedido pasa a un hilo propio (ThreadPoolWSGIServer.detach_stream)
+    detached = False
+
+    def run_wsgi(self):
+        detach_stream = getattr(self.server, 'detach_stream', None)
+        if detach_stream is not None and not self.detached and urlsplit(self.path).path in STREAM_PATHS:
+            self.detached = True
+            detach_stream(self)
+            return
+        super().run_wsgi()
+
+    def finish(self):
+        # Un pedido pasado a otro hilo se cierra cuando termina su stream
+        if not self.detached:
+            super().finish()
+
+    def log_request(self, code='-', size='-'):
+        logger.info(f"{self.address_string()} {self.requestline} {code}")
+
+
+class ThreadPoolWSGIServer(BaseWSGIServer):
+    """
+    Servidor WSGI de Werkzeug que atiende cada conexión en un pool de `workers`
+    hilos (ThreadingMixIn crearía un hilo por conexión, sin límite).
+    Los pedidos de STREAM_PATHS, que quedan abiertos, siguen en un hilo propio
+    para no ocupar el pool (change_feed limita cuántos hay).
+    server_close espera a que terminen los pedidos en curso y corta los streams.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app, handler=RequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.streams = {}  # socket -> RequestHandler de cada stream abierto
+        self.streams_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_in_worker, request, client_address)
+
+    def process_request_in_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.streams_lock:
+                handler = self.streams.get(request)
+            if handler is not None:
+                # El stream sigue en su hilo cuando el worker ya soltó el pedido
+                threading.Thread(target=self.run_stream, args=(handler,), name='api-stream', daemon=True).start()
+            else:
+                self.shutdown_request(request)
+
+    def detach_stream(self, handler):
+        with self.streams_lock:
+            self.streams[handler.request] = handler
+
+    def run_stream(self, handler):
+        try:
+            handler.run_wsgi()
+        except (ConnectionError, socket.timeout) as e:
+            handler.connection_dropped(e)
+        except Exception:
+            self.handle_error(handler.request, handler.client_address)
+        finally:
+            handler.detached = False
+            handler.finish()
+            with self.streams_lock:
+                self.streams.pop(handler.request, None)
+            self.shutdown_request(handler.request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+        with self.streams_lock:
+            streams = list(self.streams)
+        for request in streams:
+            # La próxima escritura del stream falla y su hilo termina
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def serve(host=None, port=None, workers=None):
+    """
+    Sirve la API con ThreadPoolWSGIServer hasta recibir Ctrl+C o SIGTERM;
+    al cerrar termina los pedidos en curso y libera las conexiones.
+    """
+    settings = config['api']
+    host = host or settings['host']
+    port = port or int(settings['port'])
+    workers = workers or int(settings['workers'])
+    server = ThreadPoolWSGIServer(host, port, app, workers)
+
+    def stop(signum, frame):
+        logger.info(f"Señal {signum} recibida, deteniendo la API")
+        # shutdown() espera a que termine serve_forever: se llama desde otro hilo
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    logger.info(f"API escuchando en http://{host}:{port} con {workers} hilos")
+    print(f"API escuchando en http://{host}:{port} con {workers} hilos (Ctrl+C para detener)")
+    # serve_forever llama a server_close al salir, también con Ctrl+C
+    server.serve_forever()
+    change_feed.close()
+    engine.dispose()
+    logger.info("API detenida")
+
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    parser = argparse.ArgumentParser(description="API REST de TurnoCan")
+    subcommands = parser.add_subparsers(dest='command')
+    serve_parser = subcommands.add_parser('serve', help="servidor multihilo (sección 'api' de la configuración)")
+    serve_parser.add_argument('--host')
+    serve_parser.add_argument('--port', type=int)
+    serve_parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port, args.workers)
+    else:
+        # Sin subcomando: servidor de desarrollo de Flask, como antes
+        app.run(debug=True)
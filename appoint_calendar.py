@@ -4,21 +4,28 @@ import random
 import string
 
 from PyQt5 import QtWidgets, QtCore, QtGui, QtPrintSupport
-from sqlalchemy import extract
 from database import Session, Client, Appointment, Breed
+from appointment_service import (save_appointment, set_confirmed, shift_appointment_time, remove_appointment,
+                                 default_duration, AppointmentConflict)
+from appointment_cache import appointment_cache
+from recurrence import expand_recurring
+from slot_finder import slot_finder
+from client_index import client_index
 
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit, QCalendarWidget,
-    QCheckBox, QComboBox, QSlider, QTimeEdit, QListWidget, QDialog, QDialogButtonBox,
-    QTextEdit, QScrollArea, QFrame, QListWidgetItem, QInputDialog, QGridLayout, QMessageBox,
-    QSplitter, QSplitterHandle, QDateEdit, QTableWidget, QTableWidgetItem, QHeaderView, QToolButton,
-    QSystemTrayIcon
+    QCheckBox, QComboBox, QSlider, QTimeEdit, QDialog, QDialogButtonBox,
+    QTextEdit, QScrollArea, QFrame, QInputDialog, QGridLayout, QMessageBox,
+    QSplitter, QSplitterHandle, QDateEdit, QHeaderView,
+    QSystemTrayIcon, QListView, QTableView, QSpinBox, QCompleter
 )
 from PyQt5.QtCore import Qt, QTime, QDate, QPoint, QSize, QTimer
-from PyQt5.QtGui import QIcon, QTextCharFormat, QColor, QFont, QDoubleValidator, QPainter, QPen
+from PyQt5.QtGui import (QIcon, QTextCharFormat, QColor, QFont, QDoubleValidator, QPainter, QPen,
+                         QStandardItemModel, QStandardItem)
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
 from logging.handlers import RotatingFileHandler
 from background_tasks import BackgroundTaskManager
+from appointment_day_view import AppointmentDayModel, AppointmentCardDelegate, ConfirmDelegate, ActionsDelegate
 
 def setup_logger():
     logger = logging.getLogger('appoint_calendar')
@@ -165,17 +172,33 @@ class AppointmentCalendarWidget(QWidget):
         search_layout.addWidget(self.search_input)
         appointment_layout.addLayout(search_layout)
         
-        self.appointment_list = QListWidget()
-        self.appointment_table = QTableWidget()
-        self.appointment_table.setColumnCount(9)
-        self.appointment_table.setHorizontalHeaderLabels(["Hora", "Cliente", "Dirección", "Teléfono", "Mascota", "Servicio", "Precio", "Confirmado", "Acciones"])
+        # Lista y tabla comparten el mismo modelo; los controles de cada turno
+        # los pintan los delegates, así solo cuestan las filas visibles
+        self.appointment_model = AppointmentDayModel(self)
+
+        self.appointment_list = QListView()
+        self.appointment_list.setModel(self.appointment_model)
+        self.appointment_list.setModelColumn(0)
+        self.appointment_list.setUniformItemSizes(True)
+        self.appointment_list.setSelectionMode(QListView.NoSelection)
+        self.appointment_list.setMouseTracking(True)
+        self.card_delegate = AppointmentCardDelegate(self.appointment_list)
+        self.appointment_list.setItemDelegate(self.card_delegate)
+
+        self.appointment_table = QTableView()
+        self.appointment_table.setModel(self.appointment_model)
+        self.confirm_delegate = ConfirmDelegate(self.appointment_table)
+        self.actions_delegate = ActionsDelegate(self.appointment_table)
+        self.appointment_table.setItemDelegateForColumn(AppointmentDayModel.CONFIRMED_COLUMN, self.confirm_delegate)
+        self.appointment_table.setItemDelegateForColumn(AppointmentDayModel.ACTIONS_COLUMN, self.actions_delegate)
+        self.appointment_table.verticalHeader().setDefaultSectionSize(30)
         self.appointment_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.appointment_table.horizontalHeader().setSectionResizeMode(8, QHeaderView.Fixed)  # Fijar el ancho de la columna de acciones
         self.appointment_table.setColumnWidth(8, 70)  # Ajustar el ancho de la columna de acciones
-        self.appointment_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.appointment_table.setEditTriggers(QTableView.NoEditTriggers)
         self.appointment_table.setAlternatingRowColors(True)
         self.appointment_table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #ffffff;
                 alternate-background-color: #f2f2f2;
                 gridline-color: #d3d3d3;
@@ -186,18 +209,26 @@ class AppointmentCalendarWidget(QWidget):
                 padding: 4px;
                 font-weight: bold;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #a0a0a0;
                 color: white;
             }
         """)
+
+        for delegate in (self.card_delegate, self.actions_delegate):
+            delegate.edit_requested.connect(self.edit_appointment)
+            delegate.delete_requested.connect(self.delete_appointment)
+        for delegate in (self.card_delegate, self.confirm_delegate):
+            delegate.confirm_toggled.connect(
+                lambda appointment_id, checked: self.toggle_confirmation(appointment_id, Qt.Checked if checked else Qt.Unchecked)
+            )
         self.appointment_table.hide()  # Inicialmente oculta
         appointment_layout.addWidget(self.appointment_list)
         appointment_layout.addWidget(self.appointment_table)
         self.splitter.addWidget(appointment_widget)
 
         # Guardar las anchuras originales de las columnas
-        self.original_column_widths = [self.appointment_table.columnWidth(i) for i in range(self.appointment_table.columnCount())]
+        self.original_column_widths = [self.appointment_table.columnWidth(i) for i in range(self.appointment_model.columnCount())]
 
         # Configurar el splitter
         self.splitter.setStyleSheet("""
@@ -405,19 +436,13 @@ class AppointmentCalendarWidget(QWidget):
             background-color: #45a049;
             color: white;
         }
-        QListWidget {
+        QListView {
             border: 1px solid #ced4da;
             border-radius: 10px;
             padding: 10px;
             background-color: #ffffff;
             font-size: 14px;
         }
-        QListWidget::item:nth-child(even) {
-            background-color: #f9f9f9;
-        }
-        QListWidget::item:nth-child(odd) {
-            background-color: #e9ecef;
-        }
         QCheckBox {
             spacing: 5px;
             font-size: 14px;
@@ -537,10 +562,9 @@ class AppointmentCalendarWidget(QWidget):
             self.appointment_list.show()
             self.appointment_table.hide()
             # Guardar las anchuras actuales de las columnas
-            self.original_column_widths = [self.appointment_table.columnWidth(i) for i in range(self.appointment_table.columnCount())]
+            self.original_column_widths = [self.appointment_table.columnWidth(i) for i in range(self.appointment_model.columnCount())]
             self.appointment_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
             self.appointment_table.horizontalHeader().setSectionResizeMode(8, QHeaderView.Fixed)
-        self.load_appointments()
 
     def filter_appointments(self):
         """Filtra los turnos según el texto de búsqueda"""
@@ -558,52 +582,26 @@ class AppointmentCalendarWidget(QWidget):
 
     def load_appointments(self, reload_data=True):
         """Carga los turnos para la fecha seleccionada"""
-        self.appointment_list.clear()
-        self.appointment_table.setRowCount(0)
         selected_date = self.calendar.selectedDate().toPyDate()
         logger.info(f"Cargando turnos para la fecha: {selected_date}")
         
         if reload_data:
-            session = Session()
-            try:
-                # Usar joinedload para cargar los clientes junto con las citas en una sola consulta
-                # Esto evita el error DetachedInstanceError
-                from sqlalchemy.orm import joinedload
-                query = session.query(Appointment).options(
-                    joinedload(Appointment.client)
-                ).filter(
-                    Appointment.date == selected_date
-                ).order_by(Appointment.time)
-                
-                # Convertir a lista mientras la sesión aún está abierta
-                self.all_appointments = list(query.all())
-            finally:
-                # Asegurarse de que la sesión se cierre incluso si hay un error
-                session.close()
+            # El caché consulta el mes completo una sola vez; los cambios de día
+            # dentro del mismo mes ya no van a la base de datos
+            self.all_appointments = list(appointment_cache.get_day(selected_date))
         
         # Filtrar por búsqueda si hay texto
         filtered_appointments = []
         if self.search_text:
             for appointment in self.all_appointments:
-                # Crear copia local de los datos que necesitamos para evitar accesos tardíos
-                if appointment.client:
-                    client_name = f"{appointment.client.lastname} {appointment.client.name}".lower()
-                    dog_name = appointment.client.dog_name.lower() if appointment.client.dog_name else ""
-                    address = appointment.client.address.lower() if appointment.client.address else ""
-                    phone = appointment.client.phone.lower() if appointment.client.phone else ""
-                    appoint_comment = appointment.appoint_comment.lower() if appointment.appoint_comment else ""
-                    
-                    if (self.search_text in client_name or 
-                        self.search_text in dog_name or 
-                        self.search_text in address or 
-                        self.search_text in phone or
-                        self.search_text in appoint_comment):
-                        filtered_appointments.append(appointment)
+                if appointment.has_client:
+                    fields = [appointment.client_full_name, appointment.client_dog_name, appointment.client_address,
+                              appointment.client_phone, appointment.appoint_comment]
                 else:
                     # Si por alguna razón no hay cliente asociado
-                    appoint_comment = appointment.appoint_comment.lower() if appointment.appoint_comment else ""
-                    if self.search_text in appoint_comment:
-                        filtered_appointments.append(appointment)
+                    fields = [appointment.appoint_comment]
+                if any(self.search_text in field.lower() for field in fields if field):
+                    filtered_appointments.append(appointment)
         else:
             filtered_appointments = self.all_appointments
             
@@ -619,227 +617,62 @@ class AppointmentCalendarWidget(QWidget):
         logger.info(f"Se cargaron {len(filtered_appointments)} turnos para la fecha {selected_date}")
     
     def _display_appointments(self, appointments):
-        """Muestra los turnos en la vista correspondiente (lista o tabla)"""
-        for index, appointment in enumerate(appointments, start=1):
-            if not self.view_toggle_checkbox.isChecked():
-                # Vista de lista
-                item_widget = QWidget()
-                item_layout = QHBoxLayout(item_widget)
-                
-                # Contenido principal del turno
-                content_layout = QVBoxLayout()
-                
-                # Número de orden, hora, fecha, cliente y mascota en una línea
-                time_str = appointment.time.strftime('%H:%M')
-                
-                # Manejar posible ausencia de cliente
-                if appointment.client:
-                    client_name = f"{appointment.client.lastname} {appointment.client.name}"
-                    dog_info = f"{appointment.client.dog_name} ({appointment.client.breed})" if appointment.client.dog_name else ""
-                else:
-                    client_name = "Cliente desconocido"
-                    dog_info = "Sin información"
-                
-                # Destacar horario con color según confirmación
-                if appointment.confirmed:
-                    time_color = "#006400"  # Verde oscuro para confirmados
-                    status = "✓"
-                else:
-                    time_color = "#8B0000"  # Rojo oscuro para no confirmados
-                    status = "✗"
-                
-                time_date_client_info = QLabel(f"<b style='color:{time_color};'>{time_str} {status}</b> - "
-                                              f"<b>{client_name}</b> - "
-                                              f"Perro: <i>{dog_info}</i>")
-                time_date_client_info.setStyleSheet("font-size: 14px; color: #333;")
-                content_layout.addWidget(time_date_client_info)
-                
-                # Dirección y teléfono en una línea
-                if appointment.client:
-                    contact_info = QLabel(f"Dirección: {appointment.client.address} - Tel: {appointment.client.phone}")
-                    contact_info.setStyleSheet("font-size: 13px; color: #555;")
-                    content_layout.addWidget(contact_info)
-                
-                # Precio y comentario
-                if appointment.price or appointment.appoint_comment:
-                    price_str = f"Precio: ${appointment.price}" if appointment.price else ""
-                    comment_str = f"Nota: {appointment.appoint_comment}" if appointment.appoint_comment else ""
-                    separator = " - " if price_str and comment_str else ""
-                    price_comment = QLabel(f"{price_str}{separator}{comment_str}")
-                    price_comment.setStyleSheet("font-size: 13px; color: #555; font-style: italic;")
-                    content_layout.addWidget(price_comment)
-                
-                item_layout.addLayout(content_layout)
-                
-                # Contenedor de botones con layout vertical
-                buttons_container = QWidget()
-                buttons_layout = QVBoxLayout(buttons_container)
-                buttons_layout.setContentsMargins(0, 0, 0, 0)
-                buttons_layout.setSpacing(2)
-                
-                # Botones de acción
-                edit_btn = QPushButton("Editar")
-                edit_btn.setToolTip("Editar Turno")
-                edit_btn.setFixedSize(100, 40)
-                appointment_id = appointment.id
-                edit_btn.clicked.connect(lambda checked=False, id=appointment_id: self.edit_appointment(id))
-                edit_btn.setStyleSheet("""
-                    QPushButton {
-                        background-color: #4CAF50;
-                        color: white;
-                        border-radius: 2px;
-                        font-weight: bold;
-                    }
-                    QPushButton:hover { background-color: #45a049; }
-                """)
-                
-                delete_btn = QPushButton("Eliminar")
-                delete_btn.setToolTip("Eliminar Turno")
-                delete_btn.setFixedSize(100, 40) 
-                delete_btn.clicked.connect(lambda checked=False, id=appointment_id: self.delete_appointment(id))
-                delete_btn.setStyleSheet("""
-                    QPushButton {
-                        background-color: #f44336;
-                        color: white;
-                        border-radius: 2px;
-                        font-weight: bold;
-                    }
-                    QPushButton:hover { background-color: #d32f2f; }
-                """)
-                
-                # Checkbox para confirmar turno
-                confirm_check = QCheckBox("Confirmado")
-                confirm_check.setChecked(appointment.confirmed)
-                confirm_check.stateChanged.connect(lambda state, id=appointment_id: self.toggle_confirmation(id, state))
-                
-                # Agregar widgets al layout de botones
-                top_buttons = QHBoxLayout()
-                top_buttons.addWidget(edit_btn)
-                top_buttons.addWidget(delete_btn)
-                buttons_layout.addLayout(top_buttons)
-                buttons_layout.addWidget(confirm_check)
-                
-                item_layout.addWidget(buttons_container)
-                
-                # Crear y configurar el item de la lista
-                list_item = QListWidgetItem()
-                list_item.setSizeHint(item_widget.sizeHint())
-                self.appointment_list.addItem(list_item)
-                self.appointment_list.setItemWidget(list_item, item_widget)
-                
-                # Alternar colores de fondo
-                if index % 2 == 0:
-                    item_widget.setStyleSheet("background-color: #f8f8f8;")
-            else:
-                # Vista de tabla
-                row_position = self.appointment_table.rowCount()
-                self.appointment_table.insertRow(row_position)
-                
-                self.appointment_table.setItem(row_position, 0, QTableWidgetItem(appointment.time.strftime('%H:%M')))
-                
-                # Comprobar si hay cliente antes de acceder a sus propiedades
-                if appointment.client:
-                    self.appointment_table.setItem(row_position, 1, QTableWidgetItem(f"{appointment.client.lastname} {appointment.client.name}"))
-                    self.appointment_table.setItem(row_position, 2, QTableWidgetItem(appointment.client.address))
-                    self.appointment_table.setItem(row_position, 3, QTableWidgetItem(appointment.client.phone))
-                    self.appointment_table.setItem(row_position, 4, QTableWidgetItem(f"{appointment.client.dog_name} ({appointment.client.breed})"))
-                else:
-                    self.appointment_table.setItem(row_position, 1, QTableWidgetItem("Cliente desconocido"))
-                    self.appointment_table.setItem(row_position, 2, QTableWidgetItem(""))
-                    self.appointment_table.setItem(row_position, 3, QTableWidgetItem(""))
-                    self.appointment_table.setItem(row_position, 4, QTableWidgetItem(""))
-                
-                self.appointment_table.setItem(row_position, 5, QTableWidgetItem(appointment.status or "No especificado"))
-                self.appointment_table.setItem(row_position, 6, QTableWidgetItem(f"${appointment.price}" if appointment.price else "No especificado"))
-                
-                # Checkbox para confirmar (centrado)
-                confirmed_checkbox = QCheckBox()
-                confirmed_checkbox.setChecked(appointment.confirmed)
-                confirmed_checkbox.stateChanged.connect(lambda state, a=appointment.id: self.toggle_confirmation(a, state))
-                
-                # Crear un widget contenedor para el checkbox
-                checkbox_container = QWidget()
-                checkbox_layout = QHBoxLayout(checkbox_container)
-                checkbox_layout.addWidget(confirmed_checkbox)
-                checkbox_layout.setAlignment(Qt.AlignCenter)
-                checkbox_layout.setContentsMargins(0, 0, 0, 0)
-                
-                self.appointment_table.setCellWidget(row_position, 7, checkbox_container)
-                
-                # Botones de acción
-                actions_widget = QWidget()
-                actions_layout = QHBoxLayout(actions_widget)
-                actions_layout.setContentsMargins(0, 0, 0, 0)
-                actions_layout.setSpacing(2)
-                
-                edit_button = QToolButton()
-                edit_button.setText("E")
-                edit_button.setStyleSheet("""
-                    QToolButton {
-                        background-color: #007bff;
-                        color: white;
-                        border: none;
-                        padding: 3px;
-                        border-radius: 3px;
-                    }
-                    QToolButton:hover {
-                        background-color: #0056b3;
-                    }
-                """)
-                edit_button.clicked.connect(lambda _, a=appointment.id: self.edit_appointment(a))
-                actions_layout.addWidget(edit_button)
-                
-                delete_button = QToolButton()
-                delete_button.setText("x")
-                delete_button.setStyleSheet("""
-                    QToolButton {
-                        background-color: #dc3545;
-                        color: white;
-                        border: none;
-                        padding: 3px;
-                        border-radius: 3px;
-                    }
-                    QToolButton:hover {
-                        background-color: #c82333;
-                    }
-                """)
-                delete_button.clicked.connect(lambda _, a=appointment.id: self.delete_appointment(a))
-                actions_layout.addWidget(delete_button)
-                
-                actions_layout.addStretch()  # Añadir espacio flexible al final
-                self.appointment_table.setCellWidget(row_position, 8, actions_widget)
+        """Pasa los turnos al modelo, que solo notifica las filas que cambiaron"""
+        self.appointment_model.set_appointments(appointments)
 
     def adjust_time(self, appointment_id, minutes):
         session = Session()
-        appointment = session.query(Appointment).get(appointment_id)
-        new_time = (datetime.datetime.combine(datetime.date.today(), appointment.time) + 
-                    datetime.timedelta(minutes=minutes)).time()
-        appointment.time = new_time
-        session.commit()
-        session.close()
-        self.load_appointments()
-        self.update_calendar()
+        try:
+            changes = shift_appointment_time(session, appointment_id, minutes)
+        except AppointmentConflict as e:
+            QMessageBox.warning(self, "Horario ocupado", str(e))
+            return
+        finally:
+            session.close()
+        self.apply_changes(changes)
+
+    def apply_changes(self, changes):
+        """
+        Aplica un ChangeSet a la vista sin volver a consultar la base: actualiza
+        los turnos en memoria del día seleccionado (el modelo solo repinta las
+        filas que cambiaron) y las celdas del calendario de los días afectados.
+        """
+        selected_date = self.calendar.selectedDate().toPyDate()
+        appointments = {appointment.id: appointment for appointment in self.all_appointments}
+
+        for appointment in changes.upserted:
+            if appointment.date == selected_date:
+                appointments[appointment.id] = appointment
+            else:
+                appointments.pop(appointment.id, None)
+        for appointment_id, values in changes.patched.items():
+            if appointment_id in appointments:
+                appointments[appointment_id] = appointments[appointment_id]._replace(**values)
+        for appointment_id in changes.deleted:
+            appointments.pop(appointment_id, None)
+
+        self.all_appointments = sorted(appointments.values(), key=lambda appointment: (appointment.time, appointment.id))
+        self.load_appointments(reload_data=False)
+
+        for day, count in changes.day_counts.items():
+            self.set_day_highlight(QDate(day), count > 0)
 
     def toggle_confirmation(self, appointment_id, state):
         logger.info(f"Cambiando estado de confirmación del turno ID {appointment_id} a {'confirmado' if state == Qt.Checked else 'no confirmado'}")
         session = Session()
         try:
-            appointment = session.query(Appointment).get(appointment_id)
-            if appointment:
-                appointment.confirmed = state == Qt.Checked
-                session.commit()
-                logger.info(f"Estado de confirmación actualizado para turno ID {appointment_id}")
-            else:
-                logger.warning(f"No se encontró el turno con ID {appointment_id} para cambiar confirmación")
+            changes = set_confirmed(session, appointment_id, state == Qt.Checked)
+            logger.info(f"Estado de confirmación actualizado para turno ID {appointment_id}")
         except Exception as e:
             logger.error(f"Error al cambiar estado de confirmación: {str(e)}")
             session.rollback()
             QMessageBox.critical(self, "Error", f"No se pudo cambiar el estado: {str(e)}")
+            return
         finally:
             session.close()
         
-        # Recargar los datos para actualizar la interfaz
-        self.load_appointments(reload_data=True)
+        # Actualizar solo la fila del turno
+        self.apply_changes(changes)
 
     def update_calendar(self):
         current_date = self.calendar.selectedDate()
@@ -865,8 +698,7 @@ class AppointmentCalendarWidget(QWidget):
         dialog = AppointmentDialog(self.calendar.selectedDate().toPyDate())
         if dialog.exec_():
             logger.info("Nuevo turno creado exitosamente")
-            self.load_appointments(reload_data=True)  # Recargar para obtener datos actualizados
-            self.update_calendar()
+            self.apply_changes(dialog.changes)
         else:
             logger.info("Creación de turno cancelada")
 
@@ -874,9 +706,7 @@ class AppointmentCalendarWidget(QWidget):
         logger.info(f"Editando turno con ID: {appointment_id}")
         dialog = AppointmentDialog(self.calendar.selectedDate().toPyDate(), appointment_id)
         if dialog.exec_():
-            # Recargar datos para evitar usar objetos detached
-            self.load_appointments(reload_data=True)
-            self.update_calendar()
+            self.apply_changes(dialog.changes)
 
     def delete_appointment(self, appointment_id):
         logger.info(f"Intentando eliminar turno con ID: {appointment_id}")
@@ -886,10 +716,8 @@ class AppointmentCalendarWidget(QWidget):
         if confirm == QMessageBox.Yes:
             session = Session()
             try:
-                appointment = session.query(Appointment).get(appointment_id)
-                if appointment:
-                    session.delete(appointment)
-                    session.commit()
+                changes = remove_appointment(session, appointment_id)
+                if changes.deleted:
                     logger.info(f"Turno con ID {appointment_id} eliminado exitosamente")
                 else:
                     logger.warning(f"No se encontró el turno con ID {appointment_id} para eliminar")
@@ -897,12 +725,12 @@ class AppointmentCalendarWidget(QWidget):
                 logger.error(f"Error al eliminar turno: {str(e)}")
                 session.rollback()
                 QMessageBox.critical(self, "Error", f"No se pudo eliminar el turno: {str(e)}")
+                return
             finally:
                 session.close()
             
-            # Recargar datos para actualizar la interfaz
-            self.load_appointments(reload_data=True)
-            self.update_calendar()
+            # Quitar la fila y actualizar la celda del día en el calendario
+            self.apply_changes(changes)
 
     def toggle_appointment_list(self):
         self.appointment_list.setVisible(not self.appointment_list.isVisible())
@@ -917,37 +745,18 @@ class AppointmentCalendarWidget(QWidget):
         dialog.exec_()
 
     def repeat_weekly_appointments(self):
-        current_date = self.calendar.selectedDate()
-        next_week = current_date.addDays(7)
-        logger.info(f"Repitiendo turnos semanales del {current_date.toString('dd/MM/yyyy')} al {next_week.toString('dd/MM/yyyy')}")
+        """
+        Crea ya los turnos que faltan de las series semanales y mensuales, hasta
+        el horizonte configurado (el BackgroundWorker también lo hace periódicamente)
+        """
         session = Session()
-        appointments_to_repeat = session.query(Appointment).filter(
-            Appointment.date == current_date.toPyDate(),
-            Appointment.repeat_weekly == True
-        ).all()
-
-        for appointment in appointments_to_repeat:
-            existing_appointment = session.query(Appointment).filter(
-                Appointment.date == next_week.toPyDate(),
-                Appointment.time == appointment.time,
-                Appointment.client_id == appointment.client_id
-            ).first()
-
-            if not existing_appointment:
-                new_appointment = Appointment(
-                    date=next_week.toPyDate(),
-                    time=appointment.time,
-                    client_id=appointment.client_id,
-                    repeat_weekly=appointment.repeat_weekly,
-                    repeat_monthly=appointment.repeat_monthly
-                )
-                session.add(new_appointment)
-
-        session.commit()
-        session.close()
-        logger.info(f"Se repitieron {len(appointments_to_repeat)} turnos para la semana siguiente")
-        self.load_appointments()
-        self.update_calendar()
+        try:
+            result = expand_recurring(session)
+        finally:
+            session.close()
+        logger.info(f"Se repitieron {result.created} turnos en {len(result.dates)} días")
+        if result.dates:
+            self.refresh_calendar_data(set(result.dates))
  
     def createHandle(self):
         return CustomSplitterHandle(self.orientation(), self)
@@ -960,32 +769,21 @@ class AppointmentCalendarWidget(QWidget):
         current_time = datetime.datetime.now().time()
         current_date = datetime.date.today()
         
-        session = Session()
         try:
-            # Usar joinedload para cargar también los clientes
-            from sqlalchemy.orm import joinedload
-            
             # Buscar turnos en las próximas 2 horas
             two_hours_later = (datetime.datetime.combine(datetime.date.today(), current_time) + 
                              datetime.timedelta(hours=2)).time()
             
-            upcoming_appointments = session.query(Appointment).options(
-                joinedload(Appointment.client)
-            ).filter(
-                Appointment.date == current_date,
-                Appointment.time > current_time,
-                Appointment.time <= two_hours_later
-            ).order_by(Appointment.time).all()
+            upcoming_appointments = [
+                appointment for appointment in appointment_cache.get_day(current_date)
+                if current_time < appointment.time <= two_hours_later
+            ]
             
             if upcoming_appointments:
                 message = "Próximos turnos:\n"
                 for appointment in upcoming_appointments:
-                    if appointment.client:
-                        client_name = f"{appointment.client.lastname} {appointment.client.name}"
-                    else:
-                        client_name = "Cliente desconocido"
                     time_str = appointment.time.strftime('%H:%M')
-                    message += f"• {time_str} - {client_name}\n"
+                    message += f"• {time_str} - {appointment.client_full_name}\n"
                 
                 self.tray_icon.showMessage(
                     "Recordatorio de Turnos",
@@ -995,8 +793,6 @@ class AppointmentCalendarWidget(QWidget):
                 )
         except Exception as e:
             logger.error(f"Error al verificar turnos próximos: {str(e)}")
-        finally:
-            session.close()
 
     def notify_upcoming_appointments(self, appointments):
         """Recibe notificaciones de turnos próximos desde las tareas en segundo plano"""
@@ -1015,18 +811,29 @@ class AppointmentCalendarWidget(QWidget):
                 10000  # Mostrar por 10 segundos
             )
     
-    def refresh_calendar_data(self):
-        """Actualiza los datos del calendario cuando hay cambios en la base de datos"""
+    def refresh_calendar_data(self, changed_dates=None):
+        """
+        Actualiza los datos del calendario cuando hay cambios en la base de datos.
+        changed_dates son las fechas afectadas (None = recargar todo); el caché
+        ya descartó esos meses, así que solo se repinta lo que corresponde.
+        """
         logger.info("Actualizando calendario por cambios en la base de datos")
-        # Guardar la fecha seleccionada actual
-        current_selected_date = self.calendar.selectedDate()
+        selected_date = self.calendar.selectedDate().toPyDate()
         
-        # Actualizar calendario y citas
-        self.update_calendar()
+        if changed_dates is None:
+            self.update_calendar()
+            self.load_appointments(reload_data=True)
+            return
+        
+        # Marcar de nuevo solo los días cambiados del mes visible
+        shown_year, shown_month = self.calendar.yearShown(), self.calendar.monthShown()
+        for changed_date in changed_dates:
+            if (changed_date.year, changed_date.month) == (shown_year, shown_month):
+                self.set_day_highlight(QDate(changed_date), bool(appointment_cache.get_day(changed_date)))
         
-        # Solo recargar las citas si el día seleccionado es el actual
-        # Esto evita interrupciones inesperadas al usuario si está viendo otro día
-        if current_selected_date == QDate.currentDate():
+        # El modelo solo notifica las filas que cambiaron, así que recargar el
+        # día seleccionado no interrumpe al usuario
+        if selected_date in changed_dates:
             self.load_appointments(reload_data=True)
 
     def closeEvent(self, event):
@@ -1052,43 +859,27 @@ class AppointmentCalendarWidget(QWidget):
         """
         Marca específicamente los días que tienen turnos en el mes seleccionado.
         """
-        # Resetear formato de fechas para el mes actual
-        start_date = QDate(year, month, 1)
-        days_in_month = start_date.daysInMonth()
-        
-        for day in range(1, days_in_month + 1):
-            date = QDate(year, month, day)
-            self.calendar.setDateTextFormat(date, QTextCharFormat())
-        
-        # Consultar y marcar días con turnos
-        session = Session()
         try:
-            # Usar una consulta SQL más eficiente para obtener solo los días distintos que tienen turnos
-            from sqlalchemy import func, distinct
-            
-            # Obtener solo los días únicos que tienen turnos
-            days_with_appointments = session.query(
-                func.extract('day', Appointment.date).label('day')
-            ).filter(
-                extract('month', Appointment.date) == month,
-                extract('year', Appointment.date) == year
-            ).distinct().all()
+            # Días con turnos según el caché del mes (una consulta solo si el mes no está cargado)
+            day_counts = appointment_cache.day_counts(year, month)
             
-            # Aplicar formato a esos días
-            for day_result in days_with_appointments:
-                day = int(day_result[0])  # Extraer el número del día
+            start_date = QDate(year, month, 1)
+            for day in range(1, start_date.daysInMonth() + 1):
                 date = QDate(year, month, day)
-                fmt = self.calendar.dateTextFormat(date)
-                fmt.setBackground(QColor(69, 160, 73))  # Verde suave
-                fmt.setForeground(QColor(255, 255, 255))  # Texto blanco
-                self.calendar.setDateTextFormat(date, fmt)
+                self.set_day_highlight(date, date.toPyDate() in day_counts)
                 
-            logger.info(f"Se marcaron {len(days_with_appointments)} días con turnos en {month}/{year}")
+            logger.info(f"Se marcaron {len(day_counts)} días con turnos en {month}/{year}")
         except Exception as e:
             logger.error(f"Error al marcar días con turnos: {str(e)}")
-        finally:
-            session.close()
     
+    def set_day_highlight(self, date, has_appointments):
+        """Marca o desmarca un único día del calendario"""
+        fmt = QTextCharFormat()
+        if has_appointments:
+            fmt.setBackground(QColor(69, 160, 73))  # Verde suave
+            fmt.setForeground(QColor(255, 255, 255))  # Texto blanco
+        self.calendar.setDateTextFormat(date, fmt)
+
     def init_calendar_view(self):
         """
         Inicializa la vista del calendario marcando los días con turnos
@@ -1129,13 +920,12 @@ class PrintAppointmentsDialog(QDialog):
         logger.info(f"Abriendo diálogo de impresión para la fecha: {date}")
 
     def load_appointments(self):
-        session = Session()
-        appointments = session.query(Appointment).filter(Appointment.date == self.date).order_by(Appointment.time).all()
+        appointments = appointment_cache.get_day(self.date)
         text = f"Turnos para el {self.date.strftime('%d/%m/%Y')}\n\n"
         for appointment in appointments:
-            text += f"{appointment.time.strftime('%H:%M')} - {appointment.client.lastname} {appointment.client.name} - "
-            text += f"{appointment.client.dog_name} ({appointment.client.breed}) - "
-            text += f"Dirección: {appointment.client.address} - Tel: {appointment.client.phone}\n"
+            text += f"{appointment.time.strftime('%H:%M')} - {appointment.client_full_name} - "
+            text += f"{appointment.client_dog_name} ({appointment.client_breed}) - "
+            text += f"Dirección: {appointment.client_address} - Tel: {appointment.client_phone}\n"
             
             text += f"Servicio: {appointment.status or 'No esp.'} - Precio: ${appointment.price or 'No esp.'}"
             if appointment.confirmed:
@@ -1143,8 +933,8 @@ class PrintAppointmentsDialog(QDialog):
             text += "\n"
             
             comments = []
-            if appointment.client.comments:
-                comments.append(f"Comentarios: {appointment.client.comments.strip()}")
+            if appointment.client_comments:
+                comments.append(f"Comentarios: {appointment.client_comments.strip()}")
             if appointment.appoint_comment:
                 comments.append(f"Notas: {appointment.appoint_comment.strip()}")
             if comments:
@@ -1152,7 +942,6 @@ class PrintAppointmentsDialog(QDialog):
             
             text += "_" * 90 + "\n"
         self.preview.setText(text)
-        session.close()
 
     def print(self):
         logger.info(f"Imprimiendo turnos para la fecha: {self.date}")
@@ -1163,10 +952,18 @@ class PrintAppointmentsDialog(QDialog):
 
 
 class AppointmentDialog(QDialog):
+    # Horarios libres que se sugieren y cuántos días hacia adelante se buscan
+    SUGGESTED_SLOTS = 8
+    SUGGESTION_DAYS = 14
+    # Clientes que se muestran al buscar y letras necesarias para empezar
+    CLIENT_MATCHES = 50
+    CLIENT_SEARCH_MIN_LENGTH = 2
+
     def __init__(self, date, appointment_id=None):
         super().__init__()
         self.date = date
         self.appointment_id = appointment_id
+        self.changes = None  # ChangeSet del último guardado
         self.setWindowTitle("Crear Turno" if appointment_id is None else "Editar Turno")
         self.setMinimumWidth(600)
         layout = QVBoxLayout()
@@ -1176,12 +973,22 @@ class AppointmentDialog(QDialog):
         grid_layout = QGridLayout()
         layout.addLayout(grid_layout)
 
-        # Cliente
+        # Cliente: la búsqueda usa el índice en memoria, sin consultas por tecla
+        try:
+            client_index.sync()
+        except Exception as e:
+            logger.error(f"Error al actualizar el índice de clientes: {str(e)}")
         grid_layout.addWidget(QLabel("Cliente:"), 0, 0, 1, 2)
         client_layout = QHBoxLayout()
         self.client_search = QLineEdit()
         self.client_search.setPlaceholderText("Buscar cliente...")
         self.client_search.textChanged.connect(self.filter_clients)
+        self.client_model = QStandardItemModel(self)
+        self.client_completer = QCompleter(self.client_model, self)
+        # El índice ya filtró: el completer solo muestra la lista
+        self.client_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.client_completer.setWidget(self.client_search)
+        self.client_completer.activated[QtCore.QModelIndex].connect(self.use_client_completion)
         self.client_combo = QComboBox()
         client_layout.addWidget(self.client_search, 1)
         client_layout.addWidget(self.client_combo, 1)
@@ -1196,8 +1003,12 @@ class AppointmentDialog(QDialog):
         self.date_edit.setDate(QDate(self.date))
         self.time_edit = QTimeEdit()
         self.time_edit.setTime(QTime(9, 0))
+        # Próximos horarios libres desde la fecha elegida (solo en turnos nuevos)
+        self.slot_combo = QComboBox()
+        self.slot_combo.setVisible(appointment_id is None)
         date_time_layout.addWidget(self.date_edit)
         date_time_layout.addWidget(self.time_edit)
+        date_time_layout.addWidget(self.slot_combo, 1)
         grid_layout.addLayout(date_time_layout, 3, 0, 1, 2)
 
         # Confirmado
@@ -1210,12 +1021,19 @@ class AppointmentDialog(QDialog):
         service_price_layout = QHBoxLayout()
         self.service_combo = QComboBox()
         self.service_combo.addItems(["Baño", "Corte", "Baño y corte"])
+        # Minutos que ocupa el turno; se completa con la duración del servicio
+        self.duration_spin = QSpinBox()
+        self.duration_spin.setRange(15, 480)
+        self.duration_spin.setSingleStep(15)
+        self.duration_spin.setSuffix(" min")
+        self.duration_spin.setValue(default_duration(self.service_combo.currentText()))
         self.price_input = QLineEdit()
         self.price_input.setPlaceholderText("Precio")
         validator = QDoubleValidator(0.00, 9999999.99, 2)
         validator.setNotation(QDoubleValidator.StandardNotation)
         self.price_input.setValidator(validator)
         service_price_layout.addWidget(self.service_combo, 1)
+        service_price_layout.addWidget(self.duration_spin)
         service_price_layout.addWidget(self.price_input, 1)
         grid_layout.addLayout(service_price_layout, 6, 0, 1, 2)
 
@@ -1276,6 +1094,16 @@ class AppointmentDialog(QDialog):
 
         if appointment_id:
             self.load_appointment(appointment_id)
+        else:
+            slots = self.update_slot_suggestions()
+            if slots and slots[0].date() == self.date:
+                # En vez de 09:00 fijo, el primer horario libre del día
+                self.time_edit.setTime(slots[0].time())
+            self.slot_combo.activated.connect(self.use_slot_suggestion)
+            self.date_edit.dateChanged.connect(self.update_slot_suggestions)
+            self.duration_spin.valueChanged.connect(self.update_slot_suggestions)
+        # Después de cargar el turno, para no pisar la duración guardada
+        self.service_combo.currentTextChanged.connect(self.update_default_duration)
 
         # Conectar el cambio de cliente seleccionado a la actualización de comentarios
         self.client_combo.currentIndexChanged.connect(self.update_client_comments)
@@ -1323,37 +1151,73 @@ class AppointmentDialog(QDialog):
             }
         """)
 
+    def update_slot_suggestions(self):
+        """Carga en slot_combo los próximos horarios libres desde la fecha elegida"""
+        start = self.date_edit.date().toPyDate()
+        try:
+            slots = slot_finder.find_free_slots(
+                start, start + datetime.timedelta(days=self.SUGGESTION_DAYS),
+                self.SUGGESTED_SLOTS, self.duration_spin.value(), now=datetime.datetime.now()
+            )
+        except Exception as e:
+            logger.error(f"Error al buscar horarios libres: {str(e)}")
+            slots = []
+
+        self.slot_combo.clear()
+        self.slot_combo.addItem("Horarios libres..." if slots else "Sin horarios libres", None)
+        for slot in slots:
+            label = QDate(slot.date()).toString("ddd d/M")
+            self.slot_combo.addItem(f"{label} {slot.strftime('%H:%M')}", slot)
+        return slots
+
+    def update_default_duration(self, service):
+        self.duration_spin.setValue(default_duration(service))
+
+    def use_slot_suggestion(self, index):
+        slot = self.slot_combo.itemData(index)
+        if slot is None:
+            return
+        # Sin recalcular las sugerencias: el usuario puede probar otra de la lista
+        self.date_edit.blockSignals(True)
+        self.date_edit.setDate(QDate(slot.date()))
+        self.date_edit.blockSignals(False)
+        self.time_edit.setTime(QTime(slot.hour, slot.minute))
+
     def update_client_comments(self):
         client_id = self.client_combo.currentData()
         if client_id:
-            session = Session()
-            try:
-                client = session.query(Client).get(client_id)
-                if client:
-                    self.client_comments.setText(client.comments or "")
-                else:
-                    self.client_comments.clear()
-                    logger.warning(f"No se encontró el cliente con ID {client_id}")
-            except Exception as e:
-                logger.error(f"Error al cargar comentarios del cliente: {str(e)}")
+            client = client_index.get(client_id)
+            if client:
+                self.client_comments.setText(client.comments or "")
+            else:
                 self.client_comments.clear()
-            finally:
-                session.close()
+                logger.warning(f"No se encontró el cliente con ID {client_id}")
         else:
             self.client_comments.clear()
 
     def filter_clients(self):
-        search_term = self.client_search.text().lower()
+        search_term = self.client_search.text().strip()
         self.client_combo.clear()
-        if len(search_term) >= 3:
-            session = Session()
-            clients = session.query(Client).filter(
-                (Client.name.ilike(f"%{search_term}%")) |
-                (Client.lastname.ilike(f"%{search_term}%"))
-            ).all()
-            for client in clients:
-                self.client_combo.addItem(f"{client.lastname} {client.name}", client.id)
-            session.close()
+        self.client_model.clear()
+        if len(search_term) < self.CLIENT_SEARCH_MIN_LENGTH:
+            self.client_completer.popup().hide()
+            return
+        clients = client_index.search(search_term, self.CLIENT_MATCHES)
+        for client in clients:
+            self.client_combo.addItem(client.label, client.id)
+            item = QStandardItem(client.description)
+            item.setData(client.id, Qt.UserRole)
+            self.client_model.appendRow(item)
+        # Solo mientras el usuario escribe (no al cargar un turno existente)
+        if clients and self.client_search.hasFocus():
+            self.client_completer.complete()
+        else:
+            self.client_completer.popup().hide()
+
+    def use_client_completion(self, index):
+        position = self.client_combo.findData(index.data(Qt.UserRole))
+        if position >= 0:
+            self.client_combo.setCurrentIndex(position)
 
     def load_appointment(self, appointment_id):
         logger.info(f"Cargando datos del turno con ID: {appointment_id}")
@@ -1386,6 +1250,7 @@ class AppointmentDialog(QDialog):
             self.confirmed_checkbox.setChecked(appointment.confirmed)
             self.price_input.setText(str(appointment.price) if appointment.price else "")
             self.service_combo.setCurrentText(appointment.status if appointment.status else "Baño")
+            self.duration_spin.setValue(appointment.duration or default_duration(appointment.status))
             self.notes_input.setText(appointment.appoint_comment if appointment.appoint_comment else "")
             self.update_client_comments()
         except Exception as e:
@@ -1422,32 +1287,29 @@ class AppointmentDialog(QDialog):
         service = self.service_combo.currentText()
         notes = self.notes_input.toPlainText()
 
-        if self.appointment_id:
-            appointment = session.query(Appointment).get(self.appointment_id)
-            appointment.date = date
-            appointment.time = time
-            appointment.client_id = client_id
-            appointment.confirmed = confirmed
-            appointment.price = price
-            appointment.status = service
-            appointment.appoint_comment = notes
-        else:
-            new_appointment = Appointment(
-                date=date,
-                time=time,
-                client_id=client_id,
-                confirmed=confirmed,
-                price=price,
-                status=service,
-                appoint_comment=notes
-            )
-            session.add(new_appointment)
+        values = {
+            'date': date,
+            'time': time,
+            'client_id': client_id,
+            'confirmed': confirmed,
+            'price': price,
+            'status': service,
+            'duration': self.duration_spin.value(),
+            'appoint_comment': notes,
+        }
 
         try:
-            session.commit()
+            # Guardar los cambios para que el calendario actualice solo lo afectado
+            self.changes = save_appointment(session, values, self.appointment_id)
             logger.info(f"Turno {'actualizado' if self.appointment_id else 'creado'} exitosamente")
             session.close()
             super().accept()
+        except AppointmentConflict as e:
+            # El diálogo queda abierto para elegir otro horario
+            logger.info(f"Turno no guardado por superposición: {str(e)}")
+            QMessageBox.warning(self, "Horario ocupado", str(e))
+            session.rollback()
+            session.close()
         except Exception as e:
             logger.error(f"Error al {'actualizar' if self.appointment_id else 'crear'} turno: {str(e)}")
             QMessageBox.critical(self, "Error", f"No se pudo guardar el turno: {str(e)}")
@@ -0,0 +1,198 @@
+import logging
+import threading
+from collections import OrderedDict
+from logging.handlers import RotatingFileHandler
+from sqlalchemy.orm import joinedload
+from database import Session, Appointment, AppointmentSnapshot, date_range_filter
+
+def setup_logger():
+    logger = logging.getLogger('appointment_cache')
+    logger.setLevel(logging.INFO)
+
+    # Configurar el RotatingFileHandler
+    file_handler = RotatingFileHandler(
+        'appointment_cache.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+
+class AppointmentCache:
+    """
+    Caché en memoria de los turnos por mes, compartido por el calendario, el
+    diálogo de impresión y el BackgroundWorker.
+
+    Cada mes se carga con una sola consulta (turnos + clientes) y se guarda
+    como {fecha: tupla de AppointmentSnapshot ordenada por hora}. Se conservan
+    los últimos max_months meses usados (LRU). Los caminos de escritura avisan
+    qué cambió con apply_changes() o invalidate(), así que solo se vuelve a
+    consultar el mes afectado.
+
+    Es seguro usarlo desde varios hilos: el worker corre en un QThread.
+    """
+
+    def __init__(self, max_months=6, session_factory=Session):
+        self.max_months = max_months
+        self.session_factory = session_factory
+        self._months = OrderedDict()  # (año, mes) -> {fecha: (snapshots...)}
+        self._locations = {}  # id de turno -> fecha, para los meses cargados
+        self._lock = threading.Lock()
+        # Se incrementa en cada invalidación: un mes leído mientras alguien
+        # escribía no se guarda, para no dejar datos viejos en el caché
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        # Versiones de change_log de cambios de este proceso ya aplicados con
+        # apply_changes; solo se guardan si alguien las consume (el worker)
+        self._applied_versions = set()
+        self._track_versions = False
+
+    def get_month(self, year, month):
+        """Devuelve {fecha: (snapshots...)} del mes; solo consulta si no está cargado"""
+        key = (year, month)
+        with self._lock:
+            days = self._months.get(key)
+            if days is not None:
+                self._months.move_to_end(key)
+                self.hits += 1
+                return days
+            self.misses += 1
+            generation = self._generation
+
+        days = self._load_month(year, month)
+
+        with self._lock:
+            if generation != self._generation:
+                return days
+            self._months[key] = days
+            self._months.move_to_end(key)
+            for day, appointments in days.items():
+                for appointment in appointments:
+                    self._locations[appointment.id] = day
+            while len(self._months) > self.max_months:
+                evicted_key, evicted_days = self._months.popitem(last=False)
+                self._forget(evicted_days)
+                logger.info(f"Mes {evicted_key[1]}/{evicted_key[0]} descartado del caché")
+        return days
+
+    def get_day(self, date):
+        """Turnos de una fecha, ordenados por hora"""
+        return self.get_month(date.year, date.month).get(date, ())
+
+    def day_counts(self, year, month):
+        """Cantidad de turnos por fecha del mes (solo fechas con turnos)"""
+        return {day: len(appointments) for day, appointments in self.get_month(year, month).items()}
+
+    def _load_month(self, year, month):
+        session = self.session_factory()
+        try:
+            appointments = session.query(Appointment).options(
+                joinedload(Appointment.client)
+            ).filter(
+                date_range_filter(year=year, month=month)
+            ).order_by(Appointment.date, Appointment.time, Appointment.id).all()
+
+            days = {}
+            for appointment in appointments:
+                days.setdefault(appointment.date, []).append(AppointmentSnapshot.from_appointment(appointment))
+            logger.info(f"Mes {month}/{year} cargado en caché: {len(appointments)} turnos")
+            return {day: tuple(snapshots) for day, snapshots in days.items()}
+        finally:
+            session.close()
+
+    def _forget(self, days):
+        for appointments in days.values():
+            for appointment in appointments:
+                self._locations.pop(appointment.id, None)
+
+    def _drop_month(self, key):
+        self._generation += 1
+        days = self._months.pop(key, None)
+        if days is not None:
+            self._forget(days)
+
+    def invalidate(self, dates=None):
+        """Descarta los meses de las fechas dadas, o todo el caché si dates es None"""
+        with self._lock:
+            if dates is None:
+                self._generation += 1
+                self._months.clear()
+                self._locations.clear()
+                logger.info("Caché de turnos vaciado")
+                return
+            for key in {(date.year, date.month) for date in dates}:
+                self._drop_month(key)
+
+    def invalidate_client(self, client_id):
+        """Descarta los meses con turnos de un cliente (cambió su nombre, teléfono, etc.)"""
+        with self._lock:
+            keys = {
+                key for key, days in self._months.items()
+                if any(appointment.client_id == client_id for appointments in days.values() for appointment in appointments)
+            }
+            for key in keys:
+                self._drop_month(key)
+
+    def apply_changes(self, changes):
+        """
+        Actualiza el caché con un ChangeSet de appointment_service. Los cambios
+        parciales (confirmado, hora) se aplican sobre el snapshot guardado; las
+        altas, ediciones y bajas descartan los meses afectados. Las versiones
+        del ChangeSet se recuerdan para take_applied_versions() si se llamó a
+        track_applied_versions().
+        """
+        with self._lock:
+            if self._track_versions:
+                self._applied_versions.update(changes.versions)
+            self._generation += 1
+            affected = set(changes.day_counts)
+            for appointment in changes.upserted:
+                affected.add(appointment.date)
+                if appointment.id in self._locations:
+                    affected.add(self._locations[appointment.id])
+            for appointment_id in changes.deleted:
+                if appointment_id in self._locations:
+                    affected.add(self._locations[appointment_id])
+
+            for appointment_id, values in changes.patched.items():
+                day = self._locations.get(appointment_id)
+                if day is None:
+                    continue
+                key = (day.year, day.month)
+                patched = [appointment._replace(**values) if appointment.id == appointment_id else appointment
+                           for appointment in self._months[key][day]]
+                if 'time' in values:
+                    patched.sort(key=lambda appointment: (appointment.time, appointment.id))
+                # Copia nueva del mes: quien ya tenga el diccionario anterior no lo ve cambiar
+                days = dict(self._months[key])
+                days[day] = tuple(patched)
+                self._months[key] = days
+
+            for key in {(day.year, day.month) for day in affected}:
+                self._drop_month(key)
+
+    def track_applied_versions(self):
+        """
+        Empieza a recordar las versiones aplicadas. Lo llama quien las va a
+        consumir con take_applied_versions(); sin consumidor (por ejemplo, en
+        el proceso de la API) no se guardan y el conjunto no crece.
+        """
+        with self._lock:
+            self._track_versions = True
+
+    def take_applied_versions(self, up_to):
+        """Devuelve y olvida las versiones ya aplicadas por apply_changes hasta `up_to`"""
+        with self._lock:
+            taken = {version for version in self._applied_versions if version <= up_to}
+            self._applied_versions -= taken
+        return taken
+
+
+# Instancia compartida por toda la aplicación
+appointment_cache = AppointmentCache()
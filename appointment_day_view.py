@@ -0,0 +1,340 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QRect, QSize, QPoint, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QPen, QFontMetrics
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+
+
+class AppointmentDayModel(QAbstractTableModel):
+    """
+    Modelo con los turnos del día seleccionado. Guarda AppointmentSnapshot y
+    al recibir datos nuevos solo avisa a la vista de las filas que cambiaron,
+    así las vistas no se reconstruyen en cada actualización.
+    """
+
+    COLUMNS = ["Hora", "Cliente", "Dirección", "Teléfono", "Mascota", "Servicio", "Precio", "Confirmado", "Acciones"]
+    CONFIRMED_COLUMN = 7
+    ACTIONS_COLUMN = 8
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.appointments = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.appointments)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        appointment = self.appointments[index.row()]
+        column = index.column()
+
+        if role == Qt.UserRole:
+            return appointment
+        if role == Qt.DisplayRole:
+            return self.display_text(appointment, column)
+        if role == Qt.CheckStateRole and column == self.CONFIRMED_COLUMN:
+            return Qt.Checked if appointment.confirmed else Qt.Unchecked
+        if role == Qt.ToolTipRole and column == 1 and appointment.client_comments:
+            return appointment.client_comments
+        return None
+
+    def display_text(self, appointment, column):
+        if column == 0:
+            return appointment.time.strftime('%H:%M')
+        if column == 1:
+            return appointment.client_full_name
+        if column == 2:
+            return appointment.client_address or ""
+        if column == 3:
+            return appointment.client_phone or ""
+        if column == 4:
+            return f"{appointment.client_dog_name} ({appointment.client_breed})" if appointment.has_client else ""
+        if column == 5:
+            return appointment.status or "No especificado"
+        if column == 6:
+            return f"${appointment.price}" if appointment.price else "No especificado"
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def appointment_at(self, row):
+        return self.appointments[row]
+
+    def row_of(self, appointment_id):
+        for row, appointment in enumerate(self.appointments):
+            if appointment.id == appointment_id:
+                return row
+        return -1
+
+    def set_appointments(self, appointments):
+        """Reemplaza los turnos emitiendo solo los cambios necesarios"""
+        appointments = list(appointments)
+        new_ids = [appointment.id for appointment in appointments]
+        new_id_set = set(new_ids)
+
+        # Quitar los turnos que ya no están (de abajo hacia arriba)
+        for row in range(len(self.appointments) - 1, -1, -1):
+            if self.appointments[row].id not in new_id_set:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.appointments[row]
+                self.endRemoveRows()
+
+        old_ids = [appointment.id for appointment in self.appointments]
+        old_id_set = set(old_ids)
+        if old_ids != [appointment_id for appointment_id in new_ids if appointment_id in old_id_set]:
+            # Cambió el orden (por ejemplo, cambió una hora): recarga completa
+            self.beginResetModel()
+            self.appointments = appointments
+            self.endResetModel()
+            return
+
+        # Insertar los turnos nuevos en su posición y actualizar los modificados
+        for row, appointment in enumerate(appointments):
+            if appointment.id not in old_id_set:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.appointments.insert(row, appointment)
+                self.endInsertRows()
+            elif self.appointments[row] != appointment:
+                self.appointments[row] = appointment
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+    def update_appointment(self, appointment):
+        """Actualiza una sola fila si el turno está en el modelo"""
+        row = self.row_of(appointment.id)
+        if row >= 0 and self.appointments[row] != appointment:
+            self.appointments[row] = appointment
+            self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+        return row
+
+    def remove_appointment(self, appointment_id):
+        row = self.row_of(appointment_id)
+        if row >= 0:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.appointments[row]
+            self.endRemoveRows()
+        return row
+
+
+def _draw_button(painter, rect, text, color, font=None):
+    painter.save()
+    painter.setRenderHint(painter.Antialiasing)
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(color))
+    painter.drawRoundedRect(rect, 2, 2)
+    painter.setPen(QColor("white"))
+    if font:
+        painter.setFont(font)
+    painter.drawText(rect, Qt.AlignCenter, text)
+    painter.restore()
+
+
+def _draw_checkbox(painter, rect, checked, text):
+    size = 16
+    box = QRect(rect.left(), rect.center().y() - size // 2, size, size)
+    painter.save()
+    painter.setRenderHint(painter.Antialiasing)
+    painter.setPen(QPen(QColor("#4CAF50" if checked else "#888"), 1))
+    painter.setBrush(QColor("#4CAF50" if checked else "white"))
+    painter.drawRoundedRect(box, 3, 3)
+    if checked:
+        painter.setPen(QPen(QColor("white"), 2))
+        painter.drawPolyline(QPoint(box.left() + 4, box.center().y()),
+                             QPoint(box.left() + 7, box.bottom() - 4),
+                             QPoint(box.right() - 3, box.top() + 4))
+    if text:
+        painter.setPen(QColor("#333"))
+        painter.drawText(rect.adjusted(size + 6, 0, 0, 0), Qt.AlignLeft | Qt.AlignVCenter, text)
+    painter.restore()
+
+
+def _is_click(event):
+    return event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+
+
+class AppointmentCardDelegate(QStyledItemDelegate):
+    """
+    Dibuja cada turno de la vista de lista como una tarjeta, con los botones
+    Editar / Eliminar y la casilla Confirmado pintados en lugar de widgets.
+    """
+
+    edit_requested = pyqtSignal(int)
+    delete_requested = pyqtSignal(int)
+    confirm_toggled = pyqtSignal(int, bool)
+
+    ROW_HEIGHT = 92
+    BUTTON_SIZE = QSize(100, 40)
+    MARGIN = 8
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def control_rects(self, rect):
+        """Posición de los botones y la casilla dentro de la fila"""
+        right = rect.right() - self.MARGIN
+        top = rect.top() + self.MARGIN
+        delete_rect = QRect(right - self.BUTTON_SIZE.width() + 1, top, self.BUTTON_SIZE.width(), self.BUTTON_SIZE.height())
+        edit_rect = QRect(delete_rect.left() - 4 - self.BUTTON_SIZE.width(), top,
+                          self.BUTTON_SIZE.width(), self.BUTTON_SIZE.height())
+        confirm_rect = QRect(edit_rect.left(), edit_rect.bottom() + 4, 2 * self.BUTTON_SIZE.width(), 24)
+        return edit_rect, delete_rect, confirm_rect
+
+    def paint(self, painter, option, index):
+        appointment = index.data(Qt.UserRole)
+        if appointment is None:
+            return
+        painter.save()
+        rect = option.rect
+
+        # Alternar colores de fondo
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, QColor("#dfe9df"))
+        elif index.row() % 2 == 1:
+            painter.fillRect(rect, QColor("#f8f8f8"))
+
+        edit_rect, delete_rect, confirm_rect = self.control_rects(rect)
+        text_rect = QRect(rect.left() + self.MARGIN, rect.top() + self.MARGIN,
+                          edit_rect.left() - rect.left() - 2 * self.MARGIN, rect.height() - 2 * self.MARGIN)
+
+        # Primera línea: hora (verde si está confirmado, rojo si no), cliente y mascota
+        base_font = QFont(option.font)
+        base_font.setPixelSize(14)
+        bold_font = QFont(base_font)
+        bold_font.setBold(True)
+        line_height = QFontMetrics(base_font).height() + 4
+
+        time_color = "#006400" if appointment.confirmed else "#8B0000"
+        status = "✓" if appointment.confirmed else "✗"
+        time_text = f"{appointment.time.strftime('%H:%M')} {status}"
+        if appointment.has_client:
+            dog_info = f"{appointment.client_dog_name} ({appointment.client_breed})" if appointment.client_dog_name else ""
+        else:
+            dog_info = "Sin información"
+
+        x = text_rect.left()
+        y = text_rect.top()
+        painter.setFont(bold_font)
+        painter.setPen(QColor(time_color))
+        painter.drawText(QRect(x, y, text_rect.width(), line_height), Qt.AlignLeft | Qt.AlignVCenter, time_text)
+        x += QFontMetrics(bold_font).horizontalAdvance(time_text + " ")
+
+        painter.setPen(QColor("#333"))
+        client_text = f"- {appointment.client_full_name} "
+        painter.drawText(QRect(x, y, text_rect.right() - x, line_height), Qt.AlignLeft | Qt.AlignVCenter, client_text)
+        x += QFontMetrics(bold_font).horizontalAdvance(client_text)
+
+        italic_font = QFont(base_font)
+        italic_font.setItalic(True)
+        painter.setFont(italic_font)
+        painter.drawText(QRect(x, y, max(0, text_rect.right() - x), line_height), Qt.AlignLeft | Qt.AlignVCenter,
+                         QFontMetrics(italic_font).elidedText(f"- Perro: {dog_info}", Qt.ElideRight, max(0, text_rect.right() - x)))
+
+        # Segunda línea: dirección y teléfono. Tercera: precio y nota
+        small_font = QFont(base_font)
+        small_font.setPixelSize(13)
+        painter.setFont(small_font)
+        painter.setPen(QColor("#555"))
+        metrics = QFontMetrics(small_font)
+        y += line_height
+        if appointment.has_client:
+            contact = f"Dirección: {appointment.client_address} - Tel: {appointment.client_phone}"
+            painter.drawText(QRect(text_rect.left(), y, text_rect.width(), line_height), Qt.AlignLeft | Qt.AlignVCenter,
+                             metrics.elidedText(contact, Qt.ElideRight, text_rect.width()))
+            y += line_height
+        if appointment.price or appointment.appoint_comment:
+            price_str = f"Precio: ${appointment.price}" if appointment.price else ""
+            comment_str = f"Nota: {appointment.appoint_comment}" if appointment.appoint_comment else ""
+            separator = " - " if price_str and comment_str else ""
+            small_font.setItalic(True)
+            painter.setFont(small_font)
+            painter.drawText(QRect(text_rect.left(), y, text_rect.width(), line_height), Qt.AlignLeft | Qt.AlignVCenter,
+                             metrics.elidedText(f"{price_str}{separator}{comment_str}".replace('\n', ' '),
+                                                Qt.ElideRight, text_rect.width()))
+
+        # Controles
+        button_font = QFont(base_font)
+        button_font.setBold(True)
+        _draw_button(painter, edit_rect, "Editar", "#4CAF50", button_font)
+        _draw_button(painter, delete_rect, "Eliminar", "#f44336", button_font)
+        painter.setFont(base_font)
+        _draw_checkbox(painter, confirm_rect, appointment.confirmed, "Confirmado")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if not _is_click(event):
+            return super().editorEvent(event, model, option, index)
+        appointment = index.data(Qt.UserRole)
+        edit_rect, delete_rect, confirm_rect = self.control_rects(option.rect)
+        if edit_rect.contains(event.pos()):
+            self.edit_requested.emit(appointment.id)
+            return True
+        if delete_rect.contains(event.pos()):
+            self.delete_requested.emit(appointment.id)
+            return True
+        if confirm_rect.contains(event.pos()):
+            self.confirm_toggled.emit(appointment.id, not appointment.confirmed)
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ConfirmDelegate(QStyledItemDelegate):
+    """Casilla Confirmado centrada en la vista de tabla"""
+
+    confirm_toggled = pyqtSignal(int, bool)
+
+    def checkbox_rect(self, rect):
+        size = 16
+        return QRect(rect.center().x() - size // 2, rect.center().y() - size // 2, size, size)
+
+    def paint(self, painter, option, index):
+        appointment = index.data(Qt.UserRole)
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        _draw_checkbox(painter, self.checkbox_rect(option.rect), appointment.confirmed, "")
+
+    def editorEvent(self, event, model, option, index):
+        if _is_click(event) and option.rect.contains(event.pos()):
+            appointment = index.data(Qt.UserRole)
+            self.confirm_toggled.emit(appointment.id, not appointment.confirmed)
+            return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ActionsDelegate(QStyledItemDelegate):
+    """Botones Editar (E) y Eliminar (x) de la vista de tabla"""
+
+    edit_requested = pyqtSignal(int)
+    delete_requested = pyqtSignal(int)
+
+    def button_rects(self, rect):
+        size = 22
+        top = rect.center().y() - size // 2
+        edit_rect = QRect(rect.left() + 2, top, size, size)
+        delete_rect = QRect(edit_rect.right() + 3, top, size, size)
+        return edit_rect, delete_rect
+
+    def paint(self, painter, option, index):
+        edit_rect, delete_rect = self.button_rects(option.rect)
+        _draw_button(painter, edit_rect, "E", "#007bff")
+        _draw_button(painter, delete_rect, "x", "#dc3545")
+
+    def editorEvent(self, event, model, option, index):
+        if _is_click(event):
+            appointment = index.data(Qt.UserRole)
+            edit_rect, delete_rect = self.button_rects(option.rect)
+            if edit_rect.contains(event.pos()):
+                self.edit_requested.emit(appointment.id)
+                return True
+            if delete_rect.contains(event.pos()):
+                self.delete_requested.emit(appointment.id)
+                return True
+        return super().editorEvent(event, model, option, index)
@@ -7,9 +7,12 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLa
                              QTableWidget, QTableWidgetItem, QHeaderView)
 from PyQt5.QtCore import Qt, QTime, QDate, QTimer
 from PyQt5.QtGui import QIcon, QTextCharFormat, QColor
-from sqlalchemy import or_, desc, String, cast, Date, Time, extract, and_
-from database import Session, Appointment, Client
+from sqlalchemy import or_, func, String, cast, Date, Time, select
+from database import Session, Appointment, Client, date_range_filter, appointment_years, sort_key
+from search_index import appointment_search_subquery
+from pagination import KeysetPaginator, FIRST, NEXT, PREVIOUS
 import datetime
+import re
 
 def setup_logger():
     logger = logging.getLogger('appointment_search')
@@ -28,6 +31,31 @@ def setup_logger():
 
 logger = setup_logger()
 
+def time_condition(search_term):
+    """Interpreta '10', '10:' o '10:3' como un rango de horas (prefijo de HH:MM)"""
+    match = re.fullmatch(r"(\d{1,2})(?::(\d{0,2}))?", search_term.strip())
+    if not match or int(match.group(1)) > 23:
+        return None
+    hour = int(match.group(1))
+    minutes = match.group(2) or ""
+    if len(minutes) == 2:
+        first_minute = last_minute = int(minutes)
+    elif len(minutes) == 1:
+        first_minute, last_minute = int(minutes) * 10, min(int(minutes) * 10 + 9, 59)
+    else:
+        first_minute, last_minute = 0, 59
+    if first_minute > 59:
+        return None
+    return Appointment.time.between(datetime.time(hour, first_minute),
+                                    datetime.time(hour, last_minute, 59, 999999))
+
+def price_condition(search_term):
+    """Interpreta el término como un precio exacto, si es un número"""
+    try:
+        return Appointment.price == float(search_term.strip().replace(',', '.'))
+    except ValueError:
+        return None
+
 class AppointmentSearchWidget(QWidget):
     def __init__(self):
         super().__init__()
@@ -116,6 +144,10 @@ class AppointmentSearchWidget(QWidget):
         self.current_search = ""
         self.current_sort_column = 0
         self.current_sort_order = Qt.AscendingOrder
+        # Con una búsqueda activa se ordena por relevancia hasta que se elija una columna
+        self.sort_by_rank = False
+        self.ranked = False
+        self.paginator = KeysetPaginator(self.items_per_page)
 
         # Timer para retrasar la búsqueda
         self.search_timer = QTimer()
@@ -137,6 +169,7 @@ class AppointmentSearchWidget(QWidget):
     def search_appointments(self):
         self.current_search = self.search_input.text()
         self.current_page = 1
+        self.sort_by_rank = True
         self.load_appointments(self.current_search)
         logger.info(f"Búsqueda de turnos realizada con término: '{self.current_search}'")
 
@@ -171,12 +204,13 @@ class AppointmentSearchWidget(QWidget):
         """
         self.setStyleSheet(style)
 
-    def load_appointments(self, search_term=None):
+    def load_appointments(self, search_term=None, move=FIRST):
         logger.info(f"Cargando turnos. Término de búsqueda: '{search_term}', Página: {self.current_page}")
         self.appointment_table.setRowCount(0)
         session = Session()
         query = session.query(Appointment).join(Client)
         
+        matches = None
         if search_term:
             # Eliminar cualquier barra al final del término de búsqueda
             search_term = search_term.rstrip('/')
@@ -184,39 +218,55 @@ class AppointmentSearchWidget(QWidget):
             # Intentar extraer componentes de fecha
             date_components = search_term.split('/')
             
-            date_conditions = []
-            if len(date_components) > 0 and date_components[0].isdigit():
-                date_conditions.append(extract('day', Appointment.date) == int(date_components[0]))
-            if len(date_components) > 1 and date_components[1].isdigit():
-                date_conditions.append(extract('month', Appointment.date) == int(date_components[1]))
-            if len(date_components) > 2 and date_components[2].isdigit():
-                date_conditions.append(extract('year', Appointment.date) == int(date_components[2]))
+            date_parts = [int(part) if part.isdigit() else None for part in date_components[:3]]
+            date_parts += [None] * (3 - len(date_parts))
+            day, month, year = date_parts
+            date_condition = None
+            if any(part is not None for part in date_parts):
+                # Rango de fechas sobre el índice en lugar de extract() fila por fila
+                years = None if year is not None else appointment_years(session)
+                date_condition = date_range_filter(year=year, month=month, day=day, years=years)
             
-            query = query.filter(
-                or_(
-                    Client.lastname.ilike(f"%{search_term}%"),
-                    Client.name.ilike(f"%{search_term}%"),
-                    Client.dog_name.ilike(f"%{search_term}%"),
-                    Appointment.status.ilike(f"%{search_term}%"),
-                    Appointment.appoint_comment.ilike(f"%{search_term}%"),
-                    cast(Appointment.time, String).like(f"%{search_term}%"),
-                    cast(Appointment.price, String).like(f"%{search_term}%"),
-                    and_(*date_conditions) if date_conditions else False
+            matches = appointment_search_subquery(session, search_term)
+            if matches is not None:
+                # El texto se busca en el índice FTS5; fecha, hora y precio en sus columnas
+                other_conditions = [condition for condition in
+                                    (date_condition, time_condition(search_term), price_condition(search_term))
+                                    if condition is not None]
+                if other_conditions:
+                    query = query.filter(or_(Appointment.id.in_(select(matches.c.id)), *other_conditions))
+                    matches = None
+                else:
+                    query = query.join(matches, matches.c.id == Appointment.id)
+            else:
+                query = query.filter(
+                    or_(
+                        Client.lastname.ilike(f"%{search_term}%"),
+                        Client.name.ilike(f"%{search_term}%"),
+                        Client.dog_name.ilike(f"%{search_term}%"),
+                        Appointment.status.ilike(f"%{search_term}%"),
+                        Appointment.appoint_comment.ilike(f"%{search_term}%"),
+                        cast(Appointment.time, String).like(f"%{search_term}%"),
+                        cast(Appointment.price, String).like(f"%{search_term}%"),
+                        date_condition if date_condition is not None else False
+                    )
                 )
-            )
+        self.ranked = matches is not None and self.sort_by_rank
         
-        self.total_appointments = query.count()
-        self.total_pages = (self.total_appointments + self.items_per_page - 1) // self.items_per_page
+        # El total se cuenta una vez por búsqueda, no en cada cambio de página
+        self.total_appointments = self.paginator.total(query, search_term)
         
-        # Aplicar ordenamiento
-        if self.current_sort_order == Qt.AscendingOrder:
-            query = query.order_by(getattr(Appointment, self.get_column_name(self.current_sort_column)))
+        # Aplicar ordenamiento (la clave de orden más el id define la página)
+        if self.ranked:
+            sort_keys = [matches.c.rank]
+            descending = False
         else:
-            query = query.order_by(desc(getattr(Appointment, self.get_column_name(self.current_sort_column))))
+            sort_keys = self.get_sort_keys(self.current_sort_column)
+            descending = self.current_sort_order == Qt.DescendingOrder
         
-        appointments = query.offset((self.current_page - 1) * self.items_per_page)\
-                            .limit(self.items_per_page)\
-                            .all()
+        appointments = self.paginator.fetch(query, sort_keys, Appointment.id, descending, move)
+        self.current_page = self.paginator.page
+        self.total_pages = self.paginator.total_pages(self.total_appointments)
         
         self.appointment_table.setRowCount(len(appointments))
         for row, appointment in enumerate(appointments):
@@ -242,8 +292,19 @@ class AppointmentSearchWidget(QWidget):
         column_names = ['date', 'time', 'client_id', 'client_id', 'status', 'price', 'confirmed', 'appoint_comment']
         return column_names[column_index]
 
+    def get_sort_keys(self, column_index):
+        """Expresiones de orden sin NULL para la paginación por clave"""
+        column_name = self.get_column_name(column_index)
+        if column_name == 'date':
+            # (fecha, hora) coincide con el índice ix_appointments_date_time_sort
+            return [sort_key(Appointment.date), sort_key(Appointment.time)]
+        if column_name in ('status', 'appoint_comment'):
+            return [func.coalesce(getattr(Appointment, column_name), '')]
+        return [func.coalesce(getattr(Appointment, column_name), -1)]
+
     def sort_table(self, column):
         logger.info(f"Ordenando tabla por columna: {column}")
+        self.sort_by_rank = False
         if column == self.current_sort_column:
             # Cambiar el orden si se hace clic en la misma columna
             self.current_sort_order = Qt.DescendingOrder if self.current_sort_order == Qt.AscendingOrder else Qt.AscendingOrder
@@ -259,7 +320,7 @@ class AppointmentSearchWidget(QWidget):
         for i in range(self.appointment_table.columnCount()):
             item = self.appointment_table.horizontalHeaderItem(i)
             text = item.text().split()[0]  # Obtener el texto base sin flechas
-            if i == self.current_sort_column:
+            if i == self.current_sort_column and not self.ranked:
                 if self.current_sort_order == Qt.AscendingOrder:
                     item.setText(f"{text} ▲")
                 else:
@@ -270,7 +331,7 @@ class AppointmentSearchWidget(QWidget):
     def update_pagination_controls(self):
         self.page_label.setText(f"Página {self.current_page} de {self.total_pages}")
         self.prev_button.setEnabled(self.current_page > 1)
-        self.next_button.setEnabled(self.current_page < self.total_pages)
+        self.next_button.setEnabled(self.paginator.has_next)
 
     def update_appointment_count(self):
         start = (self.current_page - 1) * self.items_per_page + 1
@@ -279,19 +340,18 @@ class AppointmentSearchWidget(QWidget):
 
     def previous_page(self):
         if self.current_page > 1:
-            self.current_page -= 1
-            self.load_appointments(self.current_search)
+            self.load_appointments(self.current_search, PREVIOUS)
             logger.info(f"Navegando a la página anterior: {self.current_page}")
 
     def next_page(self):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.load_appointments(self.current_search)
+        if self.paginator.has_next:
+            self.load_appointments(self.current_search, NEXT)
             logger.info(f"Navegando a la página siguiente: {self.current_page}")
 
     def change_items_per_page(self, value):
         self.items_per_page = int(value)
         self.current_page = 1
+        self.paginator.set_page_size(self.items_per_page)
         self.load_appointments(self.current_search)
         logger.info(f"Cambiando items por página a: {self.items_per_page}")
 
@@ -0,0 +1,493 @@
+import datetime
+import logging
+from bisect import bisect_left, bisect_right
+from collections import namedtuple, defaultdict
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import select, insert, update, delete, func, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
+from database import Appointment, AppointmentSnapshot, ChangeLog, config
+from appointment_cache import appointment_cache
+
+def setup_logger():
+    logger = logging.getLogger('appointment_service')
+    logger.setLevel(logging.INFO)
+
+    # Configurar el RotatingFileHandler
+    file_handler = RotatingFileHandler(
+        'appointment_service.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+
+class ChangeSet(namedtuple('ChangeSet', ['upserted', 'patched', 'deleted', 'day_counts', 'versions'])):
+    """
+    Resultado de una modificación de turnos, para que las vistas actualicen
+    solo lo que cambió:
+
+    - upserted: AppointmentSnapshot de los turnos creados o editados
+    - patched: {id: {columna: valor}} con cambios parciales (confirmado, hora)
+    - deleted: ids de los turnos eliminados
+    - day_counts: {fecha: cantidad de turnos} de los días afectados
+    - versions: versiones de change_log que escribió la modificación, para
+      que el BackgroundWorker no vuelva a procesar lo que ya se aplicó
+    """
+    __slots__ = ()
+
+    def __new__(cls, upserted=(), patched=None, deleted=(), day_counts=None, versions=()):
+        return super().__new__(cls, list(upserted), patched or {}, list(deleted), day_counts or {},
+                               frozenset(versions))
+
+    @property
+    def is_empty(self):
+        return not (self.upserted or self.patched or self.deleted)
+
+
+# Resultado de cada operación de apply_batch: estado ('created', 'updated',
+# 'deleted', 'not_found', 'conflict' o 'error'), id del turno y mensaje de error
+BatchResult = namedtuple('BatchResult', ['status', 'appointment_id', 'error'])
+
+# Grupo de turnos superpuestos de un día: intervalo [start_minute, end_minute)
+# que cubren entre todos y sus ids
+Overlap = namedtuple('Overlap', ['date', 'start_minute', 'end_minute', 'appointment_ids'])
+
+
+def format_minute(minute):
+    """510 -> '08:30'"""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def default_duration(service):
+    """Minutos que ocupa un turno del servicio dado, según la sección 'slots'"""
+    settings = config['slots']
+    return int(settings['service_minutes'].get(service, settings['appointment_minutes']))
+
+
+def appointment_interval(start_time, duration):
+    """Intervalo [inicio, fin) en minutos del día de un turno"""
+    start = start_time.hour * 60 + start_time.minute
+    return start, start + duration
+
+
+class AppointmentConflict(ValueError):
+    """El horario de un turno se superpone con el de otro turno del mismo día"""
+    def __init__(self, conflict_id, start_minute, end_minute):
+        self.conflict_id = conflict_id
+        self.start_minute = start_minute
+        self.end_minute = end_minute
+        other = f"el turno con ID {conflict_id}" if conflict_id is not None else "otro turno del lote"
+        super().__init__(f"El horario se superpone con {other} "
+                         f"({format_minute(start_minute)} a {format_minute(end_minute)})")
+
+
+class AppointmentNotFound(LookupError):
+    """No existe el turno que se quiere editar"""
+
+
+class DayIntervals:
+    """
+    Intervalos [inicio, fin) de los turnos de un día ordenados por inicio.
+    Como puede haber turnos viejos superpuestos entre sí, junto a cada
+    posición se guarda el intervalo de mayor fin hasta ahí: un intervalo
+    nuevo choca si el de mayor fin entre los que empiezan antes de que este
+    termine no terminó todavía, así que cada prueba es una búsqueda binaria.
+    """
+    def __init__(self):
+        self.starts = []
+        self.intervals = []
+        self.reach = []  # intervalo con el mayor fin de intervals[:i + 1]
+
+    def add(self, start, end, appointment_id):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.intervals.insert(position, (start, end, appointment_id))
+        self.reach.insert(position, None)
+        # Un día tiene pocos turnos: recalcular desde la posición nueva es barato
+        for index in range(position, len(self.intervals)):
+            previous = self.reach[index - 1] if index else None
+            current = self.intervals[index]
+            self.reach[index] = current if previous is None or current[1] > previous[1] else previous
+
+    def conflict(self, start, end):
+        """(inicio, fin, id) de un intervalo que se superpone con [start, end), o None"""
+        position = bisect_left(self.starts, end)
+        if position and self.reach[position - 1][1] > start:
+            return self.reach[position - 1]
+        return None
+
+
+def written_versions(session, appointment_ids, limit):
+    """
+    Versiones de change_log que agregaron los triggers en la transacción
+    actual, antes del commit. Mientras la transacción tiene el lock de
+    escritura nadie más escribe, así que son las últimas filas: se toman
+    desde la más nueva mientras sean de estos turnos, hasta `limit` filas.
+    """
+    appointment_ids = set(appointment_ids)
+    if not appointment_ids or limit <= 0:
+        return ()
+    rows = session.execute(
+        select(ChangeLog.version, ChangeLog.table_name, ChangeLog.row_id)
+        .order_by(ChangeLog.version.desc()).limit(limit)
+    )
+    versions = []
+    for version, table_name, row_id in rows:
+        if table_name != 'appointments' or row_id not in appointment_ids:
+            break
+        versions.append(version)
+    return versions
+
+
+def _publish(changes):
+    """Aplica el ChangeSet al caché de turnos compartido y lo devuelve"""
+    appointment_cache.apply_changes(changes)
+    return changes
+
+
+def count_appointments_by_day(session, dates):
+    """Cantidad de turnos de cada fecha (0 para las fechas sin turnos)"""
+    dates = set(dates)
+    if not dates:
+        return {}
+    counts = dict.fromkeys(dates, 0)
+    rows = session.execute(
+        select(Appointment.date, func.count(Appointment.id))
+        .where(Appointment.date.in_(dates))
+        .group_by(Appointment.date)
+    ).all()
+    counts.update(rows)
+    return counts
+
+
+def load_snapshot(session, appointment_id):
+    appointment = session.query(Appointment).options(
+        joinedload(Appointment.client)
+    ).filter(Appointment.id == appointment_id).one_or_none()
+    return AppointmentSnapshot.from_appointment(appointment) if appointment else None
+
+
+def find_conflict(session, day, start_time, duration, exclude_id=None):
+    """
+    Turno de `day` que se superpone con uno que empieza a start_time y dura
+    `duration` minutos, como fila (id, start_minute, end_minute), o None.
+    Igual que en DayIntervals se mira el mayor fin entre los turnos que
+    empiezan antes del fin del nuevo (no solo el último: puede haber turnos
+    viejos superpuestos), con un rango de ix_appointments_date_start.
+    """
+    start, end = appointment_interval(start_time, duration)
+    # Con max() SQLite toma id y start_minute de la fila con el mayor fin
+    query = select(Appointment.id, Appointment.start_minute,
+                   func.max(Appointment.end_minute).label('end_minute')).where(
+        Appointment.date == day, Appointment.start_minute < end
+    )
+    if exclude_id is not None:
+        query = query.where(Appointment.id != exclude_id)
+    row = session.execute(query).first()
+    return row if row.end_minute is not None and row.end_minute > start else None
+
+
+def check_conflict(session, day, start_time, duration, exclude_id=None):
+    """Lanza AppointmentConflict si el horario se superpone con otro turno"""
+    if day is None or start_time is None:
+        return
+    conflict = find_conflict(session, day, start_time, duration, exclude_id)
+    if conflict is not None:
+        raise AppointmentConflict(*conflict)
+
+
+def save_appointment(session, values, appointment_id=None):
+    """
+    Crea un turno (appointment_id=None) o actualiza uno existente con los
+    valores dados (nombres de columna de Appointment). Devuelve el ChangeSet,
+    con el recuento de la fecha nueva y, si cambió, también de la anterior.
+
+    Sin duración se usa la del servicio. Lanza AppointmentConflict (sin
+    guardar nada) si el turno queda superpuesto con otro y
+    AppointmentNotFound si appointment_id no existe.
+    """
+    if appointment_id:
+        appointment = session.get(Appointment, appointment_id)
+        if appointment is None:
+            raise AppointmentNotFound(f"No se encontró el turno con ID {appointment_id}")
+        previous_date = appointment.date
+        previous_slot = (appointment.date, appointment.time, appointment.duration)
+        for column, value in values.items():
+            setattr(appointment, column, value)
+    else:
+        appointment = Appointment(**values)
+        previous_date = None
+        previous_slot = None
+
+    if appointment.duration is None:
+        appointment.duration = default_duration(appointment.status)
+    # Editar otros datos de un turno no vuelve a controlar su horario
+    if previous_slot != (appointment.date, appointment.time, appointment.duration):
+        with session.no_autoflush:
+            check_conflict(session, appointment.date, appointment.time, appointment.duration, appointment_id)
+    if not appointment_id:
+        session.add(appointment)
+
+    session.flush()
+    snapshot = load_snapshot(session, appointment.id)
+    day_counts = count_appointments_by_day(session, {snapshot.date, previous_date or snapshot.date})
+    # Un cambio de fecha deja dos filas en change_log
+    versions = written_versions(session, [snapshot.id], 2 if previous_date not in (None, snapshot.date) else 1)
+    session.commit()
+    logger.info(f"Turno {'actualizado' if appointment_id else 'creado'}: ID {snapshot.id} ({snapshot.date} {snapshot.time})")
+    return _publish(ChangeSet(upserted=[snapshot], day_counts=day_counts, versions=versions))
+
+
+def set_confirmed(session, appointment_id, confirmed):
+    """Cambia solo la confirmación con un UPDATE directo, sin leer el turno"""
+    result = session.execute(
+        update(Appointment).where(Appointment.id == appointment_id).values(confirmed=confirmed)
+    )
+    versions = written_versions(session, [appointment_id], result.rowcount)
+    session.commit()
+    if result.rowcount == 0:
+        logger.warning(f"No se encontró el turno con ID {appointment_id} para cambiar confirmación")
+        return ChangeSet()
+    return _publish(ChangeSet(patched={appointment_id: {'confirmed': bool(confirmed)}}, versions=versions))
+
+
+def shift_appointment_time(session, appointment_id, minutes):
+    """
+    Mueve la hora de un turno la cantidad de minutos dada. Lanza
+    AppointmentConflict si en el nuevo horario choca con otro turno.
+    """
+    current = session.execute(
+        select(Appointment.date, Appointment.time, Appointment.duration).where(Appointment.id == appointment_id)
+    ).first()
+    if current is None or current.time is None:
+        logger.warning(f"No se encontró el turno con ID {appointment_id} para ajustar la hora")
+        return ChangeSet()
+    new_time = (datetime.datetime.combine(datetime.date.today(), current.time) +
+                datetime.timedelta(minutes=minutes)).time()
+    check_conflict(session, current.date, new_time, current.duration or default_duration(None), appointment_id)
+    session.execute(update(Appointment).where(Appointment.id == appointment_id).values(time=new_time))
+    versions = written_versions(session, [appointment_id], 1)
+    session.commit()
+    return _publish(ChangeSet(patched={appointment_id: {'time': new_time}}, versions=versions))
+
+
+def remove_appointment(session, appointment_id):
+    """Elimina un turno y devuelve el recuento actualizado de su día"""
+    appointment_date = session.execute(
+        delete(Appointment).where(Appointment.id == appointment_id).returning(Appointment.date)
+    ).scalar_one_or_none()
+    if appointment_date is None:
+        session.rollback()
+        logger.warning(f"No se encontró el turno con ID {appointment_id} para eliminar")
+        return ChangeSet()
+    day_counts = count_appointments_by_day(session, [appointment_date])
+    versions = written_versions(session, [appointment_id], 1)
+    session.commit()
+    logger.info(f"Turno con ID {appointment_id} eliminado")
+    return _publish(ChangeSet(deleted=[appointment_id], day_counts=day_counts, versions=versions))
+
+
+def _inserted_ids(session, count):
+    """
+    Ids de las últimas `count` filas insertadas en appointments, en el orden
+    en que se insertaron. Sale de las filas que el trigger de alta agregó a
+    change_log: como en written_versions, mientras la transacción tiene el
+    lock de escritura son las últimas filas del registro.
+    """
+    rows = session.execute(
+        select(ChangeLog.table_name, ChangeLog.op, ChangeLog.row_id)
+        .order_by(ChangeLog.version.desc()).limit(count)
+    ).all()
+    if len(rows) != count or any((table_name, op) != ('appointments', 'I') for table_name, op, _ in rows):
+        raise RuntimeError("El registro de cambios no tiene las altas del lote")
+    return [row_id for _, _, row_id in reversed(rows)]
+
+
+def _execute_many(session, statement, rows, with_ids=False):
+    """
+    Ejecuta statement con todas las filas en un solo executemany dentro de un
+    SAVEPOINT. Si falla, lo reintenta fila por fila para saber cuáles fallan.
+    Devuelve una lista alineada con rows: el id insertado (con with_ids) o
+    None, o la excepción de la fila.
+    """
+    if not rows:
+        return []
+    try:
+        with session.begin_nested():
+            session.execute(statement, rows)
+            return _inserted_ids(session, len(rows)) if with_ids else [None] * len(rows)
+    except SQLAlchemyError as e:
+        logger.warning(f"Falló la operación en bloque ({e.__class__.__name__}), se reintenta fila por fila")
+    outcomes = []
+    for row in rows:
+        try:
+            with session.begin_nested():
+                session.execute(statement, [row])
+                outcomes.append(_inserted_ids(session, 1)[0] if with_ids else None)
+        except SQLAlchemyError as e:
+            outcomes.append(e)
+    return outcomes
+
+
+def _check_batch_conflicts(session, results, creates, updates, deletes, current):
+    """
+    Marca como 'conflict' en results las altas y ediciones del lote que se
+    superponen con otro turno. Los turnos de los días afectados se cargan en
+    una consulta a un DayIntervals por día (sin los que el lote borra o
+    mueve) y cada operación se prueba y agrega en orden, así también se
+    detectan los choques entre operaciones del mismo lote.
+    """
+    moves = []
+    for index, values in creates:
+        moves.append((index, None, values.get('date'), values.get('time'), values['duration']))
+    for index, appointment_id, values in updates:
+        row = current[appointment_id]
+        slot = (values.get('date', row.date), values.get('time', row.time), values.get('duration', row.duration))
+        if slot != (row.date, row.time, row.duration):
+            moves.append((index, appointment_id, *slot))
+    # Las fechas u horas inválidas fallan al guardarse, con su propio error
+    moves = sorted(move for move in moves
+                   if isinstance(move[2], datetime.date) and isinstance(move[3], datetime.time))
+    if not moves:
+        return
+
+    excluded = {appointment_id for _, appointment_id in deletes} | {move[1] for move in moves}
+    days = defaultdict(DayIntervals)
+    rows = session.execute(
+        select(Appointment.id, Appointment.date, Appointment.start_minute, Appointment.end_minute)
+        .where(Appointment.date.in_({move[2] for move in moves}))
+        .order_by(Appointment.date, Appointment.start_minute)
+    )
+    for row in rows:
+        if row.id not in excluded:
+            days[row.date].add(row.start_minute, row.end_minute, row.id)
+
+    for index, appointment_id, day, start_time, duration in moves:
+        start, end = appointment_interval(start_time, duration or default_duration(None))
+        conflict = days[day].conflict(start, end)
+        if conflict is None:
+            days[day].add(start, end, appointment_id)
+        else:
+            other_start, other_end, other_id = conflict
+            results[index] = BatchResult('conflict', appointment_id,
+                                         str(AppointmentConflict(other_id, other_start, other_end)))
+
+
+def apply_batch(session, operations):
+    """
+    Aplica una lista de operaciones ('create', None, valores), ('update', id,
+    valores) o ('delete', id, None) en una sola transacción: un executemany
+    para las altas, otro para las ediciones y un DELETE ... IN para las bajas
+    (en ese orden). Una operación que falla no impide las demás; las que
+    quedarían superpuestas con otro turno no se aplican ('conflict').
+
+    Devuelve (lista de BatchResult alineada con operations, ChangeSet).
+    """
+    results = [None] * len(operations)
+    creates = [(index, values) for index, (op, _, values) in enumerate(operations) if op == 'create']
+    updates = [(index, appointment_id, values) for index, (op, appointment_id, values) in enumerate(operations)
+               if op == 'update']
+    deletes = [(index, appointment_id) for index, (op, appointment_id, _) in enumerate(operations) if op == 'delete']
+
+    # Fecha y horario actuales de los turnos a editar o borrar, en una sola consulta
+    ids = {appointment_id for _, appointment_id, _ in updates} | {appointment_id for _, appointment_id in deletes}
+    current = {row.id: row for row in session.execute(
+        select(Appointment.id, Appointment.date, Appointment.time, Appointment.duration).where(Appointment.id.in_(ids))
+    )} if ids else {}
+    previous_dates = {appointment_id: row.date for appointment_id, row in current.items()}
+    for index, appointment_id, *_ in updates + deletes:
+        if appointment_id not in previous_dates:
+            results[index] = BatchResult('not_found', appointment_id, f"No se encontró el turno con ID {appointment_id}")
+    updates = [item for item in updates if results[item[0]] is None]
+    deletes = [item for item in deletes if results[item[0]] is None]
+
+    creates = [(index, values if values.get('duration') is not None
+                else dict(values, duration=default_duration(values.get('status'))))
+               for index, values in creates]
+    _check_batch_conflicts(session, results, creates, updates, deletes, current)
+    creates = [item for item in creates if results[item[0]] is None]
+    updates = [item for item in updates if results[item[0]] is None]
+
+    # Sin RETURNING: SQLite no garantiza su orden en un INSERT de varias filas,
+    # los ids se leen de change_log
+    created = _execute_many(session, insert(Appointment), [values for _, values in creates], with_ids=True)
+    for (index, _), outcome in zip(creates, created):
+        results[index] = (BatchResult('error', None, str(outcome)) if isinstance(outcome, Exception)
+                          else BatchResult('created', outcome, None))
+
+    updated = _execute_many(session, update(Appointment),
+                            [dict(values, id=appointment_id) for _, appointment_id, values in updates])
+    for (index, appointment_id, _), outcome in zip(updates, updated):
+        results[index] = (BatchResult('error', appointment_id, str(outcome)) if isinstance(outcome, Exception)
+                          else BatchResult('updated', appointment_id, None))
+
+    deleted_ids = {appointment_id for _, appointment_id in deletes}
+    if deleted_ids:
+        session.execute(delete(Appointment).where(Appointment.id.in_(deleted_ids)))
+    for index, appointment_id in deletes:
+        results[index] = BatchResult('deleted', appointment_id, None)
+
+    upserted_ids = {result.appointment_id for result in results if result.status in ('created', 'updated')}
+    snapshots = [
+        AppointmentSnapshot.from_appointment(appointment)
+        for appointment in session.query(Appointment).options(joinedload(Appointment.client))
+        .filter(Appointment.id.in_(upserted_ids))
+    ] if upserted_ids else []
+    # Un turno editado y borrado en el mismo lote queda borrado
+    snapshots = [snapshot for snapshot in snapshots if snapshot.id not in deleted_ids]
+    touched = {result.appointment_id for result in results if result.status in ('updated', 'deleted')}
+    dates = {snapshot.date for snapshot in snapshots} | {previous_dates[i] for i in touched}
+    day_counts = count_appointments_by_day(session, dates)
+    written = [result.appointment_id for result in results if result.status in ('created', 'updated', 'deleted')]
+    # Una edición que cambia la fecha deja dos filas en change_log
+    versions = written_versions(session, written, len(written) + len(updates))
+    session.commit()
+
+    failed = sum(1 for result in results if result.status in ('not_found', 'conflict', 'error'))
+    logger.info(f"Lote de {len(operations)} operaciones aplicado: {len(creates)} altas, {len(updates)} ediciones, "
+                f"{len(deletes)} bajas, {failed} con error")
+    return results, _publish(ChangeSet(upserted=snapshots, deleted=sorted(deleted_ids), day_counts=day_counts,
+                                       versions=versions))
+
+
+OVERLAPS_SQL = text("""
+WITH ordered AS (
+    -- Mayor fin entre los turnos del día que empiezan antes
+    SELECT id, date, start_minute, end_minute,
+           max(end_minute) OVER (PARTITION BY date ORDER BY start_minute, id
+                                 ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS reach
+    FROM appointments
+    WHERE date BETWEEN :start AND :end AND time IS NOT NULL
+), grouped AS (
+    -- Empieza un grupo nuevo cada vez que un turno arranca después de que terminaron todos los anteriores
+    SELECT id, date, start_minute, end_minute,
+           sum(CASE WHEN reach > start_minute THEN 0 ELSE 1 END)
+               OVER (PARTITION BY date ORDER BY start_minute, id) AS cluster
+    FROM ordered
+)
+SELECT date, min(start_minute) AS start_minute, max(end_minute) AS end_minute, group_concat(id) AS ids
+FROM grouped
+GROUP BY date, cluster
+HAVING count(*) > 1
+ORDER BY date, start_minute
+""")
+
+
+def find_overlaps(session, start, end):
+    """
+    Turnos superpuestos entre las fechas start y end (inclusive), como lista
+    de Overlap: un recorrido por día en el orden de ix_appointments_date_start
+    que agrupa los turnos encadenados por superposiciones.
+    """
+    rows = session.execute(OVERLAPS_SQL, {'start': start.isoformat(), 'end': end.isoformat()})
+    return [
+        Overlap(datetime.date.fromisoformat(row.date), row.start_minute, row.end_minute,
+                sorted(int(appointment_id) for appointment_id in row.ids.split(',')))
+        for row in rows
+    ]
@@ -1,8 +1,9 @@
 import logging
 import datetime
 from PyQt5.QtCore import QObject, QThread, pyqtSignal, QTimer
-from database import Session, Appointment
-from sqlalchemy import extract
+from database import Session, Appointment, ChangeLog, get_data_version
+from appointment_cache import appointment_cache
+from recurrence import expand_recurring
 import time
 
 # Configurar logger
@@ -19,159 +20,166 @@ class BackgroundWorker(QObject):
     Clase para ejecutar tareas en segundo plano como:
     - Verificar turnos próximos para notificaciones
     - Comprobar cambios en la base de datos
+    - Crear los turnos que faltan de las series semanales y mensuales
     - Realizar otras tareas periódicas
     """
     
     # Señales para comunicarse con la interfaz principal
     upcoming_appointments = pyqtSignal(list)  # Lista de turnos próximos
-    database_changed = pyqtSignal()  # Avisa que hubo cambios en la base de datos
+    # Avisa que hubo cambios en la base de datos: set con las fechas de turnos
+    # afectadas, o None si hay que recargar todo
+    database_changed = pyqtSignal(object)
+
+    POLL_INTERVAL = 2  # Segundos entre consultas de la versión de datos
+    UPCOMING_INTERVAL = 30  # Segundos entre verificaciones de turnos próximos
+    RECURRENCE_INTERVAL = 3600  # Segundos entre extensiones de las series repetidas
     
     def __init__(self):
         super().__init__()
         self.is_running = False
         self.last_check_time = datetime.datetime.now()
-        self.db_last_update = {}
+        self.last_version = None
+        # Para saltear en check_database_changes los cambios propios
+        appointment_cache.track_applied_versions()
         self.init_db_state()
         logger.info("BackgroundWorker inicializado")
     
     def init_db_state(self):
-        """Inicializa el estado de la base de datos para detectar cambios"""
+        """Guarda la versión actual del registro de cambios para detectar modificaciones"""
         session = Session()
         try:
-            # Contar cuántos turnos hay por día para el mes actual y el siguiente
-            today = datetime.date.today()
-            current_month = today.month
-            current_year = today.year
-            
-            next_month = current_month + 1
-            next_year = current_year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            
-            # Obtener recuentos para el mes actual
-            self.db_last_update['current_month'] = self.get_appointment_counts(session, current_month, current_year)
-            
-            # Obtener recuentos para el mes siguiente
-            self.db_last_update['next_month'] = self.get_appointment_counts(session, next_month, next_year)
-            
-            # Guardar tiempo del último chequeo
-            self.last_check_time = datetime.datetime.now()
-            
-            logger.info(f"Estado inicial de la base de datos guardado. Mes actual: {current_month}/{current_year}, "
-                     f"Próximo mes: {next_month}/{next_year}")
+            self.last_version = get_data_version(session.connection())
+            logger.info(f"Estado inicial de la base de datos guardado. Versión de datos: {self.last_version}")
         except Exception as e:
             logger.error(f"Error al inicializar estado de base de datos: {e}")
         finally:
             session.close()
     
-    def get_appointment_counts(self, session, month, year):
-        """Obtiene el recuento de turnos por día para un mes específico"""
-        counts = {}
-        try:
-            # Consultar todos los turnos del mes
-            appointments = session.query(Appointment).filter(
-                extract('month', Appointment.date) == month,
-                extract('year', Appointment.date) == year
-            ).all()
-            
-            # Contar por día
-            for appointment in appointments:
-                day = appointment.date.day
-                if day in counts:
-                    counts[day] += 1
-                else:
-                    counts[day] = 1
-                    
-        except Exception as e:
-            logger.error(f"Error al obtener recuentos de turnos: {e}")
-        
-        return counts
-    
     def run(self):
         """Método principal que se ejecuta en segundo plano"""
         self.is_running = True
         logger.info("BackgroundWorker iniciado")
+        last_upcoming_check = None
+        last_recurrence_run = None
         
         while self.is_running:
             try:
-                # Verificar cambios en la base de datos
-                if self.check_database_changes():
-                    self.database_changed.emit()
+                # Verificar cambios en la base de datos (una consulta de un solo entero)
+                has_changes, changed_dates = self.check_database_changes()
+                if has_changes:
+                    self.database_changed.emit(changed_dates)
                     logger.info("Se detectaron cambios en la base de datos, notificando a la interfaz")
                 
                 # Verificar turnos próximos
-                upcoming = self.check_upcoming_appointments()
-                if upcoming:
-                    self.upcoming_appointments.emit(upcoming)
-                    logger.info(f"Se encontraron {len(upcoming)} turnos próximos")
+                now = time.monotonic()
+                if last_upcoming_check is None or now - last_upcoming_check >= self.UPCOMING_INTERVAL:
+                    last_upcoming_check = now
+                    upcoming = self.check_upcoming_appointments()
+                    if upcoming:
+                        self.upcoming_appointments.emit(upcoming)
+                        logger.info(f"Se encontraron {len(upcoming)} turnos próximos")
+                
+                # Extender las series repetidas; los turnos nuevos se ven en el
+                # siguiente check_database_changes por el registro de cambios
+                if last_recurrence_run is None or now - last_recurrence_run >= self.RECURRENCE_INTERVAL:
+                    last_recurrence_run = now
+                    self.expand_recurring_appointments()
                 
                 # Dormir para no consumir muchos recursos
-                time.sleep(30)  # Verificar cada 30 segundos
+                time.sleep(self.POLL_INTERVAL)
                 
             except Exception as e:
                 logger.error(f"Error en el ciclo de trabajo en segundo plano: {e}")
                 time.sleep(60)  # Esperar un poco más si hay error
     
     def check_database_changes(self):
-        """Verifica si han habido cambios en la base de datos desde la última verificación"""
-        current_time = datetime.datetime.now()
-        # Solo verificar si han pasado al menos 30 segundos desde la última verificación
-        if (current_time - self.last_check_time).total_seconds() < 30:
-            return False
-            
+        """
+        Compara la versión del registro de cambios con la última vista. Devuelve
+        (hubo_cambios, fechas): las fechas de turnos afectadas, o None si hay
+        que recargar todo. Solo lee las filas nuevas del registro cuando la
+        versión cambió, y descarta del caché los meses de esas fechas. Los
+        cambios que este proceso ya aplicó al caché (appointment_service) se
+        saltean: la interfaz ya los muestra.
+        """
         session = Session()
         try:
-            has_changes = False
-            today = datetime.date.today()
-            current_month = today.month
-            current_year = today.year
-            
-            next_month = current_month + 1
-            next_year = current_year
-            if next_month > 12:
-                next_month = 1
-                next_year += 1
-            
-            # Verificar cambios en el mes actual
-            current_month_counts = self.get_appointment_counts(session, current_month, current_year)
-            if current_month_counts != self.db_last_update['current_month']:
-                has_changes = True
-                self.db_last_update['current_month'] = current_month_counts
-            
-            # Verificar cambios en el mes siguiente
-            next_month_counts = self.get_appointment_counts(session, next_month, next_year)
-            if next_month_counts != self.db_last_update['next_month']:
-                has_changes = True
-                self.db_last_update['next_month'] = next_month_counts
-            
-            # Actualizar tiempo de último chequeo
-            self.last_check_time = current_time
+            version = get_data_version(session.connection())
+            self.last_check_time = datetime.datetime.now()
+            # Se toman siempre, aunque no haya nada que revisar, para que las
+            # versiones ya vistas no queden guardadas
+            applied = appointment_cache.take_applied_versions(version)
+            if self.last_version is None:
+                self.last_version = version
+                return False, set()
+            if version == self.last_version:
+                return False, set()
+            if version < self.last_version:
+                # El registro es más viejo que el visto (por ejemplo, se restauró un backup)
+                self.last_version = version
+                appointment_cache.invalidate()
+                return True, None
+            
+            changes = session.query(ChangeLog.version, ChangeLog.table_name, ChangeLog.row_id, ChangeLog.op,
+                                    ChangeLog.date).filter(
+                ChangeLog.version > self.last_version,
+                ChangeLog.version <= version
+            ).all()
             
-            return has_changes
+            changed_dates = set()
+            changed_clients = set()
+            for change_version, table_name, row_id, op, changed_date in changes:
+                if change_version in applied:
+                    continue
+                if table_name == 'appointments':
+                    changed_dates.add(changed_date)
+                elif op == 'U':
+                    # Los turnos en pantalla muestran los datos del cliente
+                    changed_clients.add(row_id)
+            if changed_clients:
+                client_dates = session.query(Appointment.date).filter(
+                    Appointment.client_id.in_(changed_clients)
+                ).distinct().all()
+                changed_dates.update(appointment_date for (appointment_date,) in client_dates)
+            changed_dates.discard(None)
+            
+            self.last_version = version
+            if changed_dates:
+                appointment_cache.invalidate(changed_dates)
+            return bool(changed_dates), changed_dates
             
         except Exception as e:
             logger.error(f"Error al verificar cambios en la base de datos: {e}")
-            return False
+            return False, set()
+        finally:
+            session.close()
+    
+    def expand_recurring_appointments(self):
+        """Crea los turnos que faltan de las series repetidas hasta el horizonte"""
+        session = Session()
+        try:
+            result = expand_recurring(session)
+            if result.created:
+                logger.info(f"Se crearon {result.created} turnos de series repetidas")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Error al extender los turnos repetidos: {e}")
         finally:
             session.close()
     
     def check_upcoming_appointments(self):
         """Verifica si hay turnos próximos que deben ser notificados"""
-        session = Session()
         try:
             current_time = datetime.datetime.now().time()
             current_date = datetime.date.today()
             
-            # Buscar turnos en las próximas 2 horas
+            # Buscar turnos en las próximas 2 horas (del caché compartido con el calendario)
             two_hours_later = (datetime.datetime.combine(datetime.date.today(), current_time) + 
                              datetime.timedelta(hours=2)).time()
             
-            upcoming_appointments = session.query(Appointment).filter(
-                Appointment.date == current_date,
-                Appointment.time > current_time,
-                Appointment.time <= two_hours_later
-            ).order_by(Appointment.time).all()
+            upcoming_appointments = [
+                appointment for appointment in appointment_cache.get_day(current_date)
+                if current_time < appointment.time <= two_hours_later
+            ]
             
             # Convertir a lista de diccionarios para pasar a través de la señal
             result = []
@@ -179,9 +187,9 @@ class BackgroundWorker(QObject):
                 result.append({
                     'id': appointment.id,
                     'time': appointment.time.strftime('%H:%M'),
-                    'client_name': f"{appointment.client.lastname} {appointment.client.name}",
-                    'dog_name': appointment.client.dog_name,
-                    'phone': appointment.client.phone,
+                    'client_name': appointment.client_full_name,
+                    'dog_name': appointment.client_dog_name,
+                    'phone': appointment.client_phone,
                     'confirmed': appointment.confirmed
                 })
             
@@ -190,8 +198,6 @@ class BackgroundWorker(QObject):
         except Exception as e:
             logger.error(f"Error al verificar turnos próximos: {e}")
             return []
-        finally:
-            session.close()
     
     def stop(self):
         """Detiene el hilo de trabajo"""
@@ -223,10 +229,10 @@ class BackgroundTaskManager:
         if self.parent and hasattr(self.parent, 'notify_upcoming_appointments'):
             self.parent.notify_upcoming_appointments(appointments)
     
-    def handle_database_changed(self):
+    def handle_database_changed(self, changed_dates):
         """Maneja la señal de cambios en la base de datos"""
         if self.parent and hasattr(self.parent, 'refresh_calendar_data'):
-            self.parent.refresh_calendar_data()
+            self.parent.refresh_calendar_data(changed_dates)
     
     def stop(self):
         """Detiene todas las tareas en segundo plano"""
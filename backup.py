@@ -1,11 +1,18 @@
 import os
 import shutil
+import sqlite3
 import time
 import logging
 from logging.handlers import RotatingFileHandler
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox, QSizePolicy, QGridLayout
-from database import db_path
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QFileDialog, QMessageBox, QSizePolicy, QGridLayout,
+                             QProgressBar, QLabel)
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+from database import db_path, engine, config, run_migrations, DATA_VERSION_SQL
 from database import init_db
+from appointment_cache import appointment_cache
+from breed_catalog import breed_catalog
+from client_index import client_index
+from slot_finder import slot_finder
 
 def setup_logger():
     logger = logging.getLogger('backup')
@@ -24,33 +31,117 @@ def setup_logger():
 
 logger = setup_logger()
 
-def realizar_backup(backup_path):
+def quick_check(path):
+    """Ejecuta PRAGMA quick_check sobre el archivo dado (nunca sobre la base en uso)"""
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    except sqlite3.DatabaseError as e:
+        logger.error(f"quick_check falló sobre {path}: {e}")
+        return False
+    finally:
+        connection.close()
+
+def copy_database(source_path, target_path, progress=None):
+    """
+    Copia una base SQLite con la API de backup, de a pages_per_step páginas
+    con una pausa entre pasos: las demás conexiones pueden seguir leyendo y
+    escribiendo mientras tanto. progress(copiadas, total) se llama en cada paso.
+    """
+    settings = config['backup']
+
+    def report(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+
+    source = sqlite3.connect(source_path, timeout=config['database']['busy_timeout_ms'] / 1000)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=int(settings['pages_per_step']), progress=report,
+                      sleep=int(settings['step_sleep_ms']) / 1000)
+    finally:
+        target.close()
+        source.close()
+
+def _remove_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def realizar_backup(backup_path, progress=None):
     if not os.path.exists(db_path):
         logger.error(f"Error: El archivo {db_path} no existe")
         return False
+    # Se copia a un archivo temporal y solo se reemplaza el backup anterior si la copia está sana
+    tmp_path = f"{backup_path}.tmp"
     try:
-        shutil.copy2(db_path, backup_path)
-        logger.info(f"Backup realizado exitosamente en {backup_path}")
+        start = time.perf_counter()
+        _remove_file(tmp_path)
+        copy_database(db_path, tmp_path, progress)
+        if not quick_check(tmp_path):
+            logger.error(f"La copia en {tmp_path} no pasó quick_check")
+            _remove_file(tmp_path)
+            return False
+        os.replace(tmp_path, backup_path)
+        logger.info(f"Backup realizado exitosamente en {backup_path} ({time.perf_counter() - start:.2f} s)")
         return True
     except Exception as e:
         logger.error(f"Error al realizar el backup: {str(e)}")
+        _remove_file(tmp_path)
         return False
 
-def restaurar_backup(backup_path):
+def restaurar_backup(backup_path, progress=None):
     if not os.path.exists(backup_path):
         logger.error(f"Error: El archivo {backup_path} no existe")
         return False
     try:
-        shutil.copy2(backup_path, db_path)
+        if not quick_check(backup_path):
+            logger.error(f"El backup {backup_path} no pasó quick_check, no se restaura")
+            return False
+        # La API de backup escribe a través de SQLite: respeta los bloqueos y el WAL
+        copy_database(backup_path, db_path, progress)
+        # Un backup viejo puede no tener las últimas migraciones
+        run_migrations(engine)
+        # Los turnos, razas, clientes y horarios en memoria son de la base anterior
+        appointment_cache.invalidate()
+        breed_catalog.invalidate()
+        client_index.invalidate()
+        slot_finder.invalidate()
         logger.info(f"Backup restaurado exitosamente desde {backup_path}")
         return True
     except Exception as e:
         logger.error(f"Error al restaurar el backup: {str(e)}")
         return False
 
+# Lo que tiene que coincidir para que el auto-backup se considere al día:
+# la versión de change_log (turnos y clientes), la versión del esquema
+# (migraciones) y el contenido de las tablas sin triggers de change_log
+BACKUP_SIGNATURE_QUERIES = [
+    DATA_VERSION_SQL,
+    "PRAGMA user_version",
+    "SELECT group_concat(id || ':' || name, '|') FROM (SELECT id, name FROM breeds ORDER BY id)",
+    "SELECT group_concat(id || ':' || coalesce(generated_until, ''), '|') "
+    "FROM (SELECT id, generated_until FROM appointment_series ORDER BY id)",
+]
+
+def backup_signature(path):
+    """Firma de los datos del archivo dado (BACKUP_SIGNATURE_QUERIES), o None si no se puede leer"""
+    if not os.path.exists(path):
+        return None
+    connection = sqlite3.connect(path)
+    try:
+        return tuple(connection.execute(query).fetchone()[0] for query in BACKUP_SIGNATURE_QUERIES)
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        connection.close()
+
 def create_auto_backup():
-    time.sleep(1)  # Wait for 1 second
     auto_backup_path = os.path.join(os.path.dirname(db_path), "auto_backup.db")
+    # Si no hubo cambios desde el último auto-backup no hace falta copiar de nuevo
+    current_signature = backup_signature(db_path)
+    if current_signature is not None and current_signature == backup_signature(auto_backup_path):
+        logger.info("Auto-backup al día, no se copia la base de datos")
+        return
     if realizar_backup(auto_backup_path):
         logger.info("Auto-backup creado exitosamente")
     else:
@@ -64,9 +155,10 @@ def restore_from_auto_backup():
         return False, None
     
     try:
-        # Eliminar la base de datos actual si existe
-        if os.path.exists(db_path):
-            os.remove(db_path)
+        # Eliminar la base de datos actual si existe, con sus archivos de WAL:
+        # un WAL viejo se aplicaría sobre la base restaurada
+        for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+            _remove_file(path)
         
         # Copiar el auto-backup y renombrarlo
         shutil.copy2(auto_backup_path, db_path)
@@ -96,9 +188,32 @@ def try_restore_database(max_attempts=3, delay=1):
     logger.error(f"Todos los intentos de restauración fallaron después de {max_attempts} intentos")
     return False, None
 
+class BackupWorker(QObject):
+    """
+    Ejecuta realizar_backup o restaurar_backup en un QThread para no trabar la GUI
+    """
+    progress = pyqtSignal(int, int)  # Páginas copiadas, total de páginas
+    finished = pyqtSignal(bool, str)  # Resultado, ruta del backup
+
+    def __init__(self, operation, backup_path):
+        super().__init__()
+        self.operation = operation
+        self.backup_path = backup_path
+
+    def run(self):
+        try:
+            success = self.operation(self.backup_path, self.progress.emit)
+        except Exception as e:
+            logger.error(f"Error en BackupWorker: {e}")
+            success = False
+        self.finished.emit(success, self.backup_path)
+
+
 class BackupWidget(QWidget):
     def __init__(self):
         super().__init__()
+        self.thread = None
+        self.worker = None
         self.init_ui()
         logger.info("BackupWidget inicializado")
 
@@ -115,6 +230,7 @@ class BackupWidget(QWidget):
         backup_btn.setFixedHeight(self.height() // 8)
         backup_btn.setObjectName("backup_button")  #
         layout.addWidget(backup_btn, 0, 1)
+        self.backup_btn = backup_btn
 
         # Botón Restaurar Backup
         restore_btn = QPushButton("Cargar Backup")
@@ -123,6 +239,15 @@ class BackupWidget(QWidget):
         restore_btn.setFixedHeight(self.height() // 8)
         restore_btn.setObjectName("restore_button")  # 
         layout.addWidget(restore_btn, 1, 1)
+        self.restore_btn = restore_btn
+
+        # Progreso de la copia, visible solo mientras corre
+        self.status_label = QLabel()
+        self.status_label.hide()
+        layout.addWidget(self.status_label, 2, 1)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar, 3, 1)
 
         self.setLayout(layout)
 
@@ -175,6 +300,53 @@ class BackupWidget(QWidget):
         """
         self.setStyleSheet(style)
 
+    def start_operation(self, operation, backup_path, message):
+        """Corre operation(backup_path, progress) en un QThread mostrando el progreso"""
+        self.backup_btn.setEnabled(False)
+        self.restore_btn.setEnabled(False)
+        self.status_label.setText(message)
+        self.status_label.show()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+
+        self.thread = QThread()
+        self.worker = BackupWorker(operation, backup_path)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.finished.connect(
+            lambda success, path: self.operation_finished(operation, success, path))
+        self.thread.start()
+
+    def update_progress(self, copied, total):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(copied)
+
+    def operation_finished(self, operation, success, backup_path):
+        self.thread.wait()
+        self.thread = None
+        self.worker = None
+        self.progress_bar.hide()
+        self.status_label.hide()
+        self.backup_btn.setEnabled(True)
+        self.restore_btn.setEnabled(True)
+
+        if operation is realizar_backup:
+            if success:
+                logger.info(f"Backup realizado exitosamente en {backup_path}")
+                QMessageBox.information(self, "Éxito", "Backup realizado correctamente")
+            else:
+                logger.error(f"No se pudo realizar el backup en {backup_path}")
+                QMessageBox.warning(self, "Error", "No se pudo realizar el backup")
+        else:
+            if success:
+                logger.info(f"Backup restaurado exitosamente desde {backup_path}")
+                QMessageBox.information(self, "Éxito", "Backup restaurado correctamente")
+            else:
+                logger.error(f"No se pudo restaurar el backup desde {backup_path}")
+                QMessageBox.warning(self, "Error", "No se pudo restaurar el backup")
+
     def do_backup(self):
         backup_path, _ = QFileDialog.getSaveFileName(self, "Guardar Backup", "", "Database Files (*.db)")
         if backup_path:
@@ -183,12 +355,7 @@ class BackupWidget(QWidget):
                 QMessageBox.warning(self, "Nombre no permitido", "No se permite guardar con el nombre 'dog_grooming.db'")
                 return
             
-            if realizar_backup(backup_path):
-                logger.info(f"Backup realizado exitosamente en {backup_path}")
-                QMessageBox.information(self, "Éxito", "Backup realizado correctamente")
-            else:
-                logger.error(f"No se pudo realizar el backup en {backup_path}")
-                QMessageBox.warning(self, "Error", "No se pudo realizar el backup")
+            self.start_operation(realizar_backup, backup_path, "Guardando backup...")
 
     def do_restore(self):
         backup_path, _ = QFileDialog.getOpenFileName(self, "Seleccionar Backup", "", "Database Files (*.db)")
@@ -197,9 +364,4 @@ class BackupWidget(QWidget):
             QMessageBox.warning(self, "Nombre no permitido", "No se permite cargar una base de datos con el nombre 'dog_grooming.db'")
             return
         if backup_path:
-            if restaurar_backup(backup_path):
-                logger.info(f"Backup restaurado exitosamente desde {backup_path}")
-                QMessageBox.information(self, "Éxito", "Backup restaurado correctamente")
-            else:
-                logger.error(f"No se pudo restaurar el backup desde {backup_path}")
-                QMessageBox.warning(self, "Error", "No se pudo restaurar el backup")
\ No newline at end of file
+            self.start_operation(restaurar_backup, backup_path, "Restaurando backup...")
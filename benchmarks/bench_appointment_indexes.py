@@ -0,0 +1,132 @@
+"""
+Benchmark de los índices de appointments.
+
+Crea una base de datos temporal con muchos turnos (500.000 por defecto),
+mide las consultas más frecuentes sin índices, aplica las migraciones de
+init_db y vuelve a medir. Muestra el plan de consulta (EXPLAIN QUERY PLAN)
+y la latencia mediana de cada consulta antes y después.
+
+Uso:
+    python benchmarks/bench_appointment_indexes.py [--rows 500000] [--repeat 20]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from database import Base, Appointment, Client, run_migrations
+
+
+def populate(engine, rows, clients):
+    random.seed(42)
+    client_rows = [
+        {'lastname': f"Apellido{i}", 'name': f"Nombre{i}", 'address': f"Calle {i}",
+         'phone': f"{i:010d}", 'dog_name': f"Perro{i}", 'breed': "Caniche", 'comments': ""}
+        for i in range(clients)
+    ]
+    first_day = datetime.date.today() - datetime.timedelta(days=365 * 8)
+    total_days = 365 * 9
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), client_rows)
+        batch = []
+        for _ in range(rows):
+            batch.append({
+                'date': first_day + datetime.timedelta(days=random.randrange(total_days)),
+                'time': datetime.time(random.randint(8, 19), random.choice((0, 15, 30, 45))),
+                'repeat_weekly': random.random() < 0.2,
+                'repeat_monthly': False,
+                'confirmed': random.random() < 0.5,
+                'status': random.choice(("Baño", "Corte", "Baño y corte")),
+                'price': float(random.randint(10, 60) * 100),
+                'client_id': random.randint(1, clients),
+            })
+            if len(batch) == 50000:
+                connection.execute(Appointment.__table__.insert(), batch)
+                batch = []
+        if batch:
+            connection.execute(Appointment.__table__.insert(), batch)
+
+
+def hot_queries(engine):
+    """Consultas equivalentes a las que hace la aplicación, con sus parámetros"""
+    columns = Appointment.__table__.c
+    date_param = columns.date.type.dialect_impl(engine.dialect).bind_processor(engine.dialect)
+    time_param = columns.time.type.dialect_impl(engine.dialect).bind_processor(engine.dialect)
+    today = datetime.date.today()
+    return [
+        ("Turnos del día (load_appointments)",
+         "SELECT appointments.*, clients.* FROM appointments "
+         "LEFT OUTER JOIN clients ON clients.id = appointments.client_id "
+         "WHERE appointments.date = ? ORDER BY appointments.time",
+         (date_param(today),)),
+        ("Turnos próximos (check_upcoming_appointments)",
+         "SELECT * FROM appointments WHERE date = ? AND time > ? AND time <= ? ORDER BY time",
+         (date_param(today), time_param(datetime.time(10, 0)), time_param(datetime.time(12, 0)))),
+        ("Turnos a repetir (repeat_weekly_appointments)",
+         "SELECT * FROM appointments WHERE date = ? AND repeat_weekly = 1",
+         (date_param(today),)),
+        ("Turnos futuros de un cliente (delete_client)",
+         "SELECT * FROM appointments WHERE client_id = ? AND date >= ?",
+         (17, date_param(today))),
+    ]
+
+
+def measure(engine, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for name, sql, params in hot_queries(engine):
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                connection.exec_driver_sql(sql, params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        # Partimos de un esquema sin índices, como las bases de datos existentes
+        with engine.begin() as connection:
+            for index in Appointment.__table__.indexes:
+                index.drop(connection)
+
+        print(f"Generando {args.rows} turnos para {args.clients} clientes...")
+        start = time.perf_counter()
+        populate(engine, args.rows, args.clients)
+        print(f"Datos generados en {time.perf_counter() - start:.1f} s\n")
+
+        before = measure(engine, args.repeat)
+        start = time.perf_counter()
+        run_migrations(engine)
+        print(f"Migraciones aplicadas en {time.perf_counter() - start:.1f} s\n")
+        after = measure(engine, args.repeat)
+        engine.dispose()
+
+    for name in before:
+        plan_before, ms_before = before[name]
+        plan_after, ms_after = after[name]
+        print(name)
+        print(f"  antes:   {ms_before:9.3f} ms  | {' / '.join(plan_before)}")
+        print(f"  después: {ms_after:9.3f} ms  | {' / '.join(plan_after)}")
+        print(f"  mejora:  x{ms_before / ms_after if ms_after else float('inf'):.1f}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark de POST /appointments/batch contra el camino de a un turno.
+
+Sobre bases temporales iguales (create_db_engine, WAL) importa N turnos
+nuevos, edita la mitad y borra una cuarta parte:
+- de a uno: un POST, PUT o DELETE por turno, cada uno con su transacción
+- en lote: POST /appointments/batch de a --batch-size operaciones
+
+Para cada forma muestra el tiempo total, las operaciones por segundo y la
+cantidad de pedidos HTTP. Las solicitudes van por el cliente de prueba de
+Flask, así que no se cuenta la latencia de red que el lote también ahorra.
+
+Uso:
+    python benchmarks/bench_batch.py [--appointments 2000] [--batch-size 500]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import tempfile
+import time
+from unittest.mock import patch
+
+from sqlalchemy.orm import sessionmaker, scoped_session
+from database import Base, Client, run_migrations, create_db_engine
+import api
+
+
+def appointment(i):
+    day = datetime.date(2024, 1, 1) + datetime.timedelta(days=i // 20)
+    # 20 turnos de 30 minutos por día, de 8:00 a 18:00, sin superponerse
+    slot = i % 20
+    return {'date': day.isoformat(), 'time': f'{8 + slot // 2:02d}:{slot % 2 * 30:02d}', 'duration': 30,
+            'client_id': 1 + i % 50, 'status': "Baño", 'price': 1500.0, 'confirmed': False, 'comment': ""}
+
+
+def single(client, count):
+    for i in range(count):
+        client.post('/appointments', json=appointment(i))
+    for appointment_id in range(1, count // 2 + 1):
+        data = dict(appointment(appointment_id - 1), confirmed=True)
+        client.put(f'/appointments/{appointment_id}', json=data)
+    for appointment_id in range(count // 2 + 1, count // 2 + count // 4 + 1):
+        client.delete(f'/appointments/{appointment_id}')
+    return count + count // 2 + count // 4
+
+
+def batch(client, count, batch_size):
+    operations = [{'op': 'create', 'data': appointment(i)} for i in range(count)]
+    operations += [{'op': 'update', 'id': appointment_id, 'data': {'confirmed': True}}
+                   for appointment_id in range(1, count // 2 + 1)]
+    operations += [{'op': 'delete', 'id': appointment_id}
+                   for appointment_id in range(count // 2 + 1, count // 2 + count // 4 + 1)]
+    requests = 0
+    # Las altas van primero: las ediciones y bajas usan los ids ya creados
+    for start in range(0, len(operations), batch_size):
+        response = client.post('/appointments/batch', json=operations[start:start + batch_size])
+        assert response.status_code == 200, response.json
+        requests += 1
+    return requests
+
+
+def run(title, scenario, operations):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        with engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), [{'lastname': f"Apellido{i}", 'name': "Nombre"} for i in range(50)])
+        with patch('api.Session', scoped_session(sessionmaker(bind=engine))), patch('appointment_service.appointment_cache'):
+            client = api.app.test_client()
+            start = time.perf_counter()
+            requests = scenario(client)
+            elapsed = time.perf_counter() - start
+        engine.dispose()
+    print(f"  {title:34} {elapsed:8.2f} s  {operations / elapsed:9.0f} op/s  {requests:6d} pedidos HTTP")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    count = args.appointments
+    operations = count + count // 2 + count // 4
+    print(f"{count} altas, {count // 2} ediciones y {count // 4} bajas ({operations} operaciones)")
+    run("De a uno (POST/PUT/DELETE)", lambda client: single(client, count), operations)
+    run(f"POST /appointments/batch ({args.batch_size})", lambda client: batch(client, count, args.batch_size), operations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark del listado de razas del alta y la edición de clientes (breed_catalog).
+
+Crea --breeds razas en una base temporal y mide:
+- abrir el combo de razas:
+  - anterior: consultar todas las razas ordenadas por nombre
+  - BreedCatalog.names: la tupla en memoria
+- ver si una raza ya existe:
+  - anterior: ilike sobre breeds.name (recorre la tabla y no ignora acentos)
+  - BreedCatalog.add: búsqueda en ix_breeds_normalized_name
+
+Uso:
+    python benchmarks/bench_breed_catalog.py [--breeds 2000] [--repeat 500]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+from database import Base, Breed, run_migrations, create_db_engine
+from breed_catalog import BreedCatalog
+
+
+def measure(title, run, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = run()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {title:32} {elapsed * 1000:9.3f} ms")
+    return result
+
+
+def previous_names(Session):
+    session = Session()
+    try:
+        return [breed.name for breed in session.query(Breed).order_by(Breed.name).all()]
+    finally:
+        session.close()
+
+
+def previous_exists(Session, name):
+    session = Session()
+    try:
+        return session.query(Breed).filter(Breed.name.ilike(name)).first() is not None
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--breeds', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        session.add_all([Breed(name=f"Raza {i:05d}") for i in range(args.breeds)])
+        session.commit()
+        session.close()
+
+        catalog = BreedCatalog(Session)
+        print(f"{args.breeds} razas")
+        print("Abrir el combo de razas")
+        expected = measure("anterior (consulta)", lambda: previous_names(Session), args.repeat)
+        names = measure("BreedCatalog.names", catalog.names, args.repeat)
+        assert list(names) == expected
+
+        print("Ver si existe una raza (la última)")
+        name = f"raza {args.breeds - 1:05d}"
+        measure("anterior (ilike)", lambda: previous_exists(Session, name), args.repeat)
+        stored, created = measure("BreedCatalog.add (índice)", lambda: catalog.add(name), args.repeat)
+        assert not created, stored
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark de la búsqueda de clientes del diálogo de turnos (client_index).
+
+Crea --clients clientes con apellidos, nombres y perros al azar y mide, para
+varios textos como los que se escriben letra por letra en el diálogo:
+- anterior: ilike('%texto%') sobre nombre y apellido (una consulta por tecla)
+- ClientIndex.search: búsqueda binaria en la lista de palabras en memoria
+También mide la carga inicial del índice y un sync() sin cambios.
+
+Uso:
+    python benchmarks/bench_client_index.py [--clients 100000] [--repeat 50]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, run_migrations, create_db_engine
+from client_index import ClientIndex
+
+LASTNAMES = ["Pérez", "González", "Rodríguez", "Fernández", "López", "Martínez", "Gómez", "Díaz", "Sánchez",
+             "Romero", "Álvarez", "Torres", "Ruiz", "Ramírez", "Flores", "Benítez", "Acosta", "Medina", "Núñez"]
+NAMES = ["Juan", "Ana", "María", "José", "Lucía", "Carlos", "Sofía", "Martín", "Laura", "Diego", "Paula", "Jorge"]
+DOGS = ["Firulais", "Luna", "Toby", "Rocky", "Lola", "Max", "Coco", "Nina", "Simón", "Kira", "Bruno", "Mora"]
+TERMS = ["pe", "per", "pere", "perez j", "nuñ", "gonzalez ma", "luna", "ro"]
+
+
+def populate(engine, clients):
+    random.seed(42)
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [
+            {'lastname': f"{random.choice(LASTNAMES)}{'' if i % 3 else random.randint(1, 999)}",
+             'name': random.choice(NAMES), 'dog_name': random.choice(DOGS),
+             'phone': f"11 {random.randint(1000, 9999)}-{random.randint(1000, 9999)}", 'comments': "Sin comentarios"}
+            for i in range(clients)
+        ])
+
+
+def previous_search(Session, term, limit):
+    session = Session()
+    try:
+        term = term.lower()
+        return session.query(Client).filter(
+            (Client.name.ilike(f"%{term}%")) | (Client.lastname.ilike(f"%{term}%"))
+        ).limit(limit).all()
+    finally:
+        session.close()
+
+
+def measure(run, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = run()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        populate(engine, args.clients)
+        Session = sessionmaker(bind=engine)
+
+        index = ClientIndex(Session)
+        start = time.perf_counter()
+        index.sync()
+        print(f"{args.clients} clientes; carga del índice {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"sync sin cambios {measure(index.sync, args.repeat)[0]:.3f} ms")
+        print(f"  {'texto':14} {'anterior (ilike)':>18} {'ClientIndex':>14}  resultados")
+        for term in TERMS:
+            # El anterior no sabe buscar varias palabras: se mide igual, como referencia del costo
+            previous_ms, _ = measure(lambda: previous_search(Session, term, args.limit), max(args.repeat // 10, 1))
+            index_ms, results = measure(lambda: index.search(term, args.limit), args.repeat)
+            print(f"  {term!r:14} {previous_ms:15.3f} ms {index_ms:11.3f} ms  {len(results):4d}")
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark de concurrencia de la base de datos.
+
+Simula la carga real de la aplicación con hilos simultáneos:
+- lectores de la GUI: turnos de un día con los datos del cliente
+- el BackgroundWorker: consulta de la versión de datos cada 50 ms
+- escritores de la API: alta de un turno y cambio de confirmación
+
+Se corre dos veces sobre bases temporales iguales: con la configuración
+anterior (create_engine sin opciones, journal_mode=DELETE) y con
+create_db_engine (WAL, synchronous=NORMAL, busy_timeout, pool). Para cada
+rol muestra operaciones por segundo, latencia p50/p95 y errores
+"database is locked".
+
+Uso:
+    python benchmarks/bench_concurrency.py [--rows 50000] [--seconds 10] [--readers 2] [--writers 2]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from database import Base, Appointment, Client, run_migrations, create_db_engine, config, get_data_version
+
+
+def populate(engine, rows, clients):
+    random.seed(42)
+    today = datetime.date.today()
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [
+            {'lastname': f"Apellido{i}", 'name': f"Nombre{i}", 'dog_name': f"Perro{i}"} for i in range(clients)
+        ])
+        connection.execute(Appointment.__table__.insert(), [
+            {'date': today + datetime.timedelta(days=random.randrange(-365, 365)),
+             'time': datetime.time(random.randint(8, 19), random.choice((0, 15, 30, 45))),
+             'confirmed': False, 'status': "Baño", 'price': 1500.0,
+             'client_id': random.randint(1, clients)}
+            for _ in range(rows)
+        ])
+
+
+class Role:
+    def __init__(self, name):
+        self.name = name
+        self.timings = []
+        self.locked = 0
+        self.lock = threading.Lock()
+
+    def record(self, elapsed):
+        with self.lock:
+            self.timings.append(elapsed)
+
+    def record_locked(self):
+        with self.lock:
+            self.locked += 1
+
+
+def run_role(role, stop, operation, pause=0.0):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            operation()
+            role.record((time.perf_counter() - start) * 1000)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            role.record_locked()
+        if pause:
+            time.sleep(pause)
+
+
+def run_scenario(engine, seconds, readers, writers):
+    today = datetime.date.today()
+    columns = Appointment.__table__.c
+    date_param = columns.date.type.dialect_impl(engine.dialect).bind_processor(engine.dialect)
+    time_param = columns.time.type.dialect_impl(engine.dialect).bind_processor(engine.dialect)
+
+    def gui_read():
+        day = date_param(today + datetime.timedelta(days=random.randrange(-30, 30)))
+        with engine.connect() as connection:
+            connection.exec_driver_sql(
+                "SELECT appointments.*, clients.* FROM appointments "
+                "LEFT OUTER JOIN clients ON clients.id = appointments.client_id "
+                "WHERE appointments.date = ? ORDER BY appointments.time", (day,)
+            ).fetchall()
+
+    def worker_poll():
+        with engine.connect() as connection:
+            get_data_version(connection)
+
+    def api_write():
+        with engine.begin() as connection:
+            result = connection.exec_driver_sql(
+                "INSERT INTO appointments (date, time, client_id, confirmed, status) VALUES (?, ?, ?, 0, 'Corte')",
+                (date_param(today), time_param(datetime.time(10, 0)), random.randint(1, 100))
+            )
+            connection.exec_driver_sql("UPDATE appointments SET confirmed = 1 WHERE id = ?", (result.lastrowid,))
+
+    roles = {'GUI (lectura del día)': Role('gui'), 'Worker (versión de datos)': Role('worker'),
+             'API (alta + confirmación)': Role('api')}
+    gui, worker, api = roles.values()
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_role, args=(gui, stop, gui_read)) for _ in range(readers)]
+    threads.append(threading.Thread(target=run_role, args=(worker, stop, worker_poll, 0.05)))
+    threads += [threading.Thread(target=run_role, args=(api, stop, api_write)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return roles
+
+
+def report(title, roles, seconds):
+    print(title)
+    for name, role in roles.items():
+        if role.timings:
+            timings = sorted(role.timings)
+            p50 = statistics.median(timings)
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        else:
+            p50 = p95 = float('nan')
+        print(f"  {name:28} {len(role.timings) / seconds:9.1f} op/s  p50 {p50:8.2f} ms  "
+              f"p95 {p95:8.2f} ms  bloqueos {role.locked}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--writers', type=int, default=2)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("Configuración anterior (create_engine por defecto, journal DELETE)",
+         lambda path: create_engine(f"sqlite:///{path}")),
+        (f"create_db_engine ({config['database']['journal_mode']}, synchronous={config['database']['synchronous']})",
+         lambda path: create_db_engine(path)),
+    ]
+    for title, make_engine in scenarios:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = make_engine(os.path.join(tmp_dir, 'bench.db'))
+            Base.metadata.create_all(engine)
+            run_migrations(engine)
+            populate(engine, args.rows, args.clients)
+            roles = run_scenario(engine, args.seconds, args.readers, args.writers)
+            engine.dispose()
+        report(title, roles, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark de la detección de superposiciones de turnos (appointment_service).
+
+Llena una base temporal con --days días de turnos sin superposiciones de
+15 a 90 minutos entre las 8 y las 20 y mide:
+- control de un turno nuevo contra su día:
+  - anterior: leer todos los turnos del día y compararlos uno por uno
+  - find_conflict: una búsqueda en ix_appointments_date_start
+- control de un lote de --batch altas repartidas en todo el rango:
+  - una consulta find_conflict por alta
+  - DayIntervals (lo que hace apply_batch): una consulta y bisect en memoria
+- reporte de superposiciones de todo el rango:
+  - anterior: leer todo y comparar cada par de turnos de cada día
+  - find_overlaps: un recorrido por día con funciones de ventana
+
+Uso:
+    python benchmarks/bench_conflicts.py [--days 730] [--batch 500] [--repeat 200]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from database import Base, Appointment, Client, run_migrations, create_db_engine
+from appointment_service import find_conflict, find_overlaps, appointment_interval, DayIntervals
+
+
+def populate(engine, start, days):
+    random.seed(42)
+    rows = []
+    for offset in range(days):
+        day = start + datetime.timedelta(days=offset)
+        minute = 8 * 60
+        while True:
+            duration = random.choice((15, 30, 60, 90))
+            if minute + duration > 20 * 60:
+                break
+            rows.append({'date': day, 'time': datetime.time(minute // 60, minute % 60), 'duration': duration,
+                         'client_id': 1 + len(rows) % 500, 'status': "Baño", 'price': 1500.0, 'confirmed': False})
+            # Algunos huecos libres entre turnos
+            minute += duration + random.choice((0, 0, 15, 30))
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [{'lastname': f"Apellido{i}"} for i in range(500)])
+        connection.execute(Appointment.__table__.insert(), rows)
+    return len(rows)
+
+
+def previous_conflict(session, day, start_time, duration):
+    start, end = appointment_interval(start_time, duration)
+    for appointment in session.query(Appointment).filter(Appointment.date == day):
+        other_start, other_end = appointment_interval(appointment.time, appointment.duration)
+        if other_start < end and start < other_end:
+            return appointment.id
+    return None
+
+
+def batch_with_intervals(session, candidates):
+    days = defaultdict(DayIntervals)
+    rows = session.execute(
+        select(Appointment.id, Appointment.date, Appointment.start_minute, Appointment.end_minute)
+        .where(Appointment.date.in_({day for day, _, _ in candidates}))
+        .order_by(Appointment.date, Appointment.start_minute)
+    )
+    for row in rows:
+        days[row.date].add(row.start_minute, row.end_minute, row.id)
+    conflicts = 0
+    for day, start_time, duration in candidates:
+        start, end = appointment_interval(start_time, duration)
+        if days[day].conflict(start, end) is None:
+            days[day].add(start, end, None)
+        else:
+            conflicts += 1
+    return conflicts
+
+
+def batch_one_by_one(session, candidates):
+    # Sin registrar las altas: solo el costo de las consultas
+    return sum(1 for day, start_time, duration in candidates
+               if find_conflict(session, day, start_time, duration) is not None)
+
+
+def previous_overlaps(session, start, end):
+    days = defaultdict(list)
+    for appointment in session.query(Appointment).filter(Appointment.date.between(start, end)):
+        days[appointment.date].append(appointment_interval(appointment.time, appointment.duration))
+    return sum(1 for intervals in days.values()
+               for i, (a_start, a_end) in enumerate(intervals)
+               for b_start, b_end in intervals[i + 1:]
+               if a_start < b_end and b_start < a_end)
+
+
+def measure(title, run, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = run()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"  {title:36} {elapsed * 1000:9.3f} ms  (resultado: {result})")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        start = datetime.date(2024, 1, 1)
+        end = start + datetime.timedelta(days=args.days - 1)
+        rows = populate(engine, start, args.days)
+        session = sessionmaker(bind=engine)()
+        print(f"{rows} turnos en {args.days} días")
+
+        day = start + datetime.timedelta(days=args.days // 2)
+        print("Un turno nuevo de 60 minutos a las 14:00")
+        expected = measure("anterior (todo el día)", lambda: previous_conflict(session, day, datetime.time(14), 60),
+                           args.repeat)
+        found = measure("find_conflict",
+                        lambda: find_conflict(session, day, datetime.time(14), 60), args.repeat)
+        assert (found is None) == (expected is None), (found, expected)
+
+        random.seed(7)
+        candidates = [(start + datetime.timedelta(days=random.randrange(args.days)),
+                       datetime.time(random.randint(8, 18), random.choice((0, 15, 30, 45))), 60)
+                      for _ in range(args.batch)]
+        print(f"Lote de {args.batch} altas")
+        measure("find_conflict por alta", lambda: batch_one_by_one(session, candidates), max(args.repeat // 20, 1))
+        measure("DayIntervals (apply_batch)", lambda: batch_with_intervals(session, candidates),
+                max(args.repeat // 20, 1))
+
+        with engine.begin() as connection:
+            # Algunas superposiciones para el reporte
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': start + datetime.timedelta(days=offset), 'time': datetime.time(12, 10), 'duration': 30}
+                for offset in range(0, args.days, 7)
+            ])
+        print("Reporte de superposiciones de todo el rango")
+        # El anterior cuenta pares de turnos; find_overlaps, grupos de turnos encadenados
+        measure("anterior (pares de cada día)", lambda: previous_overlaps(session, start, end), 1)
+        measure("find_overlaps (grupos)", lambda: len(find_overlaps(session, start, end)), 1)
+        session.close()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark de las exportaciones de la API.
+
+Llena una base temporal con N turnos y recorre GET /export/appointments
+(NDJSON y CSV) con el cliente de prueba de Flask, consumiendo la respuesta
+de a partes como lo haría un cliente HTTP. Para cada formato muestra el
+tiempo total, filas por segundo y el pico de memoria de Python (tracemalloc,
+en una segunda pasada), que tiene que mantenerse constante aunque crezca la
+tabla.
+
+Con --compare también mide la forma anterior (query(Appointment).all() y
+un único jsonify), que arma toda la respuesta en memoria.
+
+Uso:
+    python benchmarks/bench_export.py [--rows 1000000] [--compare]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from flask import jsonify
+from sqlalchemy.orm import sessionmaker, scoped_session
+from database import Base, Appointment, Client, run_migrations, create_db_engine
+import api
+
+
+def populate(engine, rows, clients, batch=50000):
+    random.seed(42)
+    today = datetime.date.today()
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [
+            {'lastname': f"Apellido{i}", 'name': f"Nombre{i}", 'dog_name': f"Perro{i}"} for i in range(clients)
+        ])
+        for start in range(0, rows, batch):
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': today + datetime.timedelta(days=random.randrange(-3650, 365)),
+                 'time': datetime.time(random.randint(8, 19), random.choice((0, 15, 30, 45))),
+                 'confirmed': False, 'status': "Baño", 'price': 1500.0, 'appoint_comment': "",
+                 'client_id': random.randint(1, clients)}
+                for _ in range(min(batch, rows - start))
+            ])
+
+
+def measure(title, run):
+    start = time.perf_counter()
+    rows, size = run()
+    elapsed = time.perf_counter() - start
+    # tracemalloc hace todo varias veces más lento: la memoria se mide en una segunda pasada
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {title:34} {elapsed:8.2f} s  {rows / elapsed:10.0f} filas/s  "
+          f"{size / 1024 / 1024:8.1f} MB enviados  pico de memoria {peak / 1024 / 1024:8.1f} MB")
+
+
+def stream_export(client, url):
+    def run():
+        response = client.get(url)
+        size = lines = 0
+        for chunk in response.response:
+            size += len(chunk)
+            lines += chunk.count(b'\n')
+        response.close()
+        return lines, size
+    return run
+
+
+def full_list(Session):
+    # Versión anterior de get_appointments: todos los objetos y un solo JSON
+    def run():
+        with api.app.app_context():
+            session = Session()
+            appointments = session.query(Appointment).all()
+            body = jsonify([api.appointment_to_dict(appt) for appt in appointments]).get_data()
+            session.close()
+            return len(appointments), len(body)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--compare', action='store_true', help="medir también la lista completa en memoria")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        print(f"Cargando {args.rows} turnos...")
+        populate(engine, args.rows, args.clients)
+        Session = sessionmaker(bind=engine)
+
+        with patch('api.Session', scoped_session(Session)):
+            client = api.app.test_client()
+            print(f"Exportación de {args.rows} turnos")
+            measure("GET /export/appointments (NDJSON)", stream_export(client, '/export/appointments'))
+            measure("GET /export/appointments (CSV)", stream_export(client, '/export/appointments?format=csv'))
+            if args.compare:
+                measure("query().all() + jsonify (anterior)", full_list(Session))
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark de la extensión de turnos repetidos (recurrence.expand_recurring).
+
+Crea --clients clientes con un turno semanal (y --monthly de ellos con uno
+mensual) en la semana actual y extiende las series hasta --weeks semanas:
+- anterior: la lógica de "Repetir Turnos" aplicada día por día, con una
+  consulta de existencia por turno (N+1)
+- expand_recurring: un único INSERT ... SELECT con CTE recursivo
+Después mide una segunda pasada de expand_recurring, que no tiene nada que
+crear (lo que hace el BackgroundWorker cada hora).
+
+Uso:
+    python benchmarks/bench_recurrence.py [--clients 5000] [--monthly 1000] [--weeks 12]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+from sqlalchemy.orm import sessionmaker
+from database import Base, Appointment, Client, run_migrations, create_db_engine
+from recurrence import expand_recurring, horizon_date
+
+
+def populate(engine, clients, monthly):
+    random.seed(42)
+    today = datetime.date.today()
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [{'lastname': f"Apellido{i}"} for i in range(clients)])
+        connection.execute(Appointment.__table__.insert(), [
+            {'date': today + datetime.timedelta(days=random.randrange(7)),
+             'time': datetime.time(random.randint(8, 19), random.choice((0, 15, 30, 45))),
+             'client_id': i + 1, 'status': "Baño", 'price': 1500.0, 'confirmed': False,
+             'repeat_weekly': i >= monthly, 'repeat_monthly': i < monthly}
+            for i in range(clients)
+        ])
+
+
+def previous_repeat(session, horizon):
+    # repeat_weekly_appointments anterior, para cada día hasta el horizonte
+    created = 0
+    day = datetime.date.today()
+    while day + datetime.timedelta(days=7) <= horizon:
+        next_week = day + datetime.timedelta(days=7)
+        appointments = session.query(Appointment).filter(
+            Appointment.date == day, Appointment.repeat_weekly == True
+        ).all()
+        for appointment in appointments:
+            existing = session.query(Appointment).filter(
+                Appointment.date == next_week,
+                Appointment.time == appointment.time,
+                Appointment.client_id == appointment.client_id
+            ).first()
+            if not existing:
+                session.add(Appointment(date=next_week, time=appointment.time, client_id=appointment.client_id,
+                                        repeat_weekly=appointment.repeat_weekly,
+                                        repeat_monthly=appointment.repeat_monthly))
+                created += 1
+        session.commit()
+        day += datetime.timedelta(days=1)
+    return created
+
+
+def run(title, scenario, args, second_pass=False):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        populate(engine, args.clients, args.monthly)
+        session = sessionmaker(bind=engine)()
+        horizon = horizon_date(weeks=args.weeks)
+        with patch('recurrence.appointment_cache'):
+            start = time.perf_counter()
+            created = scenario(session, horizon)
+            elapsed = time.perf_counter() - start
+            print(f"  {title:34} {elapsed:8.2f} s  {created:8d} turnos creados")
+            if second_pass:
+                start = time.perf_counter()
+                created = scenario(session, horizon)
+                elapsed = time.perf_counter() - start
+                print(f"  {'  segunda pasada (sin cambios)':34} {elapsed:8.2f} s  {created:8d} turnos creados")
+        session.close()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=5000)
+    parser.add_argument('--monthly', type=int, default=1000, help="clientes con turno mensual en vez de semanal")
+    parser.add_argument('--weeks', type=int, default=12)
+    args = parser.parse_args()
+
+    print(f"{args.clients} series ({args.monthly} mensuales) extendidas {args.weeks} semanas")
+    run("Repetir Turnos día por día (anterior)", previous_repeat, args)
+    run("expand_recurring", lambda session, horizon: expand_recurring(session, horizon).created, args, second_pass=True)
+
+
+if __name__ == '__main__':
+    main()
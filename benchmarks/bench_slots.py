@@ -0,0 +1,120 @@
+"""
+Benchmark del buscador de horarios libres (slot_finder.SlotFinder).
+
+Llena una base temporal con un año de turnos de una hora en el horario de
+atención, ocupando cada hora con probabilidad --density, y busca los
+próximos --count horarios libres de 1 y de 2 horas en todo el año:
+- día por día: una consulta por día y una prueba de superposición contra
+  cada turno del día por cada horario candidato (lo que haría una búsqueda
+  directa)
+- SlotFinder en frío: arma los mapas de ocupación con una consulta
+- SlotFinder en caliente: mapas ya en memoria (solo consulta la versión)
+
+Uso:
+    python benchmarks/bench_slots.py [--density 0.97] [--count 10] [--repeat 20]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import random
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+from database import Base, Appointment, Client, run_migrations, create_db_engine, config
+from slot_finder import SlotFinder, parse_minutes
+
+DAYS = 365
+
+
+def populate(engine, start, density):
+    random.seed(42)
+    settings = config['slots']
+    first_hour = parse_minutes(settings['day_start']) // 60
+    last_hour = parse_minutes(settings['day_end']) // 60
+    rows = []
+    for offset in range(DAYS):
+        day = start + datetime.timedelta(days=offset)
+        if day.weekday() in settings['closed_weekdays']:
+            continue
+        for hour in range(first_hour, last_hour):
+            if random.random() < density:
+                rows.append({'date': day, 'time': datetime.time(hour, 0), 'client_id': 1 + len(rows) % 500,
+                             'status': "Baño", 'price': 1500.0, 'confirmed': False})
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [{'lastname': f"Apellido{i}"} for i in range(500)])
+        connection.execute(Appointment.__table__.insert(), rows)
+    return len(rows)
+
+
+def day_by_day(Session, start, end, count, minutes):
+    settings = config['slots']
+    day_start, day_end = parse_minutes(settings['day_start']), parse_minutes(settings['day_end'])
+    step, length = settings['bucket_minutes'], settings['appointment_minutes']
+    session = Session()
+    slots = []
+    day = start
+    while day <= end and len(slots) < count:
+        if day.weekday() not in settings['closed_weekdays']:
+            booked = [t.hour * 60 + t.minute for (t,) in session.query(Appointment.time).filter(Appointment.date == day)]
+            candidate = day_start
+            while candidate + minutes <= day_end and len(slots) < count:
+                if all(candidate + minutes <= b or b + length <= candidate for b in booked):
+                    slots.append(datetime.datetime.combine(day, datetime.time(candidate // 60, candidate % 60)))
+                    candidate += minutes
+                else:
+                    candidate += step
+        day += datetime.timedelta(days=1)
+    session.close()
+    return slots
+
+
+def measure(title, run, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        slots = run()
+    elapsed = (time.perf_counter() - start) / repeat
+    last = slots[-1].strftime('%d/%m %H:%M') if slots else "-"
+    print(f"  {title:36} {elapsed * 1000:9.2f} ms  {len(slots):3d} horarios (último {last})")
+    return slots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--density', type=float, default=0.97)
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'bench.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        start = datetime.date(2024, 1, 1)
+        end = start + datetime.timedelta(days=DAYS - 1)
+        rows = populate(engine, start, args.density)
+        Session = sessionmaker(bind=engine)
+        print(f"{rows} turnos en {DAYS} días (ocupación {args.density:.0%}); próximos {args.count} horarios libres")
+
+        for minutes in (60, 120):
+            print(f"Turnos de {minutes} minutos")
+            expected = measure("día por día", lambda: day_by_day(Session, start, end, args.count, minutes), args.repeat)
+
+            def cold():
+                finder = SlotFinder(session_factory=Session)
+                return finder.find_free_slots(start, end, args.count, minutes)
+            measure("SlotFinder (en frío)", cold, args.repeat)
+
+            finder = SlotFinder(session_factory=Session)
+            finder.find_free_slots(start, end, args.count, minutes)
+            slots = measure("SlotFinder (mapas en memoria)",
+                            lambda: finder.find_free_slots(start, end, args.count, minutes), args.repeat)
+            assert slots == expected, (slots, expected)
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
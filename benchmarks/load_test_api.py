@@ -0,0 +1,145 @@
+"""
+Prueba de carga de los endpoints de lectura de la API.
+
+Lanza --clients clientes HTTP concurrentes (50 por defecto) durante
+--seconds segundos contra:
+- GET /appointments?date_from=hoy&date_to=hoy  (turnos del día)
+- GET /appointments/<id>
+- GET /clients
+y muestra, por endpoint, pedidos por segundo y latencias p50/p95/p99.
+
+Sin --url levanta ThreadPoolWSGIServer (python api.py serve) en este mismo
+proceso sobre una base temporal con --rows turnos; los clientes comparten el
+GIL con el servidor, así que las cifras son conservadoras. Con --url se
+prueba un servidor ya levantado (sobre su propia base de datos).
+
+Uso:
+    python benchmarks/load_test_api.py [--clients 50] [--seconds 10] [--workers 8] [--rows 50000]
+    python benchmarks/load_test_api.py --url http://127.0.0.1:5000
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+import http.client
+import random
+import tempfile
+import threading
+import time
+import urllib.parse
+from unittest.mock import patch
+
+from sqlalchemy.orm import scoped_session, sessionmaker
+from database import Base, Appointment, Client, run_migrations, create_db_engine
+import api
+
+
+def populate(engine, rows, clients):
+    random.seed(42)
+    today = datetime.date.today()
+    with engine.begin() as connection:
+        connection.execute(Client.__table__.insert(), [
+            {'lastname': f"Apellido{i}", 'name': f"Nombre{i}", 'dog_name': f"Perro{i}"} for i in range(clients)
+        ])
+        connection.execute(Appointment.__table__.insert(), [
+            {'date': today + datetime.timedelta(days=random.randrange(-365, 30)),
+             'time': datetime.time(random.randint(8, 19), random.choice((0, 15, 30, 45))),
+             'confirmed': False, 'status': "Baño", 'price': 1500.0, 'appoint_comment': "",
+             'client_id': random.randint(1, clients)}
+            for _ in range(rows)
+        ])
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def run_client(base_url, paths, stop, timings, errors, lock):
+    url = urllib.parse.urlparse(base_url)
+    while not stop.is_set():
+        name, path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            # El servidor cierra la conexión después de cada pedido (HTTP/1.0)
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+            connection.request('GET', path())
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            ok = response.status == 200
+        except OSError:
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            if ok:
+                timings[name].append(elapsed)
+            else:
+                errors[name] += 1
+
+
+def load_test(base_url, clients, seconds, max_id):
+    today = datetime.date.today().isoformat()
+    paths = [
+        ('GET /appointments (día)', lambda: f'/appointments?date_from={today}&date_to={today}'),
+        ('GET /appointments/<id>', lambda: f'/appointments/{random.randint(1, max_id)}'),
+        ('GET /clients', lambda: '/clients'),
+    ]
+    timings = {name: [] for name, _ in paths}
+    errors = {name: 0 for name, _ in paths}
+    lock = threading.Lock()
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_client, args=(base_url, paths, stop, timings, errors, lock))
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{clients} clientes concurrentes durante {seconds:.0f} s contra {base_url}")
+    for name, values in timings.items():
+        values.sort()
+        if values:
+            p50, p95, p99 = (percentile(values, fraction) for fraction in (0.50, 0.95, 0.99))
+        else:
+            p50 = p95 = p99 = float('nan')
+        print(f"  {name:26} {len(values) / seconds:8.1f} pedidos/s  p50 {p50:8.1f} ms  "
+              f"p95 {p95:8.1f} ms  p99 {p99:8.1f} ms  errores {errors[name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="servidor ya levantado (por defecto se levanta uno local)")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--client-rows', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.url:
+        load_test(args.url, args.clients, args.seconds, args.rows)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_db_engine(os.path.join(tmp_dir, 'load.db'))
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        populate(engine, args.rows, args.client_rows)
+        with patch('api.Session', scoped_session(sessionmaker(bind=engine))):
+            server = api.ThreadPoolWSGIServer('127.0.0.1', 0, api.app, args.workers)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                load_test(f"http://127.0.0.1:{server.server_port}", args.clients, args.seconds, args.rows)
+            finally:
+                server.shutdown()
+                thread.join()
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from database import Session, Breed
+from search_index import normalize_text
+
+def setup_logger():
+    logger = logging.getLogger('breed_catalog')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'breed_catalog.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+
+class BreedCatalog:
+    """
+    Listado de razas en memoria, compartido por el alta y la edición de
+    clientes.
+
+    Se carga con una consulta la primera vez que se pide y queda como
+    {nombre normalizado: nombre}, así los combos se llenan sin ir a la base.
+    add() controla contra breeds.normalized_name (indexado) y no contra la
+    memoria, porque otro proceso pudo haber agregado la raza. `version`
+    aumenta con cada cambio para que los combos sepan si tienen que recargar.
+    """
+
+    def __init__(self, session_factory=Session):
+        self.session_factory = session_factory
+        self._names = None  # nombre normalizado -> nombre
+        self._sorted = ()
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._names is not None:
+                return
+        session = self.session_factory()
+        try:
+            rows = session.query(Breed.name).all()
+        finally:
+            session.close()
+        names = {normalize_text(name): name for (name,) in rows}
+        with self._lock:
+            self._set_names(names)
+        logger.info(f"Razas cargadas: {len(names)} razas")
+
+    def _set_names(self, names):
+        self._names = names
+        self._sorted = tuple(sorted(names.values()))
+        self.version += 1
+
+    def names(self):
+        """Nombres de las razas ordenados alfabéticamente"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._sorted
+
+    def find(self, name):
+        """Nombre guardado de la raza que coincide sin importar acentos ni mayúsculas, o None"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._names.get(normalize_text(name))
+
+    def add(self, name, session=None):
+        """
+        Agrega la raza si no existe (sin importar acentos ni mayúsculas).
+        Devuelve (nombre guardado, True si se agregó). Con `session`, usa y
+        confirma esa sesión, como hacían los formularios.
+        """
+        own_session = session is None
+        session = session or self.session_factory()
+        try:
+            existing = session.query(Breed.name).filter(Breed.normalized_name == normalize_text(name)).first()
+            if existing:
+                self._remember(existing[0])
+                return existing[0], False
+            session.add(Breed(name=name))
+            session.commit()
+            self._remember(name)
+            logger.info(f"Nueva raza '{name}' añadida al listado")
+            return name, True
+        finally:
+            if own_session:
+                session.close()
+
+    def _remember(self, name):
+        with self._lock:
+            if self._names is None or self._names.get(normalize_text(name)) == name:
+                return
+            names = dict(self._names)
+            names[normalize_text(name)] = name
+            self._set_names(names)
+
+    def invalidate(self):
+        """Descarta el listado; se vuelve a leer en el próximo uso"""
+        with self._lock:
+            self._names = None
+            self._sorted = ()
+            self.version += 1
+
+
+breed_catalog = BreedCatalog()
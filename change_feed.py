@@ -0,0 +1,223 @@
+import json
+import queue
+import logging
+import threading
+from collections import namedtuple
+from logging.handlers import RotatingFileHandler
+from database import engine, config, get_data_version
+
+def setup_logger():
+    logger = logging.getLogger('change_feed')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'change_feed.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+OPERATIONS = {'I': 'insert', 'U': 'update', 'D': 'delete'}
+
+# Un cambio ya serializado: el JSON se arma una sola vez para todos los suscriptores
+Change = namedtuple('Change', ['version', 'data'])
+
+# Aviso de que los cambios no se pueden seguir desde la versión pedida: el
+# registro retrocedió (se restauró un backup) o ya se borraron esas filas.
+# Hay que volver a leer todo; `version` es la versión actual de los datos.
+Reset = namedtuple('Reset', ['version'])
+
+
+def read_changes(connection, since, limit=None):
+    """
+    Cambios de change_log con versión mayor a `since`, en orden, como Change.
+    En una edición que mueve un turno de fecha hay dos filas con la misma
+    operación, una por fecha.
+    """
+    sql = ("SELECT version, table_name, row_id, op, date, changed_at FROM change_log "
+           "WHERE version > ? ORDER BY version")
+    parameters = (since,)
+    if limit is not None:
+        sql += " LIMIT ?"
+        parameters += (limit,)
+    return [
+        Change(version, json.dumps({
+            'version': version,
+            'table': table_name,
+            'id': row_id,
+            'op': OPERATIONS.get(op, op),
+            'date': changed_date,
+            'changed_at': changed_at,
+        }))
+        for version, table_name, row_id, op, changed_date, changed_at
+        in connection.exec_driver_sql(sql, parameters)
+    ]
+
+def is_behind_log(connection, since, version):
+    """
+    True si no se pueden dar los cambios posteriores a `since`: las filas
+    siguientes ya se borraron (prune_change_log) o el registro es más viejo
+    que esa versión (se restauró un backup). `version` es la versión actual.
+    """
+    if since > version:
+        return True
+    oldest = connection.exec_driver_sql("SELECT min(version) FROM change_log").scalar()
+    if oldest is None:
+        # Registro vacío: solo alcanza si no hubo cambios después de `since`
+        return since < version
+    return oldest > since + 1
+
+
+class Subscription:
+    """
+    Cola de cambios de un suscriptor. `version` es la versión desde la que
+    recibe cambios. Si la cola se llena (el cliente no lee) se descarta la
+    suscripción: al reconectarse el cliente se pone al día desde la base.
+    """
+    def __init__(self, feed, max_pending, version):
+        self.feed = feed
+        self.version = version
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+        self.closed = False
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+            self.feed.unsubscribe(self)
+
+    def get(self, timeout):
+        """
+        Lista de Change o Reset; None si la suscripción terminó (feed cerrado
+        o cola llena); [] si pasó el timeout sin cambios
+        """
+        if self.closed or self.overflowed:
+            return None
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+    def cancel(self):
+        self.feed.unsubscribe(self)
+
+    def close(self):
+        self.closed = True
+        try:
+            # Despierta a quien esté esperando en get()
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class ChangeFeed:
+    """
+    Reparte los cambios de change_log a muchos suscriptores (GET /changes/stream).
+
+    Un único hilo consulta la versión de datos cada poll_interval segundos,
+    solo mientras haya suscriptores; cuando cambia lee las filas nuevas una
+    vez y pone la misma lista en la cola de cada suscriptor. Así el costo en
+    la base no depende de cuántos clientes estén conectados. notify() lo
+    despierta enseguida (después de una escritura de la API); los cambios de
+    otros procesos, como la aplicación de escritorio, llegan en el siguiente
+    ciclo.
+    """
+    def __init__(self, bind=None, poll_interval=0.25, max_pending=1000, max_subscribers=100):
+        self.bind = bind if bind is not None else engine
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.last_version = None
+
+    def subscribe(self):
+        """Nueva suscripción, o None si ya hay max_subscribers"""
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            if self.thread is None:
+                with self.bind.connect() as connection:
+                    self.last_version = get_data_version(connection)
+                self.thread = threading.Thread(target=self.run, name='change_feed', daemon=True)
+                self.thread.start()
+            # Lo posterior a last_version le llega por la cola
+            subscription = Subscription(self, self.max_pending, self.last_version)
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def notify(self):
+        """Revisa el registro de cambios ahora, sin esperar al próximo ciclo"""
+        self.wake.set()
+
+    def read(self, since, limit=None):
+        """Cambios posteriores a `since` leídos de la base, o Reset"""
+        with self.bind.connect() as connection:
+            version = get_data_version(connection)
+            if is_behind_log(connection, since, version):
+                return Reset(version)
+            return read_changes(connection, since, limit)
+
+    def run(self):
+        logger.info("Feed de cambios iniciado")
+        while True:
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+            with self.lock:
+                if not self.subscribers:
+                    # Sin suscriptores no se consulta la base; el próximo subscribe lo reinicia
+                    self.thread = None
+                    break
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Error al leer el registro de cambios: {e}")
+        logger.info("Feed de cambios detenido")
+
+    def poll(self):
+        with self.bind.connect() as connection:
+            version = get_data_version(connection)
+            if version == self.last_version:
+                return
+            if version < self.last_version:
+                logger.info(f"La versión de datos bajó de {self.last_version} a {version}")
+                changes = Reset(version)
+            else:
+                changes = read_changes(connection, self.last_version)
+                if changes:
+                    version = changes[-1].version
+        self.last_version = version
+        if changes:
+            self.publish(changes)
+
+    def publish(self, changes):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.put(changes)
+
+    def close(self):
+        """Termina las suscripciones abiertas (al detener el servidor)"""
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.subscribers.clear()
+        for subscription in subscribers:
+            subscription.close()
+        self.wake.set()
+
+
+change_feed = ChangeFeed(poll_interval=config['api']['change_poll_ms'] / 1000,
+                         max_subscribers=config['api']['max_streams'])
@@ -0,0 +1,200 @@
+import logging
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from operator import itemgetter
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import select
+from database import Session, Client, ChangeLog, get_data_version
+from change_feed import is_behind_log
+from search_index import normalize_text
+
+def setup_logger():
+    logger = logging.getLogger('client_index')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'client_index.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+# Columnas de cliente que se buscan por prefijo de palabra
+SEARCH_COLUMNS = ('lastname', 'name', 'dog_name')
+
+WORD = re.compile(r"\w+")
+NON_DIGIT = re.compile(r"\D")
+
+
+class ClientEntry(namedtuple('ClientEntry', ['id', 'lastname', 'name', 'dog_name', 'phone', 'comments'])):
+    """Datos de un cliente que usan el autocompletado y el diálogo de turnos"""
+    __slots__ = ()
+
+    @property
+    def label(self):
+        return f"{self.lastname} {self.name}"
+
+    @property
+    def description(self):
+        return f"{self.label} ({self.dog_name})" if self.dog_name else self.label
+
+
+def entry_tokens(entry):
+    """Palabras normalizadas de un cliente; el teléfono cuenta como una sola, solo dígitos"""
+    text = normalize_text(" ".join(getattr(entry, column) or "" for column in SEARCH_COLUMNS))
+    tokens = set(WORD.findall(text))
+    phone = NON_DIGIT.sub("", entry.phone or "")
+    if phone:
+        tokens.add(phone)
+    return tuple(tokens)
+
+
+class ClientIndex:
+    """
+    Índice en memoria de los clientes para el autocompletado, compartido por
+    todo el proceso.
+
+    Guarda una lista ordenada de (palabra, apellido y nombre, id) con cada
+    palabra de apellido, nombre y nombre del perro (sin acentos ni
+    mayúsculas) y el teléfono. Buscar un prefijo es una búsqueda binaria más
+    recorrer las palabras que empiezan con él, hasta juntar `limit` clientes.
+
+    Se carga completo con una consulta la primera vez; después sync() lee
+    de change_log solo los clientes creados, editados o borrados desde la
+    última versión vista (también los de otros procesos, como la API).
+    """
+
+    def __init__(self, session_factory=Session):
+        self.session_factory = session_factory
+        self._entries = {}  # id -> ClientEntry
+        self._tokens = {}  # id -> palabras del cliente
+        self._keys = []  # (palabra, apellido y nombre normalizados, id) ordenadas
+        self._version = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sync(self, session=None):
+        """Deja el índice al día con la base; devuelve la cantidad de clientes actualizados"""
+        own_session = session is None
+        session = session or self.session_factory()
+        try:
+            connection = session.connection()
+            version = get_data_version(connection)
+            with self._lock:
+                known = self._version
+            if known is not None and version == known:
+                return 0
+            if known is None or is_behind_log(connection, known, version):
+                return self._load_all(session, version)
+
+            changed_ids = {row_id for (row_id,) in session.execute(
+                select(ChangeLog.row_id).where(ChangeLog.table_name == 'clients',
+                                               ChangeLog.version > known, ChangeLog.version <= version)
+            )}
+            entries = self._query_entries(session, Client.id.in_(changed_ids)) if changed_ids else []
+            with self._lock:
+                for client_id in changed_ids:
+                    self._remove(client_id)
+                for entry in entries:
+                    self._add(entry)
+                self._version = version
+            if changed_ids:
+                logger.info(f"Índice de clientes actualizado: {len(changed_ids)} clientes (versión {version})")
+            return len(changed_ids)
+        finally:
+            if own_session:
+                session.close()
+
+    def _query_entries(self, session, *conditions):
+        # Por la conexión y no por el ORM: son filas sueltas, sin objetos Client que armar
+        rows = session.connection().execute(
+            select(Client.id, Client.lastname, Client.name, Client.dog_name, Client.phone, Client.comments)
+            .where(*conditions)
+        )
+        return list(map(ClientEntry._make, rows))
+
+    def _load_all(self, session, version):
+        entries = self._query_entries(session)
+        entries_by_id = {}
+        tokens_by_id = {}
+        labeled = sorted((normalize_text(entry.label), entry.id, entry) for entry in entries)
+        keys = []
+        for label_key, client_id, entry in labeled:
+            entries_by_id[client_id] = entry
+            tokens_by_id[client_id] = entry_tokens(entry)
+            keys.extend((token, label_key, client_id) for token in tokens_by_id[client_id])
+        # Ya están por apellido y nombre; el orden estable por palabra deja
+        # el mismo orden que comparar las tuplas completas, bastante más rápido
+        keys.sort(key=itemgetter(0))
+        with self._lock:
+            self._entries, self._tokens, self._keys = entries_by_id, tokens_by_id, keys
+            self._version = version
+        logger.info(f"Índice de clientes cargado: {len(entries)} clientes (versión {version})")
+        return len(entries)
+
+    def _add(self, entry):
+        self._entries[entry.id] = entry
+        self._tokens[entry.id] = entry_tokens(entry)
+        label_key = normalize_text(entry.label)
+        for token in self._tokens[entry.id]:
+            insort(self._keys, (token, label_key, entry.id))
+
+    def _remove(self, client_id):
+        entry = self._entries.pop(client_id, None)
+        if entry is None:
+            return
+        label_key = normalize_text(entry.label)
+        for token in self._tokens.pop(client_id):
+            position = bisect_left(self._keys, (token, label_key, client_id))
+            del self._keys[position]
+
+    def search(self, text, limit=50):
+        """
+        Clientes con alguna palabra que empieza con cada palabra de `text`
+        (todas deben coincidir), ordenados por la palabra y por apellido y
+        nombre. Se recorre el rango de la palabra más larga, la más selectiva.
+        """
+        words = WORD.findall(normalize_text(text))
+        if not words:
+            return []
+        words.sort(key=len, reverse=True)
+        pivot, others = words[0], words[1:]
+        results = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            position = bisect_left(keys, (pivot,))
+            while position < len(keys) and len(results) < limit:
+                token, _, client_id = keys[position]
+                if not token.startswith(pivot):
+                    break
+                position += 1
+                if client_id in seen:
+                    continue
+                seen.add(client_id)
+                tokens = self._tokens[client_id]
+                if all(any(candidate.startswith(word) for candidate in tokens) for word in others):
+                    results.append(self._entries[client_id])
+        return results
+
+    def get(self, client_id):
+        """ClientEntry del cliente, o None si no está en el índice"""
+        with self._lock:
+            return self._entries.get(client_id)
+
+    def invalidate(self):
+        """Fuerza una carga completa en el próximo sync()"""
+        with self._lock:
+            self._version = None
+
+
+client_index = ClientIndex()
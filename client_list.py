@@ -5,8 +5,12 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLa
                              QTableWidget, QTableWidgetItem, QHeaderView)
 from PyQt5.QtCore import Qt, QTime, QDate, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon, QTextCharFormat, QColor
-from sqlalchemy import or_, desc
-from database import Session, Client, Appointment, Breed
+from sqlalchemy import or_
+from database import Session, Client, Appointment, CLIENT_SORT_COLUMNS, sort_key
+from search_index import client_search_subquery
+from pagination import KeysetPaginator, FIRST, NEXT, PREVIOUS
+from appointment_cache import appointment_cache
+from breed_catalog import breed_catalog
 import datetime
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
 import string, random
@@ -119,6 +123,10 @@ class ClientListWidget(QWidget):
         self.current_search = ""
         self.current_sort_column = 0
         self.current_sort_order = Qt.AscendingOrder
+        # Con una búsqueda activa se ordena por relevancia hasta que se elija una columna
+        self.sort_by_rank = False
+        self.ranked = False
+        self.paginator = KeysetPaginator(self.items_per_page)
 
         # Timer para retrasar la búsqueda
         self.search_timer = QTimer()
@@ -145,6 +153,7 @@ class ClientListWidget(QWidget):
     def search_clients(self):
         self.current_search = self.search_input.text()
         self.current_page = 1
+        self.sort_by_rank = True
         self.load_clients(self.current_search)
 
     def apply_styles(self):
@@ -178,36 +187,45 @@ class ClientListWidget(QWidget):
         """
         self.setStyleSheet(style)
 
-    def load_clients(self, search_term=None):
+    def load_clients(self, search_term=None, move=FIRST):
         self.client_table.setRowCount(0)
         session = Session()
         query = session.query(Client)
         
+        matches = None
         if search_term:
-            query = query.filter(
-                or_(
-                    Client.lastname.ilike(f"%{search_term}%"),
-                    Client.name.ilike(f"%{search_term}%"),
-                    Client.address.ilike(f"%{search_term}%"),
-                    Client.phone.ilike(f"%{search_term}%"),
-                    Client.dog_name.ilike(f"%{search_term}%"),
-                    Client.breed.ilike(f"%{search_term}%"),
-                    Client.comments.ilike(f"%{search_term}%")
+            # Búsqueda por prefijo en el índice FTS5; LIKE si no está disponible
+            matches = client_search_subquery(session, search_term)
+            if matches is not None:
+                query = query.join(matches, matches.c.id == Client.id)
+            else:
+                query = query.filter(
+                    or_(
+                        Client.lastname.ilike(f"%{search_term}%"),
+                        Client.name.ilike(f"%{search_term}%"),
+                        Client.address.ilike(f"%{search_term}%"),
+                        Client.phone.ilike(f"%{search_term}%"),
+                        Client.dog_name.ilike(f"%{search_term}%"),
+                        Client.breed.ilike(f"%{search_term}%"),
+                        Client.comments.ilike(f"%{search_term}%")
+                    )
                 )
-            )
+        self.ranked = matches is not None and self.sort_by_rank
         
-        self.total_clients = query.count()
-        self.total_pages = (self.total_clients + self.items_per_page - 1) // self.items_per_page
+        # El total se cuenta una vez por búsqueda, no en cada cambio de página
+        self.total_clients = self.paginator.total(query, search_term)
         
-        # Aplicar ordenamiento
-        if self.current_sort_order == Qt.AscendingOrder:
-            query = query.order_by(getattr(Client, self.get_column_name(self.current_sort_column)))
+        # Aplicar ordenamiento (la clave de orden más el id define la página)
+        if self.ranked:
+            sort_keys = [matches.c.rank]
+            descending = False
         else:
-            query = query.order_by(desc(getattr(Client, self.get_column_name(self.current_sort_column))))
+            sort_keys = [sort_key(getattr(Client, self.get_column_name(self.current_sort_column)))]
+            descending = self.current_sort_order == Qt.DescendingOrder
         
-        clients = query.offset((self.current_page - 1) * self.items_per_page)\
-                       .limit(self.items_per_page)\
-                       .all()
+        clients = self.paginator.fetch(query, sort_keys, Client.id, descending, move)
+        self.current_page = self.paginator.page
+        self.total_pages = self.paginator.total_pages(self.total_clients)
         
         self.client_table.setRowCount(len(clients))
         for row, client in enumerate(clients):
@@ -229,10 +247,10 @@ class ClientListWidget(QWidget):
         logger.info(f"Cargando clientes. Búsqueda: '{search_term}', Página: {self.current_page}, Items por página: {self.items_per_page}")
 
     def get_column_name(self, column_index):
-        column_names = ['lastname', 'name', 'address', 'phone', 'dog_name', 'breed', 'comments']
-        return column_names[column_index]
+        return CLIENT_SORT_COLUMNS[column_index]
 
     def sort_table(self, column):
+        self.sort_by_rank = False
         if column == self.current_sort_column:
             # Cambiar el orden si se hace clic en la misma columna
             self.current_sort_order = Qt.DescendingOrder if self.current_sort_order == Qt.AscendingOrder else Qt.AscendingOrder
@@ -248,7 +266,7 @@ class ClientListWidget(QWidget):
         for i in range(self.client_table.columnCount()):
             item = self.client_table.horizontalHeaderItem(i)
             text = item.text().split()[0]  # Obtener el texto base sin flechas
-            if i == self.current_sort_column:
+            if i == self.current_sort_column and not self.ranked:
                 if self.current_sort_order == Qt.AscendingOrder:
                     item.setText(f"{text} ▲")
                 else:
@@ -259,7 +277,7 @@ class ClientListWidget(QWidget):
     def update_pagination_controls(self):
         self.page_label.setText(f"Página {self.current_page} de {self.total_pages}")
         self.prev_button.setEnabled(self.current_page > 1)
-        self.next_button.setEnabled(self.current_page < self.total_pages)
+        self.next_button.setEnabled(self.paginator.has_next)
 
     def update_client_count(self):
         start = (self.current_page - 1) * self.items_per_page + 1
@@ -268,17 +286,16 @@ class ClientListWidget(QWidget):
 
     def previous_page(self):
         if self.current_page > 1:
-            self.current_page -= 1
-            self.load_clients(self.current_search)
+            self.load_clients(self.current_search, PREVIOUS)
 
     def next_page(self):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.load_clients(self.current_search)
+        if self.paginator.has_next:
+            self.load_clients(self.current_search, NEXT)
 
     def change_items_per_page(self, value):
         self.items_per_page = int(value)
         self.current_page = 1
+        self.paginator.set_page_size(self.items_per_page)
         self.load_clients(self.current_search)
 
     def edit_client(self, item):
@@ -506,11 +523,9 @@ class ClientEditDialog(QDialog):
         self.setStyleSheet(style)
 
     def load_breeds(self):
-        breeds = self.session.query(Breed).order_by(Breed.name).all()
         self.breed_combo.addItem("Seleccione una raza")
         self.breed_combo.addItem("Otro")
-        for breed in breeds:
-            self.breed_combo.addItem(breed.name)
+        self.breed_combo.addItems(breed_catalog.names())
 
     def on_breed_changed(self, text):
         self.custom_breed_input.setVisible(text == "Otro")
@@ -536,14 +551,10 @@ class ClientEditDialog(QDialog):
                 breed = self.custom_breed_input.text().strip()
                 if not breed:
                     raise ValueError("Por favor, ingrese una raza válida.")
-                breed = breed.capitalize()
-                existing_breed = self.session.query(Breed).filter(Breed.name.ilike(breed)).first()
-                if existing_breed:
+                breed, created = breed_catalog.add(breed.capitalize(), session=self.session)
+                if not created:
                     QMessageBox.warning(self, "Advertencia", f"La raza '{breed}' ya existe en el listado")
                 else:
-                    new_breed = Breed(name=breed)
-                    self.session.add(new_breed)
-                    self.session.commit()
                     self.breed_combo.addItem(breed)
 
             # Actualizar los datos del cliente
@@ -556,6 +567,8 @@ class ClientEditDialog(QDialog):
             self.client.breed = breed
             self.client.comments = self.comments_input.toPlainText()
             self.session.commit()
+            # Los turnos en caché guardan los datos del cliente
+            appointment_cache.invalidate_client(self.client_id)
             logger.info(f"Cliente con ID {self.client_id} actualizado exitosamente")
             super().accept()
         except ValueError as e:
@@ -581,6 +594,7 @@ class ClientEditDialog(QDialog):
                 
                 self.session.delete(self.client)
                 self.session.commit()
+                appointment_cache.invalidate_client(self.client_id)
                 logger.info(f"Cliente con ID {self.client_id} y sus turnos futuros eliminados exitosamente")
                 self.clientDeleted.emit(self.client_id)  # Emitir señal con el ID del cliente eliminado
                 super().accept()
@@ -0,0 +1,95 @@
+import copy
+import json
+import os
+
+CONFIG_FILENAME = 'turnocan_config.json'
+
+# Valores por defecto. El archivo de configuración solo necesita las claves
+# que se quieran cambiar; el resto se completa con estos valores.
+DEFAULT_CONFIG = {
+    'database': {
+        # WAL: los lectores (GUI, worker, API) no se bloquean con las escrituras
+        'journal_mode': 'WAL',
+        # NORMAL es seguro con WAL y evita un fsync por cada commit
+        'synchronous': 'NORMAL',
+        # Tiempo que espera una conexión antes de fallar con "database is locked"
+        'busy_timeout_ms': 5000,
+        'cache_size_kb': 20000,
+        'mmap_size_mb': 256,
+        # Conexiones del pool compartidas por los hilos de la aplicación
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout_s': 30,
+    },
+    'backup': {
+        # Páginas copiadas por paso de la API de backup de SQLite y pausa entre
+        # pasos, para que las escrituras de la aplicación no queden esperando
+        'pages_per_step': 256,
+        'step_sleep_ms': 5,
+    },
+    'integrity': {
+        # Al iniciar se usa PRAGMA quick_check; el integrity_check completo
+        # (más lento, recorre todos los índices) se hace cada tantos días
+        'full_check_days': 7,
+    },
+    'startup': {
+        # Tiempo máximo esperado hasta el primer pintado de la ventana; si se
+        # supera queda una advertencia en startup.log
+        'first_paint_budget_ms': 2000,
+    },
+    'recurrence': {
+        # Semanas hacia adelante hasta las que se crean los turnos repetidos
+        # (repeat_weekly / repeat_monthly)
+        'horizon_weeks': 12,
+    },
+    'slots': {
+        # Horario de atención e intervalos del buscador de horarios libres
+        'day_start': '08:00',
+        'day_end': '20:00',
+        'bucket_minutes': 15,
+        # Duración de un turno (minutos) cuando no se indica y el servicio no
+        # está en service_minutes
+        'appointment_minutes': 60,
+        # Duración por defecto de cada servicio
+        'service_minutes': {'Baño': 60, 'Corte': 60, 'Baño y corte': 90},
+        # Días sin atención (0 = lunes ... 6 = domingo)
+        'closed_weekdays': [6],
+    },
+    'api': {
+        # python api.py serve
+        'host': '127.0.0.1',
+        'port': 5000,
+        # Pedidos atendidos a la vez (cada hilo usa una conexión del pool)
+        'workers': 8,
+        # Conexiones abiertas a GET /changes/stream (cada una con su hilo, fuera del pool)
+        'max_streams': 100,
+        # Cada cuánto se busca en change_log cambios de otros procesos para los streams
+        'change_poll_ms': 250,
+    },
+}
+
+
+def _merge(defaults, overrides):
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_config(path):
+    """
+    Lee la configuración JSON de path y la combina con DEFAULT_CONFIG. Si el
+    archivo no existe o no se puede leer, se usan los valores por defecto.
+    """
+    if not os.path.exists(path):
+        return copy.deepcopy(DEFAULT_CONFIG)
+    try:
+        with open(path, encoding='utf-8') as config_file:
+            overrides = json.load(config_file)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer la configuración {path}: {e}. Se usan los valores por defecto")
+        return copy.deepcopy(DEFAULT_CONFIG)
+    return _merge(DEFAULT_CONFIG, overrides)
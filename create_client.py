@@ -5,7 +5,8 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QPushButton, QLabel, QLineEdi
                              QGraphicsDropShadowEffect)
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QColor, QFont
-from database import Session, Client, Breed
+from database import Session, Client
+from breed_catalog import breed_catalog
 
 def setup_logger():
     logger = logging.getLogger('create_client')
@@ -82,6 +83,7 @@ class CreateClientWidget(QWidget):
         self.breed_combo.currentTextChanged.connect(self.on_breed_changed)
         
         # Añadimos esta línea para cargar las razas cuando se muestra el widget
+        self.breeds_version = None
         self.breed_combo.showPopup = self.load_breeds_and_show_popup
 
         # Apply QSS styles
@@ -143,9 +145,10 @@ class CreateClientWidget(QWidget):
         logger.info("Estilos aplicados a CreateClientWidget")
 
     def load_breeds(self):
-        session = Session()
-        breeds = session.query(Breed).order_by(Breed.name).all()
-        
+        # Las razas salen del catálogo en memoria: abrir el combo no consulta la base
+        breeds = breed_catalog.names()
+        self.breeds_version = breed_catalog.version
+
         # Guardamos el texto actual
         current_text = self.breed_combo.currentText()
         
@@ -153,9 +156,7 @@ class CreateClientWidget(QWidget):
         self.breed_combo.clear()
         self.breed_combo.addItem("Seleccione una raza")
         self.breed_combo.addItem("Otro")
-        
-        for breed in breeds:
-            self.breed_combo.addItem(breed.name)
+        self.breed_combo.addItems(breeds)
         
         # Restauramos el texto seleccionado si aún existe, o seleccionamos el primero
         index = self.breed_combo.findText(current_text)
@@ -164,11 +165,12 @@ class CreateClientWidget(QWidget):
         else:
             self.breed_combo.setCurrentIndex(0)
         
-        session.close()
         logger.info(f"Razas cargadas: {len(breeds)} razas encontradas")
 
     def load_breeds_and_show_popup(self):
-        self.load_breeds()
+        # Solo se rearma el combo si el catálogo cambió desde la última vez
+        if self.breeds_version != breed_catalog.version:
+            self.load_breeds()
         QComboBox.showPopup(self.breed_combo)
 
     def on_breed_changed(self, text):
@@ -205,9 +207,8 @@ class CreateClientWidget(QWidget):
                 QMessageBox.warning(self, "Error", "Por favor, ingrese una raza personalizada.")
                 session.close()
                 return
-            breed = breed.capitalize()
-            existing_breed = session.query(Breed).filter(Breed.name.ilike(breed)).first()
-            if existing_breed:
+            breed, created = breed_catalog.add(breed.capitalize(), session=session)
+            if not created:
                 logger.info(f"Raza personalizada '{breed}' ya existe en el listado")
                 QMessageBox.warning(
                     self, 
@@ -215,14 +216,9 @@ class CreateClientWidget(QWidget):
                     f"La raza '{breed}' ya existe en el listado."
                 )
             else:
-                new_breed = Breed(name=breed)
-                session.add(new_breed)
-                session.commit()
                 logger.info(f"Nueva raza '{breed}' añadida al listado")
-                self.breed_combo.clear()
-                self.breed_combo.addItem("Seleccione una raza")
-                self.breed_combo.addItem("Otro")
-                self.load_breeds()
+                # El catálogo ya la tiene; el combo se reordena la próxima vez que se abre
+                self.breed_combo.addItem(breed)
                 self.breed_combo.setCurrentText(breed)
         elif breed == "Seleccione una raza":
             logger.warning("Intento de crear cliente sin seleccionar una raza")
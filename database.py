@@ -1,10 +1,17 @@
 import os
-from sqlalchemy import Float, create_engine, Column, Integer, String, Date, Time, Boolean, ForeignKey, Text, DateTime
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+import json
+from sqlalchemy import Float, create_engine, Column, Integer, String, Date, Time, Boolean, ForeignKey, Text, DateTime, Index, Computed
+from sqlalchemy.orm import sessionmaker, relationship, declarative_base, validates
 from sqlalchemy.sql import func
-from sqlalchemy import inspect
+from sqlalchemy import inspect, or_, false, event, literal_column
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateIndex
+import calendar
 import datetime
+from collections import namedtuple
 import sys
+from search_index import create_search_index, normalize_text
+from config import load_config, CONFIG_FILENAME
 
 Base = declarative_base()
 
@@ -17,6 +24,25 @@ class Breed(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True)
+    # Nombre sin acentos ni mayúsculas, para ver si una raza ya existe
+    normalized_name = Column(String, index=True)
+
+    @validates('name')
+    def _set_normalized_name(self, key, value):
+        self.normalized_name = normalize_text(value)
+        return value
+
+# Columnas por las que se puede ordenar el listado de clientes
+CLIENT_SORT_COLUMNS = ['lastname', 'name', 'address', 'phone', 'dog_name', 'breed', 'comments']
+
+def sort_key(column):
+    """
+    Clave de orden sin NULL de una columna de texto (fechas y horas incluidas,
+    que SQLite guarda como texto) para la paginación por clave. El '' va como
+    literal (no como parámetro) para que SQLite use el índice de la misma
+    expresión.
+    """
+    return func.coalesce(column, literal_column("''"), type_=String)
 
 class Client(Base):
     __tablename__ = 'clients'
@@ -33,6 +59,22 @@ class Client(Base):
 
     appointments = relationship("Appointment", back_populates="client")
 
+    # Claves de orden del listado paginado de clientes (el id va implícito en el índice)
+    __table_args__ = (
+        Index('ix_clients_lastname_sort', sort_key(lastname)),
+        Index('ix_clients_name_sort', sort_key(name)),
+        Index('ix_clients_address_sort', sort_key(address)),
+        Index('ix_clients_phone_sort', sort_key(phone)),
+        Index('ix_clients_dog_name_sort', sort_key(dog_name)),
+        Index('ix_clients_breed_sort', sort_key(breed)),
+        Index('ix_clients_comments_sort', sort_key(comments)),
+    )
+
+# Minuto del día en que empieza un turno ('HH:MM:SS' -> HH * 60 + MM) y en
+# que termina; los turnos sin duración cargada ocupan una hora
+START_MINUTE_SQL = "CAST(substr(time, 1, 2) AS INTEGER) * 60 + CAST(substr(time, 4, 2) AS INTEGER)"
+END_MINUTE_SQL = f"{START_MINUTE_SQL} + coalesce(duration, 60)"
+
 class Appointment(Base):
     __tablename__ = 'appointments'
 
@@ -47,9 +89,166 @@ class Appointment(Base):
     price = Column(Float)
     client_id = Column(Integer, ForeignKey('clients.id'))
     created_at = Column(DateTime, default=local_now)
+    # Minutos que ocupa el turno
+    duration = Column(Integer)
+    # Columnas generadas (no se guardan): intervalo [start_minute, end_minute) del turno
+    start_minute = Column(Integer, Computed(START_MINUTE_SQL, persisted=False))
+    end_minute = Column(Integer, Computed(END_MINUTE_SQL, persisted=False))
+
+    # Serie de turnos repetidos a la que pertenece (None si no es parte de una)
+    series_id = Column(Integer, ForeignKey('appointment_series.id'))
 
     client = relationship("Client", back_populates="appointments")
 
+    __table_args__ = (
+        # Consultas por día / mes ordenadas por hora (calendario, notificaciones, repetición)
+        Index('ix_appointments_date_time', 'date', 'time'),
+        # Turnos de un cliente a partir de una fecha (eliminación de cliente)
+        Index('ix_appointments_client_id_date', 'client_id', 'date'),
+        # Intervalos de un día ordenados por inicio (detección de superposiciones)
+        Index('ix_appointments_date_start', 'date', 'start_minute'),
+        # Último turno de cada serie (extensión de turnos repetidos)
+        Index('ix_appointments_series_date', 'series_id', 'date'),
+        # Búsqueda de turnos ordenada por fecha y hora (paginación por clave)
+        Index('ix_appointments_date_time_sort', sort_key(date), sort_key(time)),
+    )
+
+class AppointmentSeries(Base):
+    """
+    Serie de turnos repetidos (semanal o mensual). Se crea a partir del primer
+    turno marcado como repetido; los turnos que genera recurrence llevan su
+    id en series_id. El horario y la fecha de referencia son los de ese
+    primer turno, así mover o borrar una repetición no cambia la serie.
+    """
+    __tablename__ = 'appointment_series'
+
+    id = Column(Integer, primary_key=True)
+    # Turno que originó la serie
+    origin_id = Column(Integer)
+    client_id = Column(Integer, ForeignKey('clients.id'))
+    time = Column(Time)
+    # Fecha desde la que se cuentan las semanas o los meses
+    anchor = Column(Date)
+    # Última fecha hasta la que ya se generaron turnos: lo borrado no vuelve
+    generated_until = Column(Date)
+
+    # AUTOINCREMENT: el id de una serie borrada no se reutiliza
+    __table_args__ = {'sqlite_autoincrement': True}
+
+class ChangeLog(Base):
+    """
+    Registro de cambios llenado por triggers de SQLite: cada alta, edición o
+    baja de turnos y clientes agrega una fila con una versión creciente.
+    Para los turnos se guarda la fecha afectada (en una edición que cambia la
+    fecha, una fila por cada fecha), así quien lee sabe qué días cambiaron.
+    """
+    __tablename__ = 'change_log'
+
+    version = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    row_id = Column(Integer, nullable=False)
+    op = Column(String(1), nullable=False)  # 'I', 'U' o 'D'
+    date = Column(Date)
+    changed_at = Column(DateTime, server_default=func.current_timestamp())
+
+    # AUTOINCREMENT: las versiones no se reutilizan aunque se borren filas viejas
+    __table_args__ = {'sqlite_autoincrement': True}
+
+_SNAPSHOT_FIELDS = [
+    'id', 'date', 'time', 'confirmed', 'status', 'price', 'appoint_comment',
+    'repeat_weekly', 'repeat_monthly', 'client_id',
+    'client_lastname', 'client_name', 'client_address', 'client_phone',
+    'client_dog_name', 'client_breed', 'client_comments',
+]
+
+class AppointmentSnapshot(namedtuple('AppointmentSnapshot', _SNAPSHOT_FIELDS)):
+    """
+    Copia inmutable de un turno con los datos de su cliente. Se usa en las
+    vistas en lugar de objetos ORM, que quedan detached al cerrar la sesión.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_appointment(cls, appointment):
+        client = appointment.client
+        return cls(
+            id=appointment.id,
+            date=appointment.date,
+            time=appointment.time,
+            confirmed=bool(appointment.confirmed),
+            status=appointment.status,
+            price=appointment.price,
+            appoint_comment=appointment.appoint_comment,
+            repeat_weekly=appointment.repeat_weekly,
+            repeat_monthly=appointment.repeat_monthly,
+            client_id=appointment.client_id,
+            client_lastname=client.lastname if client else None,
+            client_name=client.name if client else None,
+            client_address=client.address if client else None,
+            client_phone=client.phone if client else None,
+            client_dog_name=client.dog_name if client else None,
+            client_breed=client.breed if client else None,
+            client_comments=client.comments if client else None,
+        )
+
+    @property
+    def has_client(self):
+        return self.client_lastname is not None or self.client_name is not None
+
+    @property
+    def client_full_name(self):
+        return f"{self.client_lastname} {self.client_name}" if self.has_client else "Cliente desconocido"
+
+def month_range(year, month):
+    """Devuelve el primer y el último día del mes"""
+    last_day = calendar.monthrange(year, month)[1]
+    return datetime.date(year, month, 1), datetime.date(year, month, last_day)
+
+def date_range_filter(year=None, month=None, day=None, years=None, column=None):
+    """
+    Convierte filtros de día/mes/año en condiciones sobre la fecha que pueden
+    usar el índice (date BETWEEN primero AND último, o date IN (...)), en lugar
+    de extract(), que en SQLite aplica strftime() a cada fila.
+
+    Si no se indica el año se usan los años de `years` (ver appointment_years).
+    """
+    column = column if column is not None else Appointment.date
+    if month is not None and not 1 <= month <= 12:
+        return false()
+    if year is not None:
+        years = [year]
+    elif years is None:
+        raise ValueError("Se necesita el año o la lista de años a consultar")
+    # Un año fuera de lo que admite datetime.date (0, 5 cifras) no coincide con nada
+    years = [current_year for current_year in years if datetime.MINYEAR <= current_year <= datetime.MAXYEAR]
+
+    ranges = []
+    dates = []
+    for current_year in years:
+        if day is None and month is None:
+            ranges.append((datetime.date(current_year, 1, 1), datetime.date(current_year, 12, 31)))
+        elif day is None:
+            ranges.append(month_range(current_year, month))
+        else:
+            for current_month in ([month] if month is not None else range(1, 13)):
+                if 1 <= day <= calendar.monthrange(current_year, current_month)[1]:
+                    dates.append(datetime.date(current_year, current_month, day))
+
+    if dates:
+        return column.in_(dates)
+    if len(ranges) == 1:
+        return column.between(*ranges[0])
+    if ranges:
+        return or_(*[column.between(first, last) for first, last in ranges])
+    return false()
+
+def appointment_years(session):
+    """Años cubiertos por los turnos guardados (MIN/MAX usan el índice de fecha)"""
+    first, last = session.query(func.min(Appointment.date), func.max(Appointment.date)).one()
+    if first is None:
+        return []
+    return list(range(first.year, last.year + 1))
+
 def get_current_dir():
 
     # Comprobar si estamos ejecutando desde un ejecutable compilado por PyInstaller
@@ -71,11 +270,222 @@ main_dir = get_current_dir()
 db_path = os.path.join(main_dir, 'dog_grooming.db')
 print(f"Base de datos configurada en: {db_path}")
 
-engine = create_engine(f'sqlite:///{db_path}')
+config = load_config(os.path.join(main_dir, CONFIG_FILENAME))
+
+def apply_sqlite_pragmas(dbapi_connection, settings):
+    """Configura una conexión nueva de SQLite según la sección 'database'"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode = {settings['journal_mode']}")
+        cursor.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings['busy_timeout_ms'])}")
+        # Negativo: el tamaño se indica en KiB y no en páginas
+        cursor.execute(f"PRAGMA cache_size = -{int(settings['cache_size_kb'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings['mmap_size_mb']) * 1024 * 1024}")
+    finally:
+        cursor.close()
+
+def create_db_engine(path, settings=None):
+    """
+    Crea el engine de SQLite con un pool de conexiones compartido por la GUI,
+    el BackgroundWorker y la API, y aplica los pragmas a cada conexión nueva.
+    """
+    settings = settings or config['database']
+    new_engine = create_engine(
+        f'sqlite:///{path}',
+        poolclass=QueuePool,
+        pool_size=int(settings['pool_size']),
+        max_overflow=int(settings['max_overflow']),
+        pool_timeout=int(settings['pool_timeout_s']),
+        # Las conexiones del pool se usan desde distintos hilos (nunca a la vez)
+        connect_args={'check_same_thread': False, 'timeout': int(settings['busy_timeout_ms']) / 1000},
+    )
+    event.listen(new_engine, 'connect', lambda dbapi_connection, record: apply_sqlite_pragmas(dbapi_connection, settings))
+    return new_engine
+
+engine = create_db_engine(db_path)
 Session = sessionmaker(bind=engine)
 
+def _create_appointment_indexes(connection, names):
+    # create_all no agrega índices a tablas que ya existen. IF NOT EXISTS en
+    # lugar de checkfirst, que no sabe reflejar los índices de expresión
+    for index in Appointment.__table__.indexes:
+        if index.name in names:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+def _migration_001_appointment_indexes(connection):
+    _create_appointment_indexes(connection, ['ix_appointments_date_time', 'ix_appointments_client_id_date'])
+
+def _migration_002_search_index(connection):
+    # Índice FTS5 para la búsqueda de clientes y turnos (se omite si SQLite no tiene FTS5)
+    create_search_index(connection)
+
+CHANGE_LOG_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS appointments_change_ai AFTER INSERT ON appointments BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op, date) VALUES ('appointments', new.id, 'I', new.date); END",
+    # Enlazar un turno a su serie (solo cambia series_id) no es un cambio visible
+    "CREATE TRIGGER IF NOT EXISTS appointments_change_au AFTER UPDATE ON appointments "
+    "WHEN old.series_id IS new.series_id BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op, date) VALUES ('appointments', new.id, 'U', new.date); "
+    "INSERT INTO change_log(table_name, row_id, op, date) "
+    "SELECT 'appointments', old.id, 'U', old.date WHERE old.date IS NOT new.date; END",
+    "CREATE TRIGGER IF NOT EXISTS appointments_change_ad AFTER DELETE ON appointments BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op, date) VALUES ('appointments', old.id, 'D', old.date); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_change_ai AFTER INSERT ON clients BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op) VALUES ('clients', new.id, 'I'); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_change_au AFTER UPDATE ON clients BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op) VALUES ('clients', new.id, 'U'); END",
+    "CREATE TRIGGER IF NOT EXISTS clients_change_ad AFTER DELETE ON clients BEGIN "
+    "INSERT INTO change_log(table_name, row_id, op) VALUES ('clients', old.id, 'D'); END",
+]
+
+def _migration_003_change_log(connection):
+    # Tabla de cambios y triggers para detectar modificaciones (también de otros procesos)
+    ChangeLog.__table__.create(connection, checkfirst=True)
+    for trigger in CHANGE_LOG_TRIGGERS:
+        connection.exec_driver_sql(trigger)
+
+def _migration_004_appointment_duration(connection):
+    # Duración de los turnos e intervalo [start_minute, end_minute) indexado por día
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_xinfo(appointments)")}
+    if 'duration' not in columns:
+        connection.exec_driver_sql("ALTER TABLE appointments ADD COLUMN duration INTEGER")
+    if 'start_minute' not in columns:
+        connection.exec_driver_sql(
+            f"ALTER TABLE appointments ADD COLUMN start_minute INTEGER GENERATED ALWAYS AS ({START_MINUTE_SQL}) VIRTUAL"
+        )
+    if 'end_minute' not in columns:
+        connection.exec_driver_sql(
+            f"ALTER TABLE appointments ADD COLUMN end_minute INTEGER GENERATED ALWAYS AS ({END_MINUTE_SQL}) VIRTUAL"
+        )
+    # Los turnos existentes toman la duración de su servicio. El trigger de
+    # change_log se quita mientras tanto para no registrar un cambio por turno.
+    settings = config['slots']
+    durations = " ".join(f"WHEN ? THEN {int(minutes)}" for minutes in settings['service_minutes'].values())
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS appointments_change_au")
+    connection.exec_driver_sql(
+        f"UPDATE appointments SET duration = CASE status {durations} ELSE {int(settings['appointment_minutes'])} END "
+        "WHERE duration IS NULL",
+        tuple(settings['service_minutes'])
+    )
+    connection.exec_driver_sql(CHANGE_LOG_TRIGGERS[1])
+    _create_appointment_indexes(connection, ['ix_appointments_date_start'])
+
+def _migration_005_breed_normalized_name(connection):
+    # Nombre normalizado de las razas; se calcula en Python (SQLite no sabe quitar acentos)
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_info(breeds)")}
+    if 'normalized_name' not in columns:
+        connection.exec_driver_sql("ALTER TABLE breeds ADD COLUMN normalized_name VARCHAR")
+    rows = connection.exec_driver_sql("SELECT id, name FROM breeds WHERE normalized_name IS NULL").fetchall()
+    if rows:
+        connection.exec_driver_sql(
+            "UPDATE breeds SET normalized_name = ? WHERE id = ?",
+            [(normalize_text(name), breed_id) for breed_id, name in rows]
+        )
+    for index in Breed.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+def _migration_006_client_sort_indexes(connection):
+    # Índices de expresión para ordenar el listado de clientes sin recorrer la
+    # tabla (checkfirst no sirve: SQLAlchemy no refleja índices de expresión)
+    for index in Client.__table__.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+
+def _migration_007_appointment_series(connection):
+    # Series explícitas de turnos repetidos. Los turnos repetidos que ya existen
+    # se agrupan como antes, por (cliente, horario), en una serie cada grupo
+    columns = {row[1] for row in connection.exec_driver_sql("PRAGMA table_xinfo(appointments)")}
+    if 'series_id' not in columns:
+        connection.exec_driver_sql(
+            "ALTER TABLE appointments ADD COLUMN series_id INTEGER REFERENCES appointment_series (id)"
+        )
+    AppointmentSeries.__table__.create(connection, checkfirst=True)
+    connection.exec_driver_sql(
+        "INSERT INTO appointment_series (origin_id, client_id, time, anchor) "
+        "SELECT min(id), client_id, time, min(date) FROM appointments "
+        "WHERE (repeat_weekly OR repeat_monthly) AND client_id IS NOT NULL AND time IS NOT NULL "
+        "AND series_id IS NULL GROUP BY client_id, time"
+    )
+    # Todos los turnos del grupo, también los no marcados: si el último no
+    # está marcado la serie terminó. El trigger se reemplaza por el que no
+    # registra los cambios de series_id.
+    connection.exec_driver_sql("DROP TRIGGER IF EXISTS appointments_change_au")
+    connection.exec_driver_sql(
+        "UPDATE appointments SET series_id = ("
+        "SELECT max(s.id) FROM appointment_series s "
+        "WHERE s.client_id = appointments.client_id AND s.time = appointments.time"
+        ") WHERE series_id IS NULL AND (client_id, time) IN (SELECT client_id, time FROM appointment_series)"
+    )
+    connection.exec_driver_sql(CHANGE_LOG_TRIGGERS[1])
+    _create_appointment_indexes(connection, ['ix_appointments_series_date'])
+
+def _migration_008_appointment_sort_index(connection):
+    # Índice de expresión para ordenar la búsqueda de turnos por fecha y hora
+    _create_appointment_indexes(connection, ['ix_appointments_date_time_sort'])
+
+# Migraciones versionadas: (versión, función). Se aplican en orden las que
+# sean mayores a la versión guardada en PRAGMA user_version.
+MIGRATIONS = [
+    (1, _migration_001_appointment_indexes),
+    (2, _migration_002_search_index),
+    (3, _migration_003_change_log),
+    (4, _migration_004_appointment_duration),
+    (5, _migration_005_breed_normalized_name),
+    (6, _migration_006_client_sort_indexes),
+    (7, _migration_007_appointment_series),
+    (8, _migration_008_appointment_sort_index),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def run_migrations(bind=None):
+    """Aplica las migraciones pendientes y devuelve la versión final del esquema"""
+    bind = bind if bind is not None else engine
+    with bind.begin() as connection:
+        current_version = get_schema_version(connection)
+        for version, migration in MIGRATIONS:
+            if version > current_version:
+                print(f"Aplicando migración de base de datos {version}: {migration.__name__}")
+                migration(connection)
+                connection.exec_driver_sql(f"PRAGMA user_version = {version}")
+                current_version = version
+    return current_version
+
+# Última versión asignada en change_log. Sale del contador de AUTOINCREMENT y
+# no de max(version): prune_change_log puede vaciar la tabla y la versión no
+# tiene que volver atrás por eso
+DATA_VERSION_SQL = "SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'change_log'), 0)"
+
+def get_data_version(connection):
+    """Última versión del registro de cambios (0 si nunca se registró un cambio)"""
+    return connection.exec_driver_sql(DATA_VERSION_SQL).scalar()
+
+def get_last_change(connection):
+    """
+    Versión y fecha (UTC, texto de SQLite) del último cambio registrado. La
+    fecha es None si la fila ya se borró del registro o nunca hubo cambios.
+    """
+    row = connection.exec_driver_sql(
+        f"SELECT v.version, (SELECT changed_at FROM change_log WHERE version = v.version) "
+        f"FROM ({DATA_VERSION_SQL} AS version) v"
+    ).first()
+    return row[0], row[1]
+
+def prune_change_log(bind=None, keep_days=30):
+    """Borra las filas del registro de cambios con más de keep_days días"""
+    bind = bind if bind is not None else engine
+    with bind.begin() as connection:
+        connection.exec_driver_sql(
+            "DELETE FROM change_log WHERE changed_at < datetime('now', ?)", (f"-{int(keep_days)} days",)
+        )
+
 def init_db():
     Base.metadata.create_all(engine)
+    run_migrations(engine)
+    prune_change_log(engine)
 
     # Add initial breeds
     session = Session()
@@ -96,18 +506,71 @@ def close_db_connections():
     # Cierra el motor de la base de datos
     engine.dispose()
 
-def verify_database_integrity():
-    Session = sessionmaker(bind=engine)
-    session = Session()
+def _integrity_state_path(bind):
+    return f"{bind.url.database}.integrity.json"
+
+def _load_integrity_state(path):
     try:
-        # Verificar que podemos acceder a todos los datos de las tablas
-        inspector = inspect(engine)
-        for table_name in inspector.get_table_names():
-            table = Base.metadata.tables[table_name]
-            session.query(table).all()
+        with open(path, encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+def _save_integrity_state(path, state):
+    try:
+        with open(path, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+    except OSError as e:
+        print(f"No se pudo guardar el estado de la verificación de integridad: {e}")
+
+def verify_database_integrity(mode='auto', bind=None):
+    """
+    Verifica la base de datos sin leer el contenido de las tablas:
+    - 'quick': PRAGMA quick_check
+    - 'full': PRAGMA integrity_check (además compara los índices con las tablas)
+    - 'auto': no verifica nada si el archivo y la versión de datos son los de la
+      última verificación correcta; hace la completa si la última tiene más de
+      integrity.full_check_days días y, si no, la rápida.
+    Devuelve True si la base está sana.
+    """
+    bind = bind if bind is not None else engine
+    state_path = _integrity_state_path(bind)
+    state = _load_integrity_state(state_path)
+    try:
+        stat = os.stat(bind.url.database)
+        with bind.connect() as connection:
+            signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                         'data_version': get_data_version(connection)}
+            if mode == 'auto':
+                if state.get('signature') == signature:
+                    print("Base de datos sin cambios desde la última verificación de integridad")
+                    return True
+                last_full = state.get('last_full_check')
+                full_check_days = config['integrity']['full_check_days']
+                if (last_full is None or datetime.datetime.fromisoformat(last_full)
+                        < local_now() - datetime.timedelta(days=full_check_days)):
+                    mode = 'full'
+                else:
+                    mode = 'quick'
+
+            # Las tablas del modelo tienen que existir (quick_check no detecta una tabla faltante)
+            missing = set(Base.metadata.tables) - set(inspect(connection).get_table_names())
+            if missing:
+                raise Exception(f"Faltan tablas: {', '.join(sorted(missing))}")
+
+            pragma = 'integrity_check' if mode == 'full' else 'quick_check'
+            result = [row[0] for row in connection.exec_driver_sql(f"PRAGMA {pragma}")]
+            if result != ['ok']:
+                raise Exception(f"{pragma}: {'; '.join(result[:10])}")
+
+        state['signature'] = signature
+        if mode == 'full':
+            state['last_full_check'] = local_now().isoformat()
+        _save_integrity_state(state_path, state)
         return True
     except Exception as e:
         print(f"Error durante la verificación de integridad: {e}")
+        # La próxima vez se vuelve a verificar todo
+        if os.path.exists(state_path):
+            os.remove(state_path)
         return False
-    finally:
-        session.close()
\ No newline at end of file
@@ -1,10 +1,13 @@
 import sys
 import time
+# Inicio del proceso, para medir el tiempo hasta el primer pintado de la ventana
+STARTED_AT = time.perf_counter()
 import hashlib
 from PyQt5.QtWidgets import QApplication, QMessageBox, QInputDialog, QLineEdit
 from main_window import MainWindow
-from database import init_db, close_db_connections, verify_database_integrity
-from backup import create_auto_backup, restore_from_auto_backup, try_restore_database
+from database import close_db_connections
+from backup import restore_from_auto_backup, try_restore_database
+from startup import StartupPipeline
 import os
 
 def handle_database_error(e):
@@ -50,15 +53,10 @@ if __name__ == '__main__':
     #if not prompt_password():
     #    sys.exit(0) 
     
-    try:
-        init_db()
-        if not verify_database_integrity():
-            raise Exception("La base de datos no pasó la verificación de integridad")
-        create_auto_backup()
-    except Exception as e:
-        if not handle_database_error(e):
-            sys.exit(1)
-    
-    window = MainWindow()
-    window.show()
+    # --verificacion-completa fuerza PRAGMA integrity_check en lugar del chequeo automático
+    mode = 'full' if '--verificacion-completa' in sys.argv else 'auto'
+    pipeline = StartupPipeline(app, lambda: MainWindow(STARTED_AT), handle_database_error, STARTED_AT, mode)
+    window = pipeline.run()
+    if window is None:
+        sys.exit(1)
     sys.exit(app.exec_())
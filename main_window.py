@@ -1,14 +1,24 @@
+import time
+import logging
 from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QStackedWidget
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, QEvent, pyqtSignal
+from database import config
 from backup import BackupWidget
 from create_client import CreateClientWidget
 from client_list import ClientListWidget 
 from appoint_calendar import AppointmentCalendarWidget
 from appointment_search import AppointmentSearchWidget  # Importar el nuevo widget
 
+logger = logging.getLogger('startup')
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    first_painted = pyqtSignal()
+
+    def __init__(self, started_at=None):
         super().__init__()
+        # Momento desde el que se mide el tiempo hasta el primer pintado
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_paint_ms = None
         self.setWindowTitle("TurnosCan")
         self.setGeometry(200, 50, 1000, 800)
 
@@ -66,36 +76,75 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(header_layout)
 
         # Stacked Widget for different sections
+        # Las secciones se crean recién cuando se activan (o en un momento libre
+        # después del primer pintado), así la ventana aparece sin esperar sus consultas
         self.stacked_widget = QStackedWidget()
-        self.create_client_widget = CreateClientWidget()
-        self.client_list_widget = ClientListWidget()
-        self.appointment_calendar_widget = AppointmentCalendarWidget()
-        self.appointment_search_widget = AppointmentSearchWidget()  # Nuevo widget
-        self.backup_widget = BackupWidget()
-
-        self.stacked_widget.addWidget(self.create_client_widget)
-        self.stacked_widget.addWidget(self.client_list_widget)
-        self.stacked_widget.addWidget(self.appointment_calendar_widget)
-        self.stacked_widget.addWidget(self.appointment_search_widget)  # Agregar el nuevo widget
-        self.stacked_widget.addWidget(self.backup_widget)
-
         main_layout.addWidget(self.stacked_widget)
 
+        self.sections = {
+            self.create_client_btn: ('create_client_widget', CreateClientWidget),
+            self.clients_btn: ('client_list_widget', ClientListWidget),
+            self.appointments_btn: ('appointment_calendar_widget', AppointmentCalendarWidget),
+            self.appointment_search_btn: ('appointment_search_widget', AppointmentSearchWidget),
+            self.backup_btn: ('backup_widget', BackupWidget),
+        }
+        for attribute, _ in self.sections.values():
+            setattr(self, attribute, None)
+
         # Conectar botones
-        self.create_client_btn.clicked.connect(lambda: self.change_section(self.create_client_widget, self.create_client_btn))
-        self.clients_btn.clicked.connect(lambda: self.change_section(self.client_list_widget, self.clients_btn))
-        self.appointments_btn.clicked.connect(lambda: self.change_section(self.appointment_calendar_widget, self.appointments_btn))
-        self.appointment_search_btn.clicked.connect(lambda: self.change_section(self.appointment_search_widget, self.appointment_search_btn))
-        self.backup_btn.clicked.connect(lambda: self.change_section(self.backup_widget, self.backup_btn))
+        for button in self.sections:
+            button.clicked.connect(lambda checked=False, button=button: self.change_section(button))
 
         # Botón activo inicial
         self.active_button = None
 
-    def change_section(self, widget, button):
+        # El calendario es la sección que se usa todo el día: se crea primero
+        self.change_section(self.appointments_btn)
+
+    def section_widget(self, button):
+        """Devuelve el widget de la sección, creándolo si todavía no existe"""
+        attribute, widget_class = self.sections[button]
+        widget = getattr(self, attribute)
+        if widget is None:
+            start = time.perf_counter()
+            widget = widget_class()
+            self.stacked_widget.addWidget(widget)
+            setattr(self, attribute, widget)
+            logger.info(f"Sección {widget_class.__name__} creada en {(time.perf_counter() - start) * 1000:.0f} ms")
+        return widget
+
+    def create_pending_sections(self):
+        """Crea de a una las secciones que faltan, cediendo el control a Qt entre cada una"""
+        for button, (attribute, _) in self.sections.items():
+            if getattr(self, attribute) is None:
+                self.section_widget(button)
+                QTimer.singleShot(0, self.create_pending_sections)
+                return
+
+    def event(self, event):
+        if event.type() == QEvent.Paint and self.first_paint_ms is None:
+            self.first_paint_ms = (time.perf_counter() - self.started_at) * 1000
+            budget_ms = config['startup']['first_paint_budget_ms']
+            if self.first_paint_ms > budget_ms:
+                logger.warning(f"Primer pintado de la ventana en {self.first_paint_ms:.0f} ms "
+                               f"(supera el objetivo de {budget_ms} ms)")
+            else:
+                logger.info(f"Primer pintado de la ventana en {self.first_paint_ms:.0f} ms")
+            # El resto de las secciones se crea cuando la ventana ya está visible
+            QTimer.singleShot(0, self.create_pending_sections)
+            self.first_painted.emit()
+        return super().event(event)
+
+    def change_section(self, button):
+        attribute, _ = self.sections[button]
+        created = getattr(self, attribute) is None
+        widget = self.section_widget(button)
         self.stacked_widget.setCurrentWidget(widget)
         self.update_active_button(button)
         
-        # Acciones adicionales para botones específicos
+        # Acciones adicionales para botones específicos (al crearse ya cargan sus datos)
+        if created:
+            return
         if button == self.clients_btn:
             self.client_list_widget.search_clients()
         elif button == self.appointment_search_btn:
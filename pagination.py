@@ -0,0 +1,96 @@
+from sqlalchemy import tuple_, desc
+from database import get_data_version
+
+FIRST = 'first'
+NEXT = 'next'
+PREVIOUS = 'previous'
+CURRENT = 'current'
+
+
+class KeysetPaginator:
+    """
+    Paginación por clave (keyset / seek) para las tablas paginadas.
+
+    En lugar de OFFSET, cada página se pide como "las n filas que siguen a la
+    última clave vista", con la clave = (columnas de orden..., id). Se guarda
+    la clave en la que empieza cada página visitada, así que ir a la página
+    siguiente o a la anterior cuesta lo mismo sin importar la profundidad.
+
+    El total de filas se cuenta una sola vez por filtro y versión de los
+    datos (get_data_version) y se reutiliza hasta que cambie alguno de los dos
+    o se llame a invalidate_count().
+    """
+
+    def __init__(self, page_size=15):
+        self.page_size = page_size
+        self.page = 1
+        self.has_next = False
+        # página -> clave de la última fila de la página anterior (None = desde el principio)
+        self.page_starts = {1: None}
+        self.last_key = None
+        self._count_key = None
+        self._count = 0
+
+    def reset(self):
+        self.page = 1
+        self.has_next = False
+        self.page_starts = {1: None}
+        self.last_key = None
+
+    def set_page_size(self, page_size):
+        self.page_size = page_size
+        self.reset()
+
+    def invalidate_count(self):
+        self._count_key = None
+
+    def total(self, query, count_key):
+        """
+        Devuelve el total de filas del filtro; solo cuenta de nuevo si cambió
+        count_key o si hubo cambios en la base desde el último conteo.
+        """
+        count_key = (count_key, get_data_version(query.session.connection()))
+        if self._count_key is None or count_key != self._count_key:
+            self._count = query.count()
+            self._count_key = count_key
+        return self._count
+
+    def total_pages(self, total):
+        return max(1, (total + self.page_size - 1) // self.page_size)
+
+    def fetch(self, query, sort_keys, id_column, descending=False, move=CURRENT):
+        """
+        Devuelve las entidades de la página pedida (FIRST, NEXT, PREVIOUS o
+        CURRENT). sort_keys son las expresiones de orden, que no deben ser
+        NULL (usar coalesce en columnas opcionales).
+        """
+        if move == FIRST:
+            self.reset()
+        elif move == NEXT and self.has_next:
+            self.page += 1
+            self.page_starts[self.page] = self.last_key
+        elif move == PREVIOUS and self.page > 1:
+            self.page -= 1
+
+        key_columns = list(sort_keys) + [id_column]
+        start_key = self.page_starts.get(self.page)
+        if start_key is not None:
+            # La cota sobre la primera columna es redundante, pero sin ella
+            # SQLite recorre el índice desde el principio en vez de buscar
+            if descending:
+                query = query.filter(tuple_(*key_columns) < tuple_(*start_key), key_columns[0] <= start_key[0])
+            else:
+                query = query.filter(tuple_(*key_columns) > tuple_(*start_key), key_columns[0] >= start_key[0])
+
+        if descending:
+            query = query.order_by(*[desc(column) for column in key_columns])
+        else:
+            query = query.order_by(*key_columns)
+
+        # Una fila de más para saber si existe la página siguiente
+        rows = query.add_columns(*key_columns).limit(self.page_size + 1).all()
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if rows:
+            self.last_key = tuple(rows[-1][1:])
+        return [row[0] for row in rows]
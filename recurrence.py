@@ -0,0 +1,190 @@
+import datetime
+import logging
+from collections import namedtuple
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import text, bindparam, Date, DateTime
+from database import config, local_now, START_MINUTE_SQL
+from appointment_cache import appointment_cache
+
+def setup_logger():
+    logger = logging.getLogger('recurrence')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'recurrence.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+# Días sin turnos tras los que una serie se considera terminada (algo más de un mes)
+LAPSE_DAYS = 35
+
+# Resultado de expand_recurring: cantidad de turnos creados y {fecha: turnos creados}
+ExpansionResult = namedtuple('ExpansionResult', ['created', 'dates'])
+
+# Fecha de la repetición n de una serie: semanal, n semanas después del
+# anchor; mensual, el mismo día del mes que el anchor n meses después, o el
+# último día del mes si ese mes es más corto (se calcula siempre desde el
+# anchor para que un 31 no quede en 28 para siempre)
+def _occurrence_date_sql(n):
+    month = f"date(anchor, 'start of month', printf('%+d months', {n}))"
+    day = f"date(anchor, 'start of month', printf('%+d months', {n}), '+' || (strftime('%d', anchor) - 1) || ' days')"
+    return f"""CASE
+               WHEN weekly THEN date(anchor, printf('%+d days', 7 * ({n})))
+               WHEN strftime('%m', {day}) = strftime('%m', {month}) THEN {day}
+               ELSE date(anchor, 'start of month', printf('%+d months', {n} + 1), '-1 day')
+           END"""
+
+# Turnos marcados como repetidos que todavía no son parte de una serie: cada
+# uno empieza una serie nueva con su horario y su fecha como anchor
+REGISTER_SQL = """
+INSERT INTO appointment_series (origin_id, client_id, time, anchor)
+SELECT id, client_id, time, date FROM appointments
+WHERE series_id IS NULL AND date >= :active_since
+  AND (repeat_weekly OR repeat_monthly) AND client_id IS NOT NULL AND time IS NOT NULL
+RETURNING id, origin_id
+"""
+
+# Series activas: las que tienen turnos y cuyo último turno (el de fecha más
+# alta, aunque se haya movido de horario) sigue marcado y no es anterior a
+# :active_since (hoy - LAPSE_DAYS); así un turno viejo que quedó marcado no
+# llena la agenda de golpe, y desmarcar el último turno termina la serie.
+# Servicio, precio, duración y frecuencia salen de ese último turno; el
+# horario y el anchor, de la serie. `since` es la última fecha ya cubierta:
+# generated_until, o el último turno si es posterior.
+ACTIVE_SERIES_SQL = """
+active_series AS (
+    SELECT s.id, s.client_id, s.time, s.anchor, last.status, last.price, last.duration,
+           coalesce(last.repeat_weekly, 0) AS weekly,
+           coalesce(last.repeat_monthly, 0) AS monthly,
+           max(coalesce(s.generated_until, last.date), last.date) AS since
+    FROM appointment_series s
+    JOIN appointments last ON last.id = (
+        SELECT a.id FROM appointments a WHERE a.series_id = s.id ORDER BY a.date DESC, a.id DESC LIMIT 1
+    )
+    WHERE (last.repeat_weekly OR last.repeat_monthly)
+      AND last.date >= :active_since
+      AND max(coalesce(s.generated_until, last.date), last.date) < :horizon
+)"""
+
+# Desde la última fecha cubierta de cada serie activa se generan las fechas
+# siguientes hasta el horizonte y se insertan, todo en una sola sentencia.
+# Una fecha se salta si ya hay un turno del cliente en ese horario, si se
+# superpondría con otro ya cargado ese día (búsqueda en
+# ix_appointments_date_start) o con otro que genera la misma pasada y empieza
+# antes (a igual hora, el de menor client_id y después el de menor serie).
+# Solo se crean turnos desde hoy. Las fechas que se saltan no se vuelven a
+# intentar: generated_until avanza igual (ADVANCE_SQL).
+EXPAND_SQL = f"""
+WITH RECURSIVE
+{ACTIVE_SERIES_SQL.strip()},
+occurrence(series_id, client_id, time, status, price, duration, weekly, monthly, anchor, since, n, date) AS (
+    SELECT id, client_id, time, status, price, duration, weekly, monthly, anchor, since, n,
+           {_occurrence_date_sql('n')}
+    FROM (
+        -- Repetición en o antes de `since` desde la que se sigue
+        SELECT *, CASE
+                      WHEN weekly THEN CAST((julianday(since) - julianday(anchor)) / 7 AS INTEGER)
+                      ELSE (strftime('%Y', since) - strftime('%Y', anchor)) * 12
+                           + strftime('%m', since) - strftime('%m', anchor) - 1
+                  END AS n
+        FROM active_series
+    )
+    UNION ALL
+    SELECT series_id, client_id, time, status, price, duration, weekly, monthly, anchor, since, n + 1,
+           {_occurrence_date_sql('n + 1')}
+    FROM occurrence
+    WHERE date < :horizon
+),
+candidate AS MATERIALIZED (
+    SELECT o.series_id, o.date, o.time, o.client_id, o.status, o.price, o.duration, o.weekly, o.monthly,
+           o.start_minute, o.start_minute + coalesce(o.duration, 60) AS end_minute
+    FROM (SELECT *, {START_MINUTE_SQL} AS start_minute FROM occurrence) o
+    WHERE o.date > o.since
+      AND o.date >= :today AND o.date <= :horizon
+      AND NOT EXISTS (
+          SELECT 1 FROM appointments e
+          WHERE e.date = o.date AND e.time = o.time AND e.client_id = o.client_id
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM appointments e
+          WHERE e.date = o.date AND e.start_minute < o.start_minute + coalesce(o.duration, 60)
+            AND e.end_minute > o.start_minute
+      )
+)
+INSERT INTO appointments (date, time, client_id, status, price, duration, confirmed,
+                          repeat_weekly, repeat_monthly, series_id, created_at)
+SELECT c.date, c.time, c.client_id, c.status, c.price, c.duration, 0, c.weekly, c.monthly, c.series_id, :now
+FROM candidate c
+WHERE NOT EXISTS (
+    SELECT 1 FROM candidate other
+    WHERE other.date = c.date AND other.start_minute < c.end_minute AND other.end_minute > c.start_minute
+      AND (other.start_minute < c.start_minute
+           OR (other.start_minute = c.start_minute AND other.client_id < c.client_id)
+           OR (other.start_minute = c.start_minute AND other.client_id = c.client_id
+               AND other.series_id < c.series_id))
+)
+RETURNING date
+"""
+
+# Las series activas quedan cubiertas hasta el horizonte
+ADVANCE_SQL = f"""
+WITH {ACTIVE_SERIES_SQL.strip()}
+UPDATE appointment_series SET generated_until = :horizon
+WHERE id IN (SELECT id FROM active_series)
+"""
+
+
+def horizon_date(today=None, weeks=None):
+    """Último día hasta el que se generan los turnos repetidos"""
+    today = today or datetime.date.today()
+    weeks = weeks if weeks is not None else config['recurrence']['horizon_weeks']
+    return today + datetime.timedelta(weeks=weeks)
+
+
+def expand_recurring(session, horizon=None, today=None):
+    """
+    Crea los turnos de las series semanales y mensuales que faltan hasta
+    `horizon` (por defecto, horizon_weeks semanas desde hoy) con un único
+    INSERT ... SELECT. Antes registra como series nuevas los turnos marcados
+    que todavía no tienen serie, y después deja cada serie cubierta hasta el
+    horizonte. No crea turnos que se superpongan con los existentes (tampoco
+    duplicados) ni vuelve a crear los que se borraron o se movieron, así que
+    se puede llamar las veces que haga falta: cada vez solo agrega lo que
+    falta al final de cada serie. Descarta del caché los días modificados y
+    devuelve un ExpansionResult.
+    """
+    today = today or datetime.date.today()
+    horizon = horizon or horizon_date(today)
+    params = {
+        'today': today,
+        'active_since': today - datetime.timedelta(days=LAPSE_DAYS),
+        'horizon': horizon,
+        'now': local_now(),
+    }
+    types = [bindparam('today', type_=Date), bindparam('active_since', type_=Date),
+             bindparam('horizon', type_=Date), bindparam('now', type_=DateTime)]
+
+    registered = session.execute(text(REGISTER_SQL).bindparams(types[1]), params).all()
+    if registered:
+        session.execute(text("UPDATE appointments SET series_id = :series_id WHERE id = :id"),
+                        [{'series_id': series_id, 'id': origin_id} for series_id, origin_id in registered])
+        logger.info(f"Series de turnos repetidos nuevas: {len(registered)}")
+    rows = session.execute(text(EXPAND_SQL).bindparams(*types), params).all()
+    session.execute(text(ADVANCE_SQL).bindparams(*types[1:3]), params)
+    session.commit()
+
+    dates = {}
+    for (created_date,) in rows:
+        created_date = datetime.date.fromisoformat(created_date)
+        dates[created_date] = dates.get(created_date, 0) + 1
+    if dates:
+        appointment_cache.invalidate(dates)
+        logger.info(f"Se crearon {len(rows)} turnos repetidos en {len(dates)} días (hasta el {horizon})")
+    return ExpansionResult(len(rows), dates)
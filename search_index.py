@@ -0,0 +1,155 @@
+import re
+import logging
+import unicodedata
+from logging.handlers import RotatingFileHandler
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.exc import OperationalError
+
+def setup_logger():
+    logger = logging.getLogger('search_index')
+    logger.setLevel(logging.INFO)
+
+    # Configurar el RotatingFileHandler
+    file_handler = RotatingFileHandler(
+        'search_index.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+# Tablas FTS5 de contenido externo: guardan solo el índice, los datos siguen
+# en clients / appointments y los triggers mantienen ambos sincronizados.
+FTS_TABLES = {
+    'clients_fts': ('clients', ['lastname', 'name', 'address', 'phone', 'dog_name', 'breed', 'comments']),
+    'appointments_fts': ('appointments', ['appoint_comment', 'status']),
+}
+
+# Columnas de cliente que se buscan desde la búsqueda de turnos
+APPOINTMENT_CLIENT_COLUMNS = ['lastname', 'name', 'dog_name']
+
+# unicode61 con remove_diacritics: "perez" encuentra "Pérez"
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+# Acentos y demás marcas que quedan separadas de la letra con NFKD
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+
+
+def normalize_text(value):
+    """
+    Minúsculas y sin acentos ('Pérez' -> 'perez'), igual que el tokenizador
+    de FTS5, para comparar texto en memoria con lo que escribe el usuario
+    """
+    if not value:
+        return ""
+    if value.isascii():
+        return value.casefold()
+    return COMBINING_MARKS.sub("", unicodedata.normalize('NFKD', value)).casefold()
+
+
+def fts5_available(connection):
+    """Indica si el SQLite en uso fue compilado con FTS5"""
+    try:
+        connection.exec_driver_sql("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        connection.exec_driver_sql("DROP TABLE temp.fts5_probe")
+        return True
+    except OperationalError:
+        return False
+
+
+def create_search_index(connection):
+    """Crea las tablas FTS5 y sus triggers, y las llena con los datos actuales"""
+    if not fts5_available(connection):
+        logger.warning("SQLite sin soporte FTS5: la búsqueda usará consultas LIKE")
+        return False
+
+    for fts_table, (content_table, columns) in FTS_TABLES.items():
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{column_list}, content='{content_table}', content_rowid='id', "
+            f"tokenize='{FTS_TOKENIZER}', prefix='2 3')"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {content_table} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END"
+        )
+        connection.exec_driver_sql(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+    logger.info("Índice de búsqueda FTS5 creado")
+    return True
+
+
+def search_index_enabled(session):
+    """Comprueba que existan las tablas FTS (una base restaurada puede no tenerlas)"""
+    count = session.execute(
+        text("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN ('clients_fts', 'appointments_fts')")
+    ).scalar()
+    return count == len(FTS_TABLES)
+
+
+def build_match_query(term, columns=None):
+    """
+    Convierte lo que escribe el usuario en una consulta MATCH de FTS5: cada
+    palabra se busca como prefijo y todas deben aparecer. Devuelve None si
+    el término no tiene palabras.
+    """
+    tokens = re.findall(r"\w+", term or "")
+    if not tokens:
+        return None
+    query = " ".join(f'"{token}"*' for token in tokens)
+    if columns:
+        query = f"{{{' '.join(columns)}}} : ({query})"
+    return query
+
+
+def client_search_subquery(session, term):
+    """
+    Subconsulta (id, rank) con los clientes que coinciden con el término,
+    o None si hay que usar la búsqueda LIKE (sin FTS5 o sin palabras).
+    rank es el puntaje bm25 de FTS5: menor es más relevante.
+    """
+    match = build_match_query(term)
+    if match is None or not search_index_enabled(session):
+        return None
+    return text(
+        "SELECT rowid AS id, rank FROM clients_fts WHERE clients_fts MATCH :match"
+    ).bindparams(match=match).columns(id=Integer, rank=Float).subquery('client_matches')
+
+
+def appointment_search_subquery(session, term):
+    """
+    Subconsulta (id, rank) con los turnos cuyas notas o servicio coinciden, o
+    cuyo cliente coincide por apellido, nombre o nombre del perro.
+    Devuelve None si hay que usar la búsqueda LIKE.
+    """
+    match = build_match_query(term)
+    if match is None or not search_index_enabled(session):
+        return None
+    client_match = build_match_query(term, APPOINTMENT_CLIENT_COLUMNS)
+    return text(
+        "SELECT id, min(rank) AS rank FROM ("
+        "  SELECT rowid AS id, rank FROM appointments_fts WHERE appointments_fts MATCH :match"
+        "  UNION ALL"
+        "  SELECT appointments.id AS id, clients_fts.rank AS rank FROM clients_fts"
+        "  JOIN appointments ON appointments.client_id = clients_fts.rowid"
+        "  WHERE clients_fts MATCH :client_match"
+        ") GROUP BY id"
+    ).bindparams(match=match, client_match=client_match).columns(id=Integer, rank=Float).subquery('appointment_matches')
@@ -0,0 +1,183 @@
+import datetime
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+from database import Session, Appointment, config, get_data_version
+
+def setup_logger():
+    logger = logging.getLogger('slot_finder')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'slot_finder.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+
+def parse_minutes(value):
+    """'08:30' -> 510"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class SlotFinder:
+    """
+    Buscador de horarios libres con un mapa de ocupación por día: un entero
+    con un bit por intervalo de bucket_minutes dentro del horario de atención
+    (bit en 1 = ocupado). Los días cerrados tienen todos los bits en 1.
+
+    Para buscar en un rango se concatenan los mapas de todos los días en un
+    solo entero (con un bit ocupado de separación entre días, así ningún
+    hueco cruza la medianoche) y los huecos se encuentran con unos pocos
+    desplazamientos y AND sobre ese entero: se procesan semanas o meses de
+    intervalos por operación en vez de recorrer turno por turno.
+
+    Los mapas quedan en memoria hasta que cambia la versión de datos
+    (change_log), que se consulta en cada búsqueda.
+    """
+    def __init__(self, settings=None, session_factory=Session, max_days=800, scan_days=28):
+        settings = settings or config['slots']
+        self.bucket_minutes = int(settings['bucket_minutes'])
+        self.day_start = parse_minutes(settings['day_start'])
+        self.buckets = (parse_minutes(settings['day_end']) - self.day_start) // self.bucket_minutes
+        self.appointment_minutes = int(settings['appointment_minutes'])
+        self.closed_weekdays = set(settings['closed_weekdays'])
+        self.session_factory = session_factory
+        self.max_days = max_days
+        self.scan_days = scan_days
+        # Bits por día en el entero del rango: los intervalos más uno de separación
+        self.stride = self.buckets + 1
+        self.day_mask = (1 << self.buckets) - 1
+        self.days = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def bucket_range(self, start_minute, end_minute):
+        """Intervalos (desde, hasta) que ocupa un turno, recortados al horario de atención"""
+        start = start_minute - self.day_start
+        end = end_minute - self.day_start
+        first = max(start, 0) // self.bucket_minutes
+        last = min(-(-end // self.bucket_minutes), self.buckets)
+        return first, last
+
+    def occupy(self, bitmap, start_minute, end_minute):
+        first, last = self.bucket_range(start_minute, end_minute)
+        if last > first:
+            bitmap |= ((1 << (last - first)) - 1) << first
+        return bitmap
+
+    def empty_day(self, day):
+        return self.day_mask if day.weekday() in self.closed_weekdays else 0
+
+    def load_days(self, session, start, end):
+        """
+        Calcula los mapas de los días del rango que no estén en memoria (una
+        consulta); cada turno ocupa su intervalo [start_minute, end_minute)
+        """
+        missing = [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+        missing = [day for day in missing if day not in self.days]
+        if not missing:
+            return
+        if len(self.days) + len(missing) > self.max_days:
+            # Se descartan solo los días fuera del rango: range_bitmap usa enseguida los de adentro
+            self.days = {day: bitmap for day, bitmap in self.days.items() if start <= day <= end}
+        bitmaps = {day: self.empty_day(day) for day in missing}
+        rows = session.query(Appointment.date, Appointment.start_minute, Appointment.end_minute).filter(
+            Appointment.date.between(missing[0], missing[-1]),
+            Appointment.time.isnot(None)
+        )
+        for day, start_minute, end_minute in rows:
+            if day in bitmaps:
+                bitmaps[day] = self.occupy(bitmaps[day], start_minute, end_minute)
+        self.days.update(bitmaps)
+
+    def range_bitmap(self, start, end, now=None):
+        """Entero con los mapas de start..end seguidos (bit en 1 = ocupado)"""
+        bitmap = 0
+        separator = 1 << self.buckets
+        for offset in range((end - start).days + 1):
+            day = start + datetime.timedelta(days=offset)
+            occupied = self.days[day] | separator
+            if now is not None and day == now.date():
+                # Lo que ya pasó hoy no se ofrece
+                passed = now.hour * 60 + now.minute - self.day_start
+                occupied |= (1 << min(max(-(-passed // self.bucket_minutes), 0), self.buckets)) - 1
+            elif now is not None and day < now.date():
+                occupied = self.day_mask | separator
+            bitmap |= occupied << (offset * self.stride)
+        return bitmap
+
+    def find_free_slots(self, start, end, count=8, minutes=None, now=None):
+        """
+        Los primeros `count` horarios libres entre las fechas start y end
+        (inclusive) donde entra un turno de `minutes` minutos, como datetime.
+        Los horarios sugeridos no se superponen entre sí. Con `now` no se
+        ofrecen horarios pasados. Se busca de a scan_days días y se corta al
+        llegar a `count`, así que solo se cargan las semanas necesarias.
+        """
+        minutes = minutes or self.appointment_minutes
+        length = -(-minutes // self.bucket_minutes)
+        if length > self.buckets:
+            return []
+
+        slots = []
+        session = self.session_factory()
+        try:
+            with self.lock:
+                version = get_data_version(session.connection())
+                if version != self.version:
+                    self.days.clear()
+                    self.version = version
+            window_start = start
+            while window_start <= end and len(slots) < count:
+                window_end = min(window_start + datetime.timedelta(days=self.scan_days - 1), end)
+                with self.lock:
+                    self.load_days(session, window_start, window_end)
+                    occupied = self.range_bitmap(window_start, window_end, now)
+                slots += self.free_starts(occupied, window_start, window_end, length, count - len(slots))
+                window_start = window_end + datetime.timedelta(days=1)
+        finally:
+            session.close()
+        return slots
+
+    def free_starts(self, occupied, start, end, length, count):
+        total_bits = ((end - start).days + 1) * self.stride
+        free = ~occupied & ((1 << total_bits) - 1)
+        # Bit i en 1 si los `length` intervalos desde i están libres: se combinan
+        # desplazamientos de 1, 2, 4... intervalos (log2(length) operaciones)
+        starts = free
+        covered = 1
+        while covered < length:
+            shift = min(covered, length - covered)
+            starts &= starts >> shift
+            covered += shift
+
+        slots = []
+        block = (1 << length) - 1
+        while starts and len(slots) < count:
+            lowest = starts & -starts
+            index = lowest.bit_length() - 1
+            day_offset, bucket = divmod(index, self.stride)
+            slot_minutes = self.day_start + bucket * self.bucket_minutes
+            slots.append(datetime.datetime.combine(
+                start + datetime.timedelta(days=day_offset),
+                datetime.time(slot_minutes // 60, slot_minutes % 60)
+            ))
+            # El siguiente sugerido empieza después de este turno
+            starts &= ~(block << index)
+        return slots
+
+    def invalidate(self):
+        with self.lock:
+            self.days.clear()
+            self.version = None
+
+
+slot_finder = SlotFinder()
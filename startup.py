@@ -0,0 +1,182 @@
+import json
+import time
+import datetime
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging.handlers import RotatingFileHandler
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QMessageBox
+from database import init_db, verify_database_integrity
+from backup import create_auto_backup
+
+PROFILE_FILENAME = 'startup_profile.json'
+
+def setup_logger():
+    logger = logging.getLogger('startup')
+    logger.setLevel(logging.INFO)
+
+    file_handler = RotatingFileHandler(
+        'startup.log',
+        maxBytes=1024 * 1024,  # 1 MB
+        backupCount=1
+    )
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return logger
+
+logger = setup_logger()
+
+
+class StartupProfile:
+    """
+    Tiempos de cada etapa del arranque, en milisegundos desde el inicio del proceso
+    """
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.stages = []
+        self.lock = threading.Lock()
+
+    def elapsed_ms(self, moment=None):
+        moment = moment if moment is not None else time.perf_counter()
+        return round((moment - self.started_at) * 1000, 1)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            end = time.perf_counter()
+            with self.lock:
+                self.stages.append({
+                    'name': name,
+                    'thread': threading.current_thread().name,
+                    'start_ms': self.elapsed_ms(start),
+                    'end_ms': self.elapsed_ms(end),
+                    'duration_ms': round((end - start) * 1000, 1),
+                    'ok': ok,
+                })
+            logger.info(f"Etapa {name}: {'correcta' if ok else 'con errores'} en {(end - start) * 1000:.0f} ms")
+
+    def mark(self, name):
+        """Registra un instante (por ejemplo, el primer pintado) como una etapa sin duración"""
+        with self.lock:
+            elapsed = self.elapsed_ms()
+            self.stages.append({'name': name, 'thread': threading.current_thread().name,
+                                'start_ms': elapsed, 'end_ms': elapsed, 'duration_ms': 0, 'ok': True})
+
+    def write(self, path=PROFILE_FILENAME):
+        with self.lock:
+            report = {
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'total_ms': max((stage['end_ms'] for stage in self.stages), default=0),
+                'stages': sorted(self.stages, key=lambda stage: stage['start_ms']),
+            }
+        try:
+            with open(path, 'w', encoding='utf-8') as profile_file:
+                json.dump(report, profile_file, indent=4)
+        except OSError as e:
+            logger.error(f"No se pudo guardar {path}: {e}")
+
+
+class StartupPipeline(QObject):
+    """
+    Arranque en etapas:
+    1. init_db (esquema y migraciones) en el hilo de la GUI
+    2. verificación de integridad en otro hilo, en paralelo con la construcción de la ventana
+    3. se muestra la ventana
+    4. después del primer pintado, el auto-backup en otro hilo
+    Los errores de base de datos del arranque van a on_database_error
+    (handle_database_error en main.py); si la restauración funciona se
+    construye la ventana de nuevo. Un auto-backup fallido solo se avisa: la
+    ventana ya está en uso y no se restaura la base por eso.
+    Al terminar se escribe startup_profile.json con los tiempos de cada etapa.
+    """
+    auto_backup_finished = pyqtSignal(object)  # None, o la excepción del auto-backup
+
+    def __init__(self, app, window_factory, on_database_error, started_at, integrity_mode='auto'):
+        super().__init__()
+        self.app = app
+        self.window_factory = window_factory
+        self.on_database_error = on_database_error
+        self.integrity_mode = integrity_mode
+        self.profile = StartupProfile(started_at)
+        self.window = None
+        self.profile_path = PROFILE_FILENAME
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='startup')
+        self.auto_backup_finished.connect(self.handle_auto_backup_finished)
+
+    def wait_for(self, future):
+        """Espera un resultado del otro hilo sin dejar de procesar los eventos de Qt"""
+        while not wait([future], timeout=0.05).done:
+            self.app.processEvents()
+        return future.result()
+
+    def check_integrity(self):
+        with self.profile.stage(f"integrity_check ({self.integrity_mode})"):
+            return verify_database_integrity(self.integrity_mode)
+
+    def build_window(self, name='main_window'):
+        with self.profile.stage(name):
+            return self.window_factory()
+
+    def discard_window(self, window):
+        # Detener el BackgroundWorker del calendario antes de restaurar la base
+        if window.appointment_calendar_widget is not None:
+            window.appointment_calendar_widget.close()
+        window.deleteLater()
+
+    def run(self):
+        """Ejecuta las etapas hasta mostrar la ventana. Devuelve la ventana, o None si no se pudo arrancar"""
+        window = None
+        try:
+            with self.profile.stage('init_db'):
+                init_db()
+            check = self.executor.submit(self.check_integrity)
+            try:
+                window = self.build_window()
+            finally:
+                healthy = self.wait_for(check)
+            if not healthy:
+                raise Exception("La base de datos no pasó la verificación de integridad")
+        except Exception as e:
+            if window is not None:
+                self.discard_window(window)
+            if not self.on_database_error(e):
+                self.finish()
+                return None
+            window = self.build_window('main_window (tras restaurar)')
+
+        self.window = window
+        window.first_painted.connect(self.start_auto_backup)
+        window.show()
+        return window
+
+    def start_auto_backup(self):
+        self.profile.mark('first_paint')
+        self.executor.submit(self.auto_backup)
+
+    def auto_backup(self):
+        try:
+            with self.profile.stage('auto_backup'):
+                create_auto_backup()
+            self.auto_backup_finished.emit(None)
+        except Exception as e:
+            self.auto_backup_finished.emit(e)
+
+    def handle_auto_backup_finished(self, error):
+        # Corre en el hilo de la GUI, así que puede mostrar el aviso
+        if error is not None:
+            logger.error(f"Error en el auto-backup: {error}")
+            QMessageBox.warning(self.window, "Copia de seguridad",
+                                f"No se pudo crear la copia de seguridad automática: {error}")
+        self.finish()
+
+    def finish(self):
+        self.executor.shutdown(wait=False)
+        self.profile.write(self.profile_path)
@@ -0,0 +1,487 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+import csv
+import io
+import json
+import threading
+import time
+import http.client
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from database import Base, Client, Appointment, run_migrations
+import api
+from change_feed import ChangeFeed
+
+
+class ApiTestCase(unittest.TestCase):
+    """Base para las pruebas de la API: una base temporal con clientes y turnos"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), [
+                {'lastname': "Pérez", 'name': "Juan", 'dog_name': "Firulais"},
+                {'lastname': "Gómez", 'name': "Ana", 'dog_name': "Luna"},
+            ])
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': datetime.date(2024, 1, day), 'time': datetime.time(hour, 0), 'client_id': 1 + day % 2,
+                 'confirmed': hour == 9, 'status': "Baño" if hour < 11 else "Corte", 'price': 1000.0,
+                 'appoint_comment': ""}
+                for day in range(1, 6) for hour in (9, 10, 11)
+            ])
+
+        self.feed = ChangeFeed(self.engine, poll_interval=0.05)
+        self.addCleanup(self.feed.close)
+        patches = [patch('api.Session', scoped_session(self.Session)), patch('appointment_service.appointment_cache'),
+                   patch('api.response_cache', api.ResponseCache()), patch('api.change_feed', self.feed)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def count_statements(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        return statements
+
+
+class TestListAppointments(ApiTestCase):
+
+    def test_filters_by_date_range_and_status(self):
+        response = self.client.get('/appointments?date_from=2024-01-02&date_to=2024-01-03&status=Baño')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(a['date'], a['time']) for a in response.json],
+                         [('2024-01-02', '09:00'), ('2024-01-02', '10:00'), ('2024-01-03', '09:00'), ('2024-01-03', '10:00')])
+        self.assertNotIn('X-Next-Cursor', response.headers)
+
+    def test_filters_by_client_and_confirmed(self):
+        response = self.client.get('/appointments?client_id=2&confirmed=true')
+        self.assertEqual([a['date'] for a in response.json], ['2024-01-01', '2024-01-03', '2024-01-05'])
+        self.assertTrue(all(a['confirmed'] and a['client_id'] == 2 for a in response.json))
+
+    def test_cursor_pagination_walks_every_appointment_once(self):
+        seen = []
+        url = '/appointments?limit=4'
+        while True:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.json), 4)
+            seen += [a['id'] for a in response.json]
+            cursor = response.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+            url = f'/appointments?limit=4&cursor={cursor}'
+        self.assertEqual(len(seen), 15)
+        self.assertEqual(len(set(seen)), 15)
+
+    def test_limit_is_capped(self):
+        with patch('api.MAX_PAGE_SIZE', 5):
+            response = self.client.get('/appointments?limit=50')
+        self.assertEqual(len(response.json), 5)
+        self.assertIn('X-Next-Cursor', response.headers)
+
+    def test_field_selection(self):
+        response = self.client.get('/appointments?fields=id,date&limit=1')
+        self.assertEqual(response.json, [{'id': 1, 'date': '2024-01-01'}])
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('date_from=ayer', 'confirmed=quizas', 'limit=0', 'cursor=basura', 'fields=id,precio'):
+            response = self.client.get(f'/appointments?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class TestIncludeClient(ApiTestCase):
+
+    def test_list_embeds_clients_with_constant_queries(self):
+        statements = self.count_statements()
+        response = self.client.get('/appointments?include=client&limit=4')
+        self.assertEqual(len(response.json), 4)
+        self.assertEqual(response.json[0]['client']['lastname'], "Gómez")
+        self.assertEqual(response.json[3]['client']['dog_name'], "Firulais")
+        few = len(statements)
+
+        statements.clear()
+        response = self.client.get('/appointments?include=client&limit=1000&date_from=2024-01-01')
+        self.assertEqual(len(response.json), 15)
+        # Versión de datos + una sola consulta de turnos con sus clientes, sin importar cuántos sean
+        self.assertEqual(len(statements), few)
+        self.assertEqual(len(statements), 2)
+
+    def test_single_appointment_embeds_client(self):
+        expected = {'id': 2, 'client': api.client_to_dict(self.Session().get(Client, 2))}
+        statements = self.count_statements()
+        response = self.client.get('/appointments/2?include=client&fields=id')
+        self.assertEqual(response.json, expected)
+        self.assertEqual(len(statements), 2)
+
+    def test_without_include_there_is_no_client(self):
+        self.assertNotIn('client', self.client.get('/appointments/1').json)
+        self.assertEqual(self.client.get('/appointments?include=mascota').status_code, 400)
+
+
+class TestExport(ApiTestCase):
+
+    def test_appointments_ndjson_is_streamed_in_chunks(self):
+        with patch('api.EXPORT_CHUNK_SIZE', 4):
+            response = self.client.get('/export/appointments')
+            self.assertTrue(response.is_streamed)
+            chunks = list(response.response)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        # 15 turnos de a 4 por vuelta del cursor
+        self.assertEqual(len(chunks), 4)
+        rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], list(range(1, 16)))
+        self.assertEqual(rows[0]['date'], '2024-01-01')
+
+    def test_clients_csv(self):
+        response = self.client.get('/export/clients?format=csv')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual([(row['lastname'], row['dog_name']) for row in rows], [("Pérez", "Firulais"), ("Gómez", "Luna")])
+
+    def test_empty_csv_has_header(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM appointments")
+        response = self.client.get('/export/appointments?format=csv')
+        self.assertEqual(response.get_data(as_text=True).strip(), ','.join(api.APPOINTMENT_FIELDS))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/export/clients?format=xml').status_code, 400)
+
+
+class TestConditionalGet(ApiTestCase):
+
+    def test_matching_etag_returns_304_without_running_the_query(self):
+        first = self.client.get('/appointments?date_from=2024-01-02')
+        etag = first.headers['ETag']
+        self.assertIsNotNone(first.headers.get('Last-Modified'))
+        statements = self.count_statements()
+        response = self.client.get('/appointments?date_from=2024-01-02', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('change_log', statements[0])
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/clients').headers['Last-Modified']
+        response = self.client.get('/clients', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/clients', headers={'If-Modified-Since': 'Mon, 01 Jan 2001 00:00:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_change_invalidates_etag_and_cache(self):
+        etag = self.client.get('/appointments/1').headers['ETag']
+        listing = self.client.get('/clients').json
+        self.client.put('/appointments/1', json={'date': '2024-01-01', 'time': '12:00', 'client_id': 2, 'status': "Corte",
+                                                 'price': 1200.0, 'confirmed': True, 'comment': ""})
+        response = self.client.get('/appointments/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['time'], '12:00')
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE clients SET name = 'Juana' WHERE id = 2")
+        self.assertNotEqual(self.client.get('/clients').json, listing)
+
+    def test_list_responses_are_served_from_cache(self):
+        first = self.client.get('/appointments?limit=4')
+        statements = self.count_statements()
+        second = self.client.get('/appointments?limit=4')
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(second.headers['X-Next-Cursor'], first.headers['X-Next-Cursor'])
+        self.assertEqual(len(statements), 1)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/appointments/999').status_code, 404)
+        self.assertNotIn('ETag', self.client.get('/appointments/999').headers)
+
+
+class TestBatch(ApiTestCase):
+
+    def appointment(self, hour):
+        return {'date': '2024-02-01', 'time': f'{hour:02d}:00', 'client_id': 1, 'status': "Baño",
+                'price': 1000.0, 'confirmed': False, 'comment': ""}
+
+    def test_all_operations_succeed(self):
+        response = self.client.post('/appointments/batch', json=[
+            {'op': 'create', 'data': self.appointment(9)},
+            {'op': 'create', 'data': self.appointment(10)},
+            {'op': 'update', 'id': 1, 'data': {'confirmed': True}},
+            {'op': 'delete', 'id': 2},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], [201, 201, 200, 200])
+        self.assertEqual(self.client.get('/appointments?date_from=2024-02-01').json[0]['time'], '09:00')
+        self.assertTrue(self.client.get('/appointments/1').json['confirmed'])
+        self.assertEqual(self.client.get('/appointments/2').status_code, 404)
+
+    def test_partial_failure_returns_207(self):
+        response = self.client.post('/appointments/batch', json=[
+            {'op': 'create', 'data': self.appointment(9)},
+            {'op': 'create', 'data': {'date': '2024-02-01'}},
+            {'op': 'update', 'id': 999, 'data': {'confirmed': True}},
+            {'op': 'mover', 'id': 1},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], [201, 400, 404, 400])
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3])
+        self.assertIn('error', results[1])
+        self.assertEqual(len(self.client.get('/appointments?date_from=2024-02-01').json), 1)
+
+    def test_invalid_body(self):
+        self.assertEqual(self.client.post('/appointments/batch', json={'op': 'create'}).status_code, 400)
+        with patch('api.MAX_BATCH_SIZE', 2):
+            response = self.client.post('/appointments/batch', json=[{'op': 'delete', 'id': 1}] * 3)
+        self.assertEqual(response.status_code, 413)
+
+
+class TestDurationAndOverlaps(ApiTestCase):
+
+    def appointment(self, time, **extra):
+        return dict({'date': '2024-02-01', 'time': time, 'client_id': 1, 'status': "Baño",
+                     'price': 1000.0, 'confirmed': False, 'comment': ""}, **extra)
+
+    def test_duration_defaults_to_the_service(self):
+        self.assertEqual(self.client.post('/appointments', json=self.appointment('09:00', status="Baño y corte")).status_code, 201)
+        self.assertEqual(self.client.post('/appointments', json=self.appointment('10:30', duration=30)).status_code, 201)
+        listing = self.client.get('/appointments?date_from=2024-02-01&fields=time,duration').json
+        self.assertEqual(listing, [{'time': '09:00', 'duration': 90}, {'time': '10:30', 'duration': 30}])
+
+    def test_changing_the_service_resets_the_duration(self):
+        self.assertEqual(self.client.post('/appointments', json=self.appointment('09:00')).status_code, 201)
+        appointment_id = self.client.get('/appointments?date_from=2024-02-01&fields=id').json[0]['id']
+        self.assertEqual(self.client.get(f'/appointments/{appointment_id}').json['duration'], 60)
+        # Sin duración, la del servicio nuevo; con duración, la que viene
+        self.client.put(f'/appointments/{appointment_id}', json=self.appointment('09:00', status="Baño y corte"))
+        self.assertEqual(self.client.get(f'/appointments/{appointment_id}').json['duration'], 90)
+        self.client.put(f'/appointments/{appointment_id}', json=self.appointment('09:00', duration=45))
+        self.assertEqual(self.client.get(f'/appointments/{appointment_id}').json['duration'], 45)
+        response = self.client.post('/appointments/batch', json=[
+            {'op': 'update', 'id': appointment_id, 'data': {'status': "Baño y corte"}}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'/appointments/{appointment_id}').json['duration'], 90)
+
+    def test_overlapping_writes_return_409(self):
+        # 2/1 tiene turnos de 9, 10 y 11 (ids 4, 5 y 6)
+        response = self.client.post('/appointments', json=self.appointment('09:30', date='2024-01-02'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json['conflict_id'], 5)
+        response = self.client.put('/appointments/6', json=self.appointment('10:30', date='2024-01-02'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get('/appointments/6').json['time'], '11:00')
+
+        response = self.client.post('/appointments/batch', json=[
+            {'op': 'update', 'id': 6, 'data': {'time': '12:00'}},
+            {'op': 'create', 'data': self.appointment('11:00', date='2024-01-02')},
+            {'op': 'create', 'data': self.appointment('12:30', date='2024-01-02')},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([r['status'] for r in response.json['results']], [200, 201, 409])
+
+    def test_invalid_appointments_return_400(self):
+        invalid = [self.appointment('25:00'), self.appointment('09:00', date='2024-02-30'),
+                   self.appointment('09:00', duration="una hora"), self.appointment(None)]
+        for data in invalid:
+            self.assertEqual(self.client.post('/appointments', json=data).status_code, 400, data)
+            self.assertEqual(self.client.put('/appointments/6', json=data).status_code, 400, data)
+        missing = self.appointment('09:00')
+        del missing['client_id']
+        response = self.client.post('/appointments', json=missing)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('client_id', response.json['error'])
+        self.assertEqual(self.client.put('/appointments/6', json=missing).status_code, 400)
+        response = self.client.put('/appointments/999', json=self.appointment('09:00'))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['error'], 'Appointment not found')
+
+    def test_overlap_report(self):
+        with self.engine.begin() as connection:
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': datetime.date(2024, 1, 2), 'time': datetime.time(9, 30), 'client_id': 1, 'duration': 60},
+                {'date': datetime.date(2024, 1, 4), 'time': datetime.time(11, 45), 'client_id': 1, 'duration': 15},
+            ])
+        response = self.client.get('/appointments/overlaps?date_from=2024-01-01&date_to=2024-01-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [
+            {'date': '2024-01-02', 'start': '09:00', 'end': '11:00', 'ids': [4, 5, 16]},
+            {'date': '2024-01-04', 'start': '11:00', 'end': '12:00', 'ids': [12, 17]},
+        ])
+        self.assertEqual(self.client.get('/appointments/overlaps?date_from=2024-01-03&date_to=2024-01-03').json, [])
+        self.assertEqual(self.client.get('/appointments/overlaps?date_from=2024-01-01').status_code, 400)
+        self.assertEqual(self.client.get('/appointments/overlaps?date_from=ayer&date_to=hoy').status_code, 400)
+
+
+class TestThreadPoolServer(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = api.ThreadPoolWSGIServer('127.0.0.1', 0, api.app, workers=4)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        super().tearDown()
+
+    def get(self, path):
+        with urllib.request.urlopen(self.base_url + path) as response:
+            return response.status, json.loads(response.read())
+
+    def test_concurrent_reads_use_worker_threads(self):
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            responses = list(executor.map(self.get, ['/appointments?date_from=2024-01-02&date_to=2024-01-02'] * 40))
+        self.assertEqual({status for status, _ in responses}, {200})
+        self.assertTrue(all(len(body) == 3 for _, body in responses))
+
+    def test_writes_are_serialized(self):
+        active = []
+        overlaps = []
+
+        def slow_save(session, values, appointment_id=None):
+            active.append(1)
+            overlaps.append(len(active))
+            threading.Event().wait(0.02)
+            active.pop()
+
+        def post(i):
+            data = json.dumps({'date': '2024-02-01', 'time': '09:00', 'client_id': 1, 'status': "Baño",
+                               'price': 1.0, 'confirmed': False, 'comment': ""}).encode()
+            request = urllib.request.Request(self.base_url + '/appointments', data=data, method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request) as response:
+                return response.status
+
+        with patch('api.save_appointment', side_effect=slow_save):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                self.assertEqual(set(executor.map(post, range(8))), {201})
+        self.assertEqual(max(overlaps), 1)
+
+
+class TestChanges(ApiTestCase):
+    # setUp registra 17 cambios: 2 clientes y 15 turnos
+
+    def test_changes_since_version(self):
+        self.client.put('/appointments/1', json={'date': '2024-01-08', 'time': '09:00', 'client_id': 1,
+                                                 'status': "Baño", 'price': 1.0, 'confirmed': True, 'comment': ""})
+        response = self.client.get('/changes?since=16')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['version'], 19)
+        self.assertFalse(response.json['more'])
+        self.assertEqual([(c['version'], c['table'], c['id'], c['op'], c['date']) for c in response.json['changes']], [
+            (17, 'appointments', 15, 'insert', '2024-01-05'),
+            (18, 'appointments', 1, 'update', '2024-01-08'),
+            (19, 'appointments', 1, 'update', '2024-01-01'),
+        ])
+
+    def test_without_since_returns_current_version(self):
+        self.assertEqual(self.client.get('/changes').json, {'version': 17, 'more': False, 'changes': []})
+
+    def test_pages_with_limit(self):
+        response = self.client.get('/changes?since=0&limit=10')
+        self.assertEqual(response.json['version'], 10)
+        self.assertTrue(response.json['more'])
+        response = self.client.get(f"/changes?since={response.json['version']}&limit=10")
+        self.assertEqual([c['version'] for c in response.json['changes']], list(range(11, 18)))
+        self.assertFalse(response.json['more'])
+
+    def test_pruned_or_newer_version_is_gone(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM change_log WHERE version <= 5")
+        self.assertEqual(self.client.get('/changes?since=2').status_code, 410)
+        self.assertEqual(self.client.get('/changes?since=5').status_code, 200)
+        response = self.client.get('/changes?since=40')
+        self.assertEqual((response.status_code, response.json['version']), (410, 17))
+
+    def test_invalid_since(self):
+        self.assertEqual(self.client.get('/changes?since=-1').status_code, 400)
+        self.assertEqual(self.client.get('/changes/stream?since=abc').status_code, 400)
+
+
+class TestChangeStream(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Un solo hilo en el pool: los streams no pueden ocuparlo
+        self.server = api.ThreadPoolWSGIServer('127.0.0.1', 0, api.app, workers=1)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        # El hilo del feed no tiene que seguir usando la base temporal cuando se borra
+        poller = self.feed.thread
+        self.feed.close()
+        if poller is not None:
+            poller.join()
+        super().tearDown()
+
+    def open_stream(self, path='/changes/stream', headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=5)
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        self.addCleanup(connection.close)
+        self.assertEqual(response.getheader('Content-Type'), 'text/event-stream; charset=utf-8')
+        self.assertEqual(response.readline(), b"retry: 2000\n")
+        self.assertEqual(response.readline(), b"\n")
+        return response
+
+    def read_event(self, response):
+        fields = {}
+        while (line := response.readline().decode().rstrip('\n')):
+            key, _, value = line.partition(': ')
+            fields[key] = value
+        return fields
+
+    def test_catch_up_then_live_changes(self):
+        response = self.open_stream(headers={'Last-Event-ID': '15'})
+        self.assertEqual([self.read_event(response)['id'] for _ in range(2)], ['16', '17'])
+
+        started = time.monotonic()
+        self.assertEqual(self.client.delete('/appointments/3').status_code, 200)
+        event = self.read_event(response)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual((event['id'], event['event']), ('18', 'change'))
+        self.assertEqual(json.loads(event['data'])['op'], 'delete')
+
+    def test_one_change_reaches_every_stream(self):
+        streams = [self.open_stream() for _ in range(5)]
+        # Con los streams abiertos el único hilo del pool sigue libre
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.server.server_port}/changes", timeout=5) as response:
+            self.assertEqual(json.loads(response.read())['version'], 17)
+
+        with self.engine.begin() as connection:
+            # Cambio hecho por otro proceso (sin notify): llega en el siguiente ciclo del feed
+            connection.execute(Client.__table__.insert(), {'lastname': "López"})
+        for stream in streams:
+            event = self.read_event(stream)
+            self.assertEqual(event['id'], '18')
+            self.assertEqual(json.loads(event['data'])['table'], 'clients')
+
+    def test_restored_backup_sends_reset(self):
+        response = self.open_stream('/changes/stream?since=30')
+        self.assertEqual(self.read_event(response), {'id': '17', 'event': 'reset', 'data': '{"version": 17}'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,7 @@ from unittest.mock import MagicMock, patch
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import QDate, QTime
 from appoint_calendar import AppointmentCalendarWidget, AppointmentDialog
-from database import Session, Appointment, Client
+from database import Session, Client
 
 class TestAppointmentCalendarWidget(unittest.TestCase):
     @classmethod
@@ -24,23 +24,17 @@ class TestAppointmentCalendarWidget(unittest.TestCase):
         self.assertIsNotNone(self.widget.appointment_count_label)
         self.assertIsNotNone(self.widget.appointment_count_number)
 
-    @patch('appoint_calendar.Session')
-    def test_load_appointments(self, mock_session):
-        # Configurar el mock de la sesión
-        mock_session_instance = MagicMock()
-        mock_session.return_value = mock_session_instance
-
-        # Crear algunos appointments de prueba
+    @patch('appoint_calendar.appointment_cache')
+    def test_load_appointments(self, mock_cache):
+        # Crear algunos turnos de prueba (snapshots servidos por el caché)
         test_date = QDate(2023, 6, 1).toPyDate()
-        test_appointments = [
-            MagicMock(id=1, date=test_date, time=QTime(9, 0).toPyTime(), 
-                      client=MagicMock(lastname="Doe", name="John")),
-            MagicMock(id=2, date=test_date, time=QTime(10, 0).toPyTime(), 
-                      client=MagicMock(lastname="Smith", name="Jane"))
-        ]
-        mock_query = MagicMock()
-        mock_query.filter.return_value.order_by.return_value.all.return_value = test_appointments
-        mock_session_instance.query.return_value = mock_query
+        test_appointments = (
+            MagicMock(id=1, date=test_date, time=QTime(9, 0).toPyTime(),
+                      client_lastname="Doe", client_name="John"),
+            MagicMock(id=2, date=test_date, time=QTime(10, 0).toPyTime(),
+                      client_lastname="Smith", client_name="Jane")
+        )
+        mock_cache.get_day.return_value = test_appointments
 
         # Establecer la fecha seleccionada en el calendario
         self.widget.calendar.setSelectedDate(QDate(2023, 6, 1))
@@ -48,14 +42,14 @@ class TestAppointmentCalendarWidget(unittest.TestCase):
         # Llamar al método que queremos probar
         self.widget.load_appointments()
 
-        # Verificar que se llamó a la consulta de la base de datos
-        mock_session_instance.query.assert_called_with(Appointment)
+        # Verificar que los turnos se pidieron al caché para la fecha seleccionada
+        mock_cache.get_day.assert_called_with(test_date)
 
         # Verificar que se actualizó el contador de turnos
         self.assertEqual(self.widget.appointment_count_number.text(), "2")
 
-        # Verificar que se agregaron los items a la lista de turnos
-        self.assertEqual(self.widget.appointment_list.count(), 2)
+        # Verificar que se agregaron las filas al modelo de la lista de turnos
+        self.assertEqual(self.widget.appointment_model.rowCount(), 2)
 
     @patch('appoint_calendar.AppointmentDialog')
     def test_create_appointment(self, mock_dialog):
@@ -65,16 +59,14 @@ class TestAppointmentCalendarWidget(unittest.TestCase):
         mock_dialog.return_value = mock_dialog_instance
 
         # Llamar al método que queremos probar
-        with patch.object(self.widget, 'load_appointments') as mock_load:
-            with patch.object(self.widget, 'update_calendar') as mock_update:
-                self.widget.create_appointment()
+        with patch.object(self.widget, 'apply_changes') as mock_apply:
+            self.widget.create_appointment()
 
         # Verificar que se creó el diálogo
         mock_dialog.assert_called_once()
 
-        # Verificar que se llamaron los métodos para actualizar la vista
-        mock_load.assert_called_once()
-        mock_update.assert_called_once()
+        # Verificar que la vista se actualizó con los cambios del diálogo
+        mock_apply.assert_called_once_with(mock_dialog_instance.changes)
 
     # Puedes agregar más tests aquí para otros métodos de AppointmentCalendarWidget
 
@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment
+from appointment_cache import AppointmentCache
+from appointment_service import ChangeSet
+
+
+class TestAppointmentCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        client = Client(lastname="Pérez", name="Juan", dog_name="Firulais")
+        session.add(client)
+        session.flush()
+        self.client_id = client.id
+        for month in (1, 2, 3):
+            for hour in (10, 9):
+                session.add(Appointment(date=datetime.date(2024, month, 5), time=datetime.time(hour, 0),
+                                        client_id=client.id, confirmed=False))
+        session.commit()
+        session.close()
+
+        self.queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count_query)
+        self.cache = AppointmentCache(max_months=2, session_factory=self.Session)
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_day_and_month_reads_hit_memory(self):
+        day = datetime.date(2024, 1, 5)
+        appointments = self.cache.get_day(day)
+        self.assertEqual([appointment.time.hour for appointment in appointments], [9, 10])
+        self.assertEqual(appointments[0].client_full_name, "Pérez Juan")
+        self.assertEqual(self.queries, 1)
+
+        self.cache.get_day(datetime.date(2024, 1, 6))
+        self.assertEqual(self.cache.day_counts(2024, 1), {day: 2})
+        self.assertEqual(self.queries, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_lru_eviction(self):
+        for month in (1, 2, 1, 3):
+            self.cache.get_month(2024, month)
+        self.assertEqual(self.queries, 3)
+        # Febrero fue el menos usado y se descartó; enero sigue en memoria
+        self.cache.get_month(2024, 1)
+        self.assertEqual(self.queries, 3)
+        self.cache.get_month(2024, 2)
+        self.assertEqual(self.queries, 4)
+
+    def test_patch_applies_in_place(self):
+        first = self.cache.get_day(datetime.date(2024, 1, 5))[0]
+        self.cache.apply_changes(ChangeSet(patched={first.id: {'confirmed': True}}))
+        self.assertTrue(self.cache.get_day(datetime.date(2024, 1, 5))[0].confirmed)
+        self.assertEqual(self.queries, 1)
+
+    def test_precise_invalidation(self):
+        self.cache.get_month(2024, 1)
+        self.cache.get_month(2024, 2)
+        appointment = self.cache.get_day(datetime.date(2024, 1, 5))[0]
+        self.cache.apply_changes(ChangeSet(deleted=[appointment.id]))
+        self.cache.get_month(2024, 2)
+        self.assertEqual(self.queries, 2)
+        self.cache.get_month(2024, 1)
+        self.assertEqual(self.queries, 3)
+
+        self.cache.invalidate_client(self.client_id)
+        self.cache.get_month(2024, 2)
+        self.assertEqual(self.queries, 4)
+
+    def test_applied_versions_are_kept_only_for_a_consumer(self):
+        # Sin consumidor (proceso de la API) no se guardan
+        self.cache.apply_changes(ChangeSet(deleted=[1], versions=[5, 6]))
+        self.assertEqual(self.cache.take_applied_versions(10), set())
+
+        self.cache.track_applied_versions()
+        self.cache.apply_changes(ChangeSet(deleted=[1], versions=[7, 8]))
+        self.assertEqual(self.cache.take_applied_versions(7), {7})
+        self.assertEqual(self.cache.take_applied_versions(10), {8})
+        self.assertEqual(self.cache.take_applied_versions(10), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import datetime
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import Qt
+from database import AppointmentSnapshot
+from appointment_day_view import AppointmentDayModel
+
+
+def make_snapshot(appointment_id, hour, confirmed=False, lastname="Pérez"):
+    return AppointmentSnapshot(
+        id=appointment_id, date=datetime.date(2024, 1, 1), time=datetime.time(hour, 0), confirmed=confirmed,
+        status="Baño", price=1000.0, appoint_comment=None, repeat_weekly=False, repeat_monthly=False,
+        client_id=1, client_lastname=lastname, client_name="Juan", client_address="Calle 123",
+        client_phone="1234", client_dog_name="Firulais", client_breed="Caniche", client_comments=None,
+    )
+
+
+class TestAppointmentDayModel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.model = AppointmentDayModel()
+        self.model.set_appointments([make_snapshot(1, 9), make_snapshot(2, 10), make_snapshot(3, 11)])
+        self.events = []
+        self.model.dataChanged.connect(lambda top, bottom: self.events.append(('changed', top.row())))
+        self.model.rowsInserted.connect(lambda parent, first, last: self.events.append(('inserted', first)))
+        self.model.rowsRemoved.connect(lambda parent, first, last: self.events.append(('removed', first)))
+        self.model.modelReset.connect(lambda: self.events.append(('reset', None)))
+
+    def test_display_data(self):
+        self.assertEqual(self.model.rowCount(), 3)
+        self.assertEqual(self.model.index(0, 0).data(), "09:00")
+        self.assertEqual(self.model.index(0, 1).data(), "Pérez Juan")
+        self.assertEqual(self.model.index(0, 4).data(), "Firulais (Caniche)")
+        self.assertEqual(self.model.index(0, 6).data(), "$1000.0")
+        self.assertEqual(self.model.index(0, AppointmentDayModel.CONFIRMED_COLUMN).data(Qt.CheckStateRole), Qt.Unchecked)
+
+    def test_refresh_without_changes_emits_nothing(self):
+        self.model.set_appointments([make_snapshot(1, 9), make_snapshot(2, 10), make_snapshot(3, 11)])
+        self.assertEqual(self.events, [])
+
+    def test_refresh_only_touches_changed_rows(self):
+        self.model.set_appointments([make_snapshot(1, 9), make_snapshot(2, 10, confirmed=True),
+                                     make_snapshot(4, 12)])
+        self.assertEqual(self.events, [('removed', 2), ('changed', 1), ('inserted', 2)])
+        self.assertEqual([appointment.id for appointment in self.model.appointments], [1, 2, 4])
+
+    def test_reorder_resets_model(self):
+        self.model.set_appointments([make_snapshot(2, 8), make_snapshot(1, 9), make_snapshot(3, 11)])
+        self.assertEqual(self.events, [('reset', None)])
+
+    def test_update_single_appointment(self):
+        self.assertEqual(self.model.update_appointment(make_snapshot(3, 11, confirmed=True)), 2)
+        self.assertEqual(self.events, [('changed', 2)])
+        self.assertEqual(self.model.update_appointment(make_snapshot(99, 11)), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
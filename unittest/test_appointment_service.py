@@ -0,0 +1,278 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations
+from appointment_service import (save_appointment, set_confirmed, shift_appointment_time, remove_appointment, apply_batch,
+                                 find_overlaps, AppointmentConflict, AppointmentNotFound, DayIntervals)
+
+
+class TestAppointmentService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.client = Client(lastname="Pérez", name="Juan", dog_name="Firulais", breed="Caniche")
+        self.session.add(self.client)
+        self.session.commit()
+        self.day = datetime.date(2024, 3, 4)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def create(self, hour=9, day=None, minute=0, status="Baño"):
+        return save_appointment(self.session, {
+            'date': day or self.day, 'time': datetime.time(hour, minute), 'client_id': self.client.id,
+            'confirmed': False, 'price': 1500.0, 'status': status, 'appoint_comment': "",
+        })
+
+    def test_create_returns_snapshot_and_day_count(self):
+        self.create(9)
+        changes = self.create(10)
+        snapshot = changes.upserted[0]
+        self.assertEqual(snapshot.client_full_name, "Pérez Juan")
+        self.assertEqual(snapshot.time, datetime.time(10, 0))
+        self.assertEqual(changes.day_counts, {self.day: 2})
+
+    def test_moving_to_another_day_counts_both_days(self):
+        appointment_id = self.create().upserted[0].id
+        new_day = self.day + datetime.timedelta(days=1)
+        changes = save_appointment(self.session, {'date': new_day}, appointment_id)
+        self.assertEqual(changes.upserted[0].date, new_day)
+        self.assertEqual(changes.day_counts, {self.day: 0, new_day: 1})
+
+    def test_toggle_confirmation_is_a_single_update(self):
+        appointment_id = self.create().upserted[0].id
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        changes = set_confirmed(self.session, appointment_id, True)
+        # El UPDATE y las versiones de change_log que escribió
+        self.assertEqual(statements, ['UPDATE', 'SELECT'])
+        self.assertEqual(changes.patched, {appointment_id: {'confirmed': True}})
+        self.assertEqual(changes.day_counts, {})
+        self.assertTrue(self.session.get(Appointment, appointment_id).confirmed)
+        self.assertTrue(set_confirmed(self.session, 999, True).is_empty)
+
+    def test_shift_time(self):
+        appointment_id = self.create(9).upserted[0].id
+        changes = shift_appointment_time(self.session, appointment_id, 30)
+        self.assertEqual(changes.patched, {appointment_id: {'time': datetime.time(9, 30)}})
+
+    def test_duration_defaults_to_the_service(self):
+        first = self.create(9, status="Baño y corte").upserted[0].id
+        second = self.create(11).upserted[0].id
+        self.assertEqual(self.session.get(Appointment, first).duration, 90)
+        self.assertEqual(self.session.get(Appointment, second).duration, 60)
+        self.assertEqual(self.session.get(Appointment, first).end_minute, 10 * 60 + 30)
+
+    def test_overlapping_appointments_are_rejected(self):
+        first = self.create(9, status="Baño y corte").upserted[0].id
+        with self.assertRaises(AppointmentConflict) as raised:
+            self.create(10)
+        self.assertEqual(raised.exception.conflict_id, first)
+        self.session.rollback()
+        self.assertEqual(self.session.query(Appointment).count(), 1)
+
+        second = self.create(10, minute=30).upserted[0].id
+        with self.assertRaises(AppointmentConflict):
+            save_appointment(self.session, {'duration': 120}, first)
+        self.session.rollback()
+        # Cambiar otros datos no vuelve a controlar el horario
+        save_appointment(self.session, {'appoint_comment': "Llega tarde"}, second)
+        with self.assertRaises(AppointmentConflict):
+            shift_appointment_time(self.session, second, -15)
+        self.assertEqual(shift_appointment_time(self.session, second, 15).patched,
+                         {second: {'time': datetime.time(10, 45)}})
+
+    def test_long_earlier_appointment_is_not_skipped(self):
+        # Turnos viejos superpuestos entre sí, cargados sin control
+        with self.engine.begin() as connection:
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': self.day, 'time': datetime.time(9), 'duration': 180, 'client_id': self.client.id},
+                {'date': self.day, 'time': datetime.time(10), 'duration': 30, 'client_id': self.client.id},
+            ])
+        first = self.session.query(Appointment.id).filter(Appointment.duration == 180).scalar()
+        with self.assertRaises(AppointmentConflict) as raised:
+            self.create(11)
+        self.assertEqual(raised.exception.conflict_id, first)
+        self.session.rollback()
+        self.create(12)
+
+        intervals = DayIntervals()
+        intervals.add(540, 720, 1)
+        intervals.add(600, 630, 2)
+        self.assertEqual(intervals.conflict(660, 720), (540, 720, 1))
+        self.assertIsNone(intervals.conflict(720, 780))
+
+    def test_editing_a_missing_appointment(self):
+        with self.assertRaises(AppointmentNotFound):
+            save_appointment(self.session, {'appoint_comment': "x"}, 999)
+
+    def test_remove(self):
+        appointment_id = self.create().upserted[0].id
+        changes = remove_appointment(self.session, appointment_id)
+        self.assertEqual(changes.deleted, [appointment_id])
+        self.assertEqual(changes.day_counts, {self.day: 0})
+        self.assertIsNone(self.session.get(Appointment, appointment_id))
+        self.assertTrue(remove_appointment(self.session, appointment_id).is_empty)
+
+
+
+class TestApplyBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        # Los ids de las altas salen de los triggers de change_log
+        run_migrations(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.client = Client(lastname="Pérez", name="Juan", dog_name="Firulais", breed="Caniche")
+        self.session.add(self.client)
+        self.session.commit()
+        self.day = datetime.date(2024, 3, 4)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def create(self, hour):
+        return save_appointment(self.session, self.values(hour))
+
+    def values(self, hour, day=None):
+        return {'date': day or self.day, 'time': datetime.time(hour, 0), 'client_id': self.client.id,
+                'confirmed': False, 'price': 1500.0, 'status': "Baño", 'appoint_comment': ""}
+
+    def test_creates_use_a_single_insert(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        times = [datetime.time(8 + i // 4, i % 4 * 15) for i in range(50)]
+        results, changes = apply_batch(self.session, [('create', None, dict(self.values(8), time=start, duration=15))
+                                                      for start in times])
+        self.assertEqual([result.status for result in results], ['created'] * 50)
+        # Un solo executemany, sin reintentos fila por fila
+        self.assertEqual(statements.count('INSERT'), 1)
+        self.assertEqual(statements.count('SAVEPOINT'), 1)
+        # Cada resultado tiene el id de la fila que se insertó con sus valores
+        for start, result in zip(times, results):
+            self.assertEqual(self.session.get(Appointment, result.appointment_id).time, start)
+        self.assertEqual(len(changes.upserted), 50)
+        self.assertEqual(changes.day_counts, {self.day: 50})
+
+    def test_created_ids_follow_the_batch_order(self):
+        # Filas con distintas columnas: el alta se parte en varios executemany
+        operations = []
+        for i in range(8):
+            values = dict(self.values(8 + i), duration=30, appoint_comment=f"Turno {i}")
+            if i % 3 == 0:
+                del values['appoint_comment']
+            operations.append(('create', None, values))
+        results, _ = apply_batch(self.session, operations)
+        for i, result in enumerate(results):
+            appointment = self.session.get(Appointment, result.appointment_id)
+            self.assertEqual((appointment.time, appointment.appoint_comment),
+                             (datetime.time(8 + i), None if i % 3 == 0 else f"Turno {i}"))
+
+    def test_mixed_operations_in_one_transaction(self):
+        first = self.create(9).upserted[0].id
+        second = self.create(10).upserted[0].id
+        new_day = self.day + datetime.timedelta(days=7)
+        results, changes = apply_batch(self.session, [
+            ('create', None, self.values(11)),
+            ('update', first, {'date': new_day}),
+            ('delete', second, None),
+        ])
+        self.assertEqual([result.status for result in results], ['created', 'updated', 'deleted'])
+        self.assertEqual(changes.deleted, [second])
+        self.assertEqual({snapshot.id for snapshot in changes.upserted}, {results[0].appointment_id, first})
+        self.assertEqual(changes.day_counts, {self.day: 1, new_day: 1})
+        self.assertIsNone(self.session.get(Appointment, second))
+
+    def test_partial_failure_keeps_the_other_operations(self):
+        results, changes = apply_batch(self.session, [
+            ('create', None, self.values(9)),
+            ('create', None, dict(self.values(10), date="no es una fecha")),
+            ('update', 999, {'confirmed': True}),
+            ('delete', 998, None),
+            ('create', None, self.values(11)),
+        ])
+        self.assertEqual([result.status for result in results], ['created', 'error', 'not_found', 'not_found', 'created'])
+        self.assertIsNotNone(results[1].error)
+        self.assertEqual(self.session.query(Appointment).count(), 2)
+        self.assertEqual(changes.day_counts, {self.day: 2})
+
+    def test_conflicts_are_checked_against_the_day_and_the_batch(self):
+        first = self.create(9).upserted[0].id
+        second = self.create(14).upserted[0].id
+        operations = [
+            # El turno de las 9 se mueve: su horario queda libre para el lote
+            ('create', None, dict(self.values(9), time=datetime.time(9, 30))),
+            ('update', first, {'time': datetime.time(11, 0)}),
+            ('create', None, dict(self.values(11), time=datetime.time(11, 30))),
+            ('create', None, self.values(9)),
+            ('delete', second, None),
+            ('create', None, self.values(14)),
+            ('update', first, {'confirmed': True}),
+        ]
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        results, changes = apply_batch(self.session, operations)
+        self.assertEqual([result.status for result in results],
+                         ['created', 'updated', 'conflict', 'conflict', 'deleted', 'created', 'updated'])
+        self.assertIn(f"ID {first}", results[2].error)
+        self.assertIn("otro turno del lote", results[3].error)
+        # Una sola consulta para los horarios de los días afectados (más los
+        # turnos editados, los ids de las altas, las fotos, los recuentos y
+        # las versiones escritas), no una por operación
+        self.assertEqual(statements.count('SELECT'), 6)
+        self.assertEqual(self.session.query(Appointment).count(), 3)
+        self.assertEqual(changes.day_counts, {self.day: 3})
+
+
+class TestOverlaps(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.day = datetime.date(2024, 3, 4)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_groups_chained_overlaps_per_day(self):
+        next_day = self.day + datetime.timedelta(days=1)
+        # Cargados sin pasar por appointment_service (datos anteriores a los controles)
+        rows = [(self.day, 9, 0, 60), (self.day, 9, 30, 60), (self.day, 10, 15, 30), (self.day, 10, 30, 15),
+                (self.day, 12, 0, 60), (self.day, 13, 0, 60), (next_day, 9, 0, 90), (next_day, 9, 0, 30),
+                (next_day + datetime.timedelta(days=1), 9, 0, 60), (next_day + datetime.timedelta(days=1), 9, 0, 60)]
+        with self.engine.begin() as connection:
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': day, 'time': datetime.time(hour, minute), 'duration': duration}
+                for day, hour, minute, duration in rows
+            ])
+        self.assertEqual(find_overlaps(self.session, self.day, next_day), [
+            (self.day, 9 * 60, 10 * 60 + 45, [1, 2, 3, 4]),
+            (next_day, 9 * 60, 10 * 60 + 30, [7, 8]),
+        ])
+        self.assertEqual(find_overlaps(self.session, self.day - datetime.timedelta(days=7), self.day - datetime.timedelta(days=1)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations
+from background_tasks import BackgroundWorker
+from appointment_cache import AppointmentCache
+from appointment_service import set_confirmed, save_appointment
+
+
+class TestChangeDetection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.client = Client(lastname="Pérez", name="Juan")
+        self.session.add(self.client)
+        self.session.flush()
+        self.appointment = Appointment(date=datetime.date(2024, 1, 1), time=datetime.time(9, 0),
+                                       client_id=self.client.id)
+        self.session.add(self.appointment)
+        self.session.commit()
+
+        patches = [patch('background_tasks.Session', self.Session), patch('background_tasks.appointment_cache')]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.worker = BackgroundWorker()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_no_changes_is_a_single_query(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+        self.assertEqual(self.worker.check_database_changes(), (False, set()))
+        self.assertEqual(len(statements), 1)
+
+    def test_confirmation_change_is_detected(self):
+        # Un cambio que no altera la cantidad de turnos del día
+        self.appointment.confirmed = True
+        self.session.commit()
+        self.assertEqual(self.worker.check_database_changes(), (True, {datetime.date(2024, 1, 1)}))
+        self.assertEqual(self.worker.check_database_changes(), (False, set()))
+
+    def test_moved_appointment_reports_both_dates(self):
+        self.appointment.date = datetime.date(2024, 2, 1)
+        self.session.commit()
+        self.assertEqual(self.worker.check_database_changes(),
+                         (True, {datetime.date(2024, 1, 1), datetime.date(2024, 2, 1)}))
+
+    def test_client_change_reports_client_dates(self):
+        self.client.phone = "1234"
+        self.session.commit()
+        self.assertEqual(self.worker.check_database_changes(), (True, {datetime.date(2024, 1, 1)}))
+
+        self.session.add(Client(lastname="Nuevo"))
+        self.session.commit()
+        self.assertEqual(self.worker.check_database_changes(), (False, set()))
+
+    def test_own_writes_are_not_reloaded(self):
+        cache = AppointmentCache(session_factory=self.Session)
+        # Lo que hace el worker con el caché compartido al crearse
+        cache.track_applied_versions()
+        with patch('background_tasks.appointment_cache', cache), patch('appointment_service.appointment_cache', cache):
+            cache.get_month(2024, 1)
+            session = self.Session()
+            set_confirmed(session, self.appointment.id, True)
+            save_appointment(session, {'date': datetime.date(2024, 1, 2)}, self.appointment.id)
+            session.close()
+            self.assertEqual(self.worker.check_database_changes(), (False, set()))
+            # El confirmado se aplicó en el lugar; el mes solo se recarga por la edición
+            cache.get_month(2024, 1)
+            self.assertEqual(cache.misses, 2)
+
+            # Los cambios de otros procesos se siguen detectando
+            self.session.query(Appointment).update({'confirmed': False})
+            self.session.commit()
+            self.assertEqual(self.worker.check_database_changes(), (True, {datetime.date(2024, 1, 2)}))
+
+    def test_recurring_appointments_are_expanded_and_detected(self):
+        self.appointment.date = datetime.date.today()
+        self.appointment.repeat_weekly = True
+        self.session.commit()
+        self.worker.check_database_changes()
+
+        with patch('recurrence.appointment_cache'):
+            self.worker.expand_recurring_appointments()
+        changed, dates = self.worker.check_database_changes()
+        self.assertTrue(changed)
+        self.assertEqual(len(dates), 12)
+        self.assertEqual(self.session.query(Appointment).count(), 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+import sqlite3
+from unittest.mock import patch
+from database import Base, Client, Appointment, run_migrations, create_db_engine
+import backup
+
+
+class TestOnlineBackup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp_dir.name, 'live.db')
+        self.engine = create_db_engine(self.db_file)
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), [{'lastname': f"Apellido{i}", 'name': "Juan"} for i in range(200)])
+            connection.execute(Appointment.__table__.insert(), [
+                {'date': datetime.date(2024, 1, 1), 'time': datetime.time(9, 0), 'client_id': i + 1}
+                for i in range(200)
+            ])
+
+        patches = [patch('backup.db_path', self.db_file), patch('backup.engine', self.engine),
+                   patch('backup.appointment_cache'), patch('backup.breed_catalog'), patch('backup.client_index'),
+                   patch('backup.slot_finder'),
+                   patch.dict(backup.config['backup'], {'pages_per_step': 1, 'step_sleep_ms': 0})]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def count_appointments(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            return connection.execute("SELECT count(*) FROM appointments").fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_backup_copies_in_steps_and_reports_progress(self):
+        target = os.path.join(self.tmp_dir.name, 'copia.db')
+        steps = []
+        self.assertTrue(backup.realizar_backup(target, lambda copied, total: steps.append((copied, total))))
+        self.assertEqual(self.count_appointments(target), 200)
+        self.assertFalse(os.path.exists(f"{target}.tmp"))
+        # Con una página por paso hay varios avisos de progreso y el último es el total
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][0], steps[-1][1])
+
+    def test_backup_includes_uncheckpointed_wal_writes(self):
+        # Con WAL los últimos cambios todavía no están en el archivo principal
+        reader = self.engine.connect()
+        reader.exec_driver_sql("SELECT count(*) FROM appointments").fetchall()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM appointments WHERE id > 150")
+        target = os.path.join(self.tmp_dir.name, 'copia.db')
+        self.assertTrue(backup.realizar_backup(target))
+        reader.close()
+        self.assertEqual(self.count_appointments(target), 150)
+
+    def test_failed_quick_check_keeps_previous_backup(self):
+        target = os.path.join(self.tmp_dir.name, 'copia.db')
+        with open(target, 'w') as previous:
+            previous.write('backup anterior')
+        with patch('backup.quick_check', return_value=False):
+            self.assertFalse(backup.realizar_backup(target))
+        with open(target) as previous:
+            self.assertEqual(previous.read(), 'backup anterior')
+        self.assertFalse(os.path.exists(f"{target}.tmp"))
+
+    def test_restore_rejects_corrupt_file(self):
+        corrupt = os.path.join(self.tmp_dir.name, 'roto.db')
+        with open(corrupt, 'wb') as corrupt_file:
+            corrupt_file.write(b'esto no es una base sqlite' * 100)
+        self.assertFalse(backup.restaurar_backup(corrupt))
+        self.assertEqual(self.count_appointments(self.db_file), 200)
+
+    def test_restore_replaces_live_data_and_invalidates_cache(self):
+        target = os.path.join(self.tmp_dir.name, 'copia.db')
+        self.assertTrue(backup.realizar_backup(target))
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM appointments")
+        self.assertTrue(backup.restaurar_backup(target))
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql("SELECT count(*) FROM appointments").scalar(), 200)
+        backup.appointment_cache.invalidate.assert_called_once_with()
+        for cache in (backup.breed_catalog, backup.client_index, backup.slot_finder):
+            cache.invalidate.assert_called_once_with()
+
+    def test_auto_backup_is_skipped_when_nothing_changed(self):
+        with patch('backup.time.sleep'):
+            backup.create_auto_backup()
+            auto_backup = os.path.join(self.tmp_dir.name, 'auto_backup.db')
+            first_mtime = os.path.getmtime(auto_backup)
+            with patch('backup.realizar_backup') as realizar:
+                backup.create_auto_backup()
+                realizar.assert_not_called()
+                with self.engine.begin() as connection:
+                    connection.exec_driver_sql("UPDATE appointments SET confirmed = 1 WHERE id = 1")
+                backup.create_auto_backup()
+                realizar.assert_called_once_with(auto_backup)
+        self.assertEqual(os.path.getmtime(auto_backup), first_mtime)
+
+    def test_auto_backup_sees_breeds_and_migrations(self):
+        # Ni las razas ni PRAGMA user_version pasan por change_log
+        with patch('backup.time.sleep'):
+            backup.create_auto_backup()
+        auto_backup = os.path.join(self.tmp_dir.name, 'auto_backup.db')
+        changes = ["INSERT INTO breeds (name, normalized_name) VALUES ('Bóxer', 'boxer')",
+                   "UPDATE breeds SET name = 'Boxer' WHERE name = 'Bóxer'",
+                   "PRAGMA user_version = 99"]
+        for statement in changes:
+            with patch('backup.realizar_backup', wraps=backup.realizar_backup) as realizar, patch('backup.time.sleep'):
+                with self.engine.begin() as connection:
+                    connection.exec_driver_sql(statement)
+                backup.create_auto_backup()
+                realizar.assert_called_once_with(auto_backup)
+
+
+if __name__ == '__main__':
+    unittest.main()
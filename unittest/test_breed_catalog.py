@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Breed, run_migrations
+from breed_catalog import BreedCatalog
+
+
+class TestBreedCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add_all([Breed(name="Salchicha"), Breed(name="Bóxer"), Breed(name="Chihuahua")])
+        session.commit()
+        session.close()
+        self.catalog = BreedCatalog(self.Session)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_names_are_loaded_once(self):
+        self.assertEqual(self.catalog.names(), ("Bóxer", "Chihuahua", "Salchicha"))
+        self.assertEqual(len(self.statements), 1)
+        self.catalog.names()
+        self.assertEqual(self.catalog.find("BOXER"), "Bóxer")
+        self.assertIsNone(self.catalog.find("Caniche"))
+        self.assertEqual(len(self.statements), 1)
+
+    def test_add_ignores_accents_and_case(self):
+        self.catalog.names()
+        version = self.catalog.version
+        self.assertEqual(self.catalog.add("Boxer"), ("Bóxer", False))
+        self.assertEqual(self.catalog.version, version)
+
+        self.assertEqual(self.catalog.add("Caniche"), ("Caniche", True))
+        self.assertGreater(self.catalog.version, version)
+        self.assertEqual(self.catalog.names(), ("Bóxer", "Caniche", "Chihuahua", "Salchicha"))
+        session = self.Session()
+        self.assertEqual(session.query(Breed).filter_by(normalized_name="caniche").one().name, "Caniche")
+        session.close()
+
+    def test_add_sees_breeds_from_other_processes(self):
+        self.catalog.names()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO breeds (name, normalized_name) VALUES ('Galgo', 'galgo')")
+        self.assertEqual(self.catalog.add("galgo"), ("Galgo", False))
+        self.assertIn("Galgo", self.catalog.names())
+
+    def test_invalidate_reloads(self):
+        self.catalog.names()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO breeds (name, normalized_name) VALUES ('Pug', 'pug')")
+        self.assertNotIn("Pug", self.catalog.names())
+        self.catalog.invalidate()
+        self.assertIn("Pug", self.catalog.names())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import json
+from sqlalchemy import create_engine, event
+from database import Base, Client, run_migrations
+from change_feed import ChangeFeed, Reset
+
+
+class TestChangeFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.add_client("Pérez")
+        # Sin notify() el hilo no consulta la base: cada prueba llama a poll()
+        self.feed = ChangeFeed(self.engine, poll_interval=3600)
+
+    def tearDown(self):
+        self.feed.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def add_client(self, lastname):
+        with self.engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), {'lastname': lastname})
+
+    def test_one_read_is_shared_by_all_subscribers(self):
+        subscriptions = [self.feed.subscribe() for _ in range(50)]
+        self.assertEqual({subscription.version for subscription in subscriptions}, {1})
+
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        self.add_client("Gómez")
+        self.add_client("López")
+        statements.clear()
+        self.feed.poll()
+
+        # Versión de datos + filas nuevas, sin importar la cantidad de suscriptores
+        self.assertEqual(len(statements), 2)
+        received = [subscription.get(timeout=1) for subscription in subscriptions]
+        self.assertTrue(all(changes is received[0] for changes in received))
+        self.assertEqual([change.version for change in received[0]], [2, 3])
+        change = json.loads(received[0][0].data)
+        self.assertIsNotNone(change.pop('changed_at'))
+        self.assertEqual(change, {'version': 2, 'table': 'clients', 'id': 2, 'op': 'insert', 'date': None})
+
+    def test_no_query_when_nothing_changed(self):
+        subscription = self.feed.subscribe()
+        self.feed.poll()
+        self.assertEqual(subscription.get(timeout=0.01), [])
+
+    def test_version_going_back_sends_reset(self):
+        self.add_client("Gómez")
+        subscription = self.feed.subscribe()
+        # Como al restaurar un backup anterior al último cambio
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM change_log WHERE version = 2")
+            connection.exec_driver_sql("UPDATE sqlite_sequence SET seq = 1 WHERE name = 'change_log'")
+        self.feed.poll()
+        self.assertEqual(subscription.get(timeout=1), Reset(1))
+
+    def test_slow_subscriber_is_dropped(self):
+        slow = ChangeFeed(self.engine, poll_interval=3600, max_pending=1)
+        self.addCleanup(slow.close)
+        subscription = slow.subscribe()
+        for lastname in ("Gómez", "López"):
+            self.add_client(lastname)
+            slow.poll()
+        self.assertIsNone(subscription.get(timeout=0.01))
+        self.assertEqual(slow.subscribers, set())
+
+    def test_subscriber_limit(self):
+        limited = ChangeFeed(self.engine, poll_interval=3600, max_subscribers=2)
+        self.addCleanup(limited.close)
+        self.assertIsNotNone(limited.subscribe())
+        self.assertIsNotNone(limited.subscribe())
+        self.assertIsNone(limited.subscribe())
+
+    def test_read_detects_pruned_log(self):
+        for lastname in ("Gómez", "López", "Díaz"):
+            self.add_client(lastname)
+        self.assertEqual([change.version for change in self.feed.read(2)], [3, 4])
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM change_log WHERE version <= 2")
+        self.assertEqual(self.feed.read(1), Reset(4))
+        self.assertEqual([change.version for change in self.feed.read(2)], [3, 4])
+        self.assertEqual(self.feed.read(9), Reset(4))
+        # Con el registro vacío la versión no baja: solo está al día quien ya la tiene
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM change_log")
+        self.assertEqual(self.feed.read(3), Reset(4))
+        self.assertEqual(self.feed.read(4), [])
+
+    def test_close_ends_subscriptions(self):
+        subscription = self.feed.subscribe()
+        self.feed.close()
+        self.assertIsNone(subscription.get(timeout=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, run_migrations
+from client_index import ClientIndex
+from search_index import normalize_text
+
+
+class TestClientIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.session.add_all([
+            Client(lastname="Pérez", name="Juan", dog_name="Firulais", phone="11 4567-8901", comments="Muerde"),
+            Client(lastname="Pereyra", name="Ana", dog_name="Luna", phone="221 555"),
+            Client(lastname="Gómez", name="Juana", dog_name="Peluche"),
+            Client(lastname="Núñez", name="José María", dog_name="Toby"),
+        ])
+        self.session.commit()
+        self.index = ClientIndex(self.Session)
+        self.index.sync()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def search(self, text, limit=50):
+        return [client.label for client in self.index.search(text, limit)]
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("Pérez NÚÑEZ"), "perez nunez")
+        self.assertEqual(normalize_text(None), "")
+
+    def test_prefix_search_ignores_accents_and_case(self):
+        self.assertEqual(self.search("pere"), ["Pereyra Ana", "Pérez Juan"])
+        self.assertEqual(self.search("NUÑ"), ["Núñez José María"])
+        self.assertEqual(self.search("pel"), ["Gómez Juana"])
+        self.assertEqual(self.search("1145"), ["Pérez Juan"])
+        self.assertEqual(self.search("erez"), [])
+        self.assertEqual(self.search("  "), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("juan"), ["Pérez Juan", "Gómez Juana"])
+        self.assertEqual(self.search("juan gom"), ["Gómez Juana"])
+        self.assertEqual(self.search("maria jose nu"), ["Núñez José María"])
+        self.assertEqual(self.search("pe lu"), ["Pereyra Ana"])
+        self.assertEqual(self.search("pe", limit=2), ["Gómez Juana", "Pereyra Ana"])
+
+    def test_entries_carry_comments(self):
+        client = self.index.search("firu")[0]
+        self.assertEqual(self.index.get(client.id).comments, "Muerde")
+        self.assertIsNone(self.index.get(999))
+
+    def test_sync_applies_only_client_changes(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        self.assertEqual(self.index.sync(), 0)
+        self.assertEqual(len(statements), 1)
+
+        juan = self.session.query(Client).filter_by(name="Juan").one()
+        juan.lastname = "Álvarez"
+        self.session.add(Client(lastname="Perales", name="Luis"))
+        self.session.delete(self.session.query(Client).filter_by(name="Ana").one())
+        self.session.commit()
+        statements.clear()
+        self.assertEqual(self.index.sync(), 3)
+        self.assertEqual(self.search("pe"), ["Gómez Juana", "Perales Luis"])
+        self.assertEqual(self.search("alv"), ["Álvarez Juan"])
+        self.assertEqual(len(self.index), 4)
+        # Versión, control de que el registro alcance, filas de change_log y los clientes cambiados
+        self.assertEqual(len(statements), 4)
+
+    def test_pruned_log_reloads_everything(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE clients SET name = 'Juanita' WHERE name = 'Juana'")
+            connection.exec_driver_sql("UPDATE clients SET name = 'Anita' WHERE name = 'Ana'")
+            connection.exec_driver_sql("DELETE FROM change_log WHERE version < (SELECT max(version) FROM change_log)")
+        self.assertEqual(self.index.sync(), 4)
+        self.assertEqual(self.search("ani"), ["Pereyra Anita"])
+        self.assertEqual(self.search("juanit"), ["Gómez Juanita"])
+
+
+if __name__ == '__main__':
+    unittest.main()
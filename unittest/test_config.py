@@ -0,0 +1,51 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import unittest
+import tempfile
+from config import load_config, DEFAULT_CONFIG
+from database import create_db_engine
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'turnocan_config.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_missing_file_uses_defaults(self):
+        self.assertEqual(load_config(self.path), DEFAULT_CONFIG)
+
+    def test_partial_file_is_merged_with_defaults(self):
+        with open(self.path, 'w', encoding='utf-8') as config_file:
+            json.dump({'database': {'busy_timeout_ms': 100}}, config_file)
+        config = load_config(self.path)
+        self.assertEqual(config['database']['busy_timeout_ms'], 100)
+        self.assertEqual(config['database']['journal_mode'], 'WAL')
+
+    def test_invalid_file_uses_defaults(self):
+        with open(self.path, 'w', encoding='utf-8') as config_file:
+            config_file.write("{no es json")
+        self.assertEqual(load_config(self.path), DEFAULT_CONFIG)
+
+    def test_engine_applies_pragmas(self):
+        settings = dict(DEFAULT_CONFIG['database'], busy_timeout_ms=1234, cache_size_kb=4000)
+        engine = create_db_engine(os.path.join(self.tmp_dir.name, 'test.db'), settings)
+        try:
+            with engine.connect() as connection:
+                pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                self.assertEqual(pragma('journal_mode'), 'wal')
+                self.assertEqual(pragma('synchronous'), 1)  # NORMAL
+                self.assertEqual(pragma('busy_timeout'), 1234)
+                self.assertEqual(pragma('cache_size'), -4000)
+        finally:
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    unittest.main()
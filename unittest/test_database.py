@@ -0,0 +1,322 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from unittest.mock import patch
+from sqlalchemy import create_engine, inspect, event
+from sqlalchemy.orm import sessionmaker
+from database import (Base, Appointment, run_migrations, get_schema_version, SCHEMA_VERSION,
+                      month_range, date_range_filter, appointment_years, verify_database_integrity,
+                      Client, ChangeLog, get_data_version, get_last_change, prune_change_log)
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def index_names(self):
+        return {index['name'] for index in inspect(self.engine).get_indexes('appointments')}
+
+    def test_new_database_has_indexes(self):
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.assertIn('ix_appointments_date_time', self.index_names())
+        self.assertIn('ix_appointments_client_id_date', self.index_names())
+
+    def test_existing_database_gets_indexes(self):
+        # Simulamos una base de datos anterior a los índices
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            for index in Appointment.__table__.indexes:
+                index.drop(connection)
+        self.assertEqual(self.index_names(), set())
+
+        self.assertEqual(run_migrations(self.engine), SCHEMA_VERSION)
+        self.assertIn('ix_appointments_date_time', self.index_names())
+        self.assertIn('ix_appointments_client_id_date', self.index_names())
+
+    def test_migrations_are_idempotent(self):
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        run_migrations(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(get_schema_version(connection), SCHEMA_VERSION)
+
+    def test_existing_appointments_get_durations(self):
+        # Tabla de turnos anterior a la migración 4 (sin duración ni intervalo)
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE appointments (id INTEGER PRIMARY KEY, date DATE, time TIME, repeat_weekly BOOLEAN, "
+                "repeat_monthly BOOLEAN, confirmed BOOLEAN, status VARCHAR, appoint_comment VARCHAR, price FLOAT, "
+                "client_id INTEGER, created_at DATETIME)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO appointments (date, time, status) VALUES "
+                "('2024-01-08', '09:00:00.000000', 'Baño y corte'), ('2024-01-08', '11:30:00.000000', 'Corte'), "
+                "('2024-01-08', '13:00:00.000000', NULL)"
+            )
+        Base.metadata.create_all(self.engine)
+        self.assertEqual(run_migrations(self.engine), SCHEMA_VERSION)
+        self.assertIn('ix_appointments_date_start', self.index_names())
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql(
+                "SELECT duration, start_minute, end_minute FROM appointments ORDER BY id"
+            ).fetchall()
+            # El relleno de duraciones no se registra como cambios de turnos
+            logged = connection.exec_driver_sql("SELECT count(*) FROM change_log").scalar()
+        self.assertEqual([tuple(row) for row in rows], [(90, 540, 630), (60, 690, 750), (60, 780, 840)])
+        self.assertEqual(logged, 0)
+
+    def test_existing_breeds_get_normalized_names(self):
+        # Tabla de razas anterior a la migración 5
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("CREATE TABLE breeds (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE)")
+            connection.exec_driver_sql("INSERT INTO breeds (name) VALUES ('Bóxer'), ('Gran Danés')")
+        Base.metadata.create_all(self.engine)
+        self.assertEqual(run_migrations(self.engine), SCHEMA_VERSION)
+        indexes = {index['name'] for index in inspect(self.engine).get_indexes('breeds')}
+        self.assertIn('ix_breeds_normalized_name', indexes)
+        with self.engine.connect() as connection:
+            rows = connection.exec_driver_sql("SELECT normalized_name FROM breeds ORDER BY id").fetchall()
+            plan = " ".join(row[-1] for row in connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT name FROM breeds WHERE normalized_name = 'boxer'"
+            ))
+        self.assertEqual([row[0] for row in rows], ['boxer', 'gran danes'])
+        self.assertIn('ix_breeds_normalized_name', plan)
+
+    def test_existing_recurring_appointments_get_series(self):
+        # Turnos repetidos anteriores a la migración 7: una serie por (cliente, horario)
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE appointments (id INTEGER PRIMARY KEY, date DATE, time TIME, repeat_weekly BOOLEAN, "
+                "repeat_monthly BOOLEAN, confirmed BOOLEAN, status VARCHAR, appoint_comment VARCHAR, price FLOAT, "
+                "client_id INTEGER, created_at DATETIME)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO appointments (date, time, client_id, repeat_weekly) VALUES "
+                "('2024-01-01', '10:00:00.000000', 1, 1), ('2024-01-08', '10:00:00.000000', 1, 1), "
+                "('2024-01-15', '10:00:00.000000', 1, 0), ('2024-01-08', '11:00:00.000000', 2, 1), "
+                "('2024-01-08', '12:00:00.000000', 2, 0)"
+            )
+        Base.metadata.create_all(self.engine)
+        self.assertEqual(run_migrations(self.engine), SCHEMA_VERSION)
+        self.assertIn('ix_appointments_series_date', self.index_names())
+        with self.engine.connect() as connection:
+            series = connection.exec_driver_sql(
+                "SELECT id, origin_id, client_id, anchor FROM appointment_series ORDER BY id"
+            ).fetchall()
+            linked = connection.exec_driver_sql("SELECT series_id FROM appointments ORDER BY id").fetchall()
+            logged = connection.exec_driver_sql("SELECT count(*) FROM change_log").scalar()
+        self.assertEqual([tuple(row) for row in series], [(1, 1, 1, '2024-01-01'), (2, 4, 2, '2024-01-08')])
+        # El turno no marcado del 15/1 queda en la serie (la termina); el de las 12:00 no es de ninguna
+        self.assertEqual([row[0] for row in linked], [1, 1, 1, 2, None])
+        self.assertEqual(logged, 0)
+
+    def test_integrity_check_ignores_search_index_tables(self):
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        with patch('database.engine', self.engine):
+            self.assertTrue(verify_database_integrity())
+
+
+class TestDateRangeFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        for date in [datetime.date(2023, 2, 28), datetime.date(2024, 2, 1), datetime.date(2024, 2, 29),
+                     datetime.date(2024, 3, 1), datetime.date(2024, 3, 15), datetime.date(2025, 3, 15)]:
+            self.session.add(Appointment(date=date, time=datetime.time(9, 0)))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def dates(self, **kwargs):
+        query = self.session.query(Appointment.date).filter(date_range_filter(**kwargs))
+        return sorted(date for (date,) in query.all())
+
+    def test_month_range(self):
+        self.assertEqual(month_range(2024, 2), (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)))
+        self.assertEqual(month_range(2023, 12), (datetime.date(2023, 12, 1), datetime.date(2023, 12, 31)))
+
+    def test_month_filter(self):
+        self.assertEqual(self.dates(year=2024, month=2), [datetime.date(2024, 2, 1), datetime.date(2024, 2, 29)])
+
+    def test_day_and_year_filters(self):
+        self.assertEqual(self.dates(year=2024, month=3, day=15), [datetime.date(2024, 3, 15)])
+        self.assertEqual(len(self.dates(year=2024)), 4)
+
+    def test_filters_without_year(self):
+        years = appointment_years(self.session)
+        self.assertEqual(years, [2023, 2024, 2025])
+        self.assertEqual(self.dates(day=15, years=years), [datetime.date(2024, 3, 15), datetime.date(2025, 3, 15)])
+        self.assertEqual(self.dates(day=29, month=2, years=years), [datetime.date(2024, 2, 29)])
+        self.assertEqual(len(self.dates(month=3, years=years)), 3)
+
+    def test_invalid_values_match_nothing(self):
+        self.assertEqual(self.dates(year=2024, month=13), [])
+        self.assertEqual(self.dates(year=2024, day=40), [])
+        # Búsquedas como "1/1/0" o con un año de 5 cifras
+        self.assertEqual(self.dates(year=0, month=1, day=1), [])
+        self.assertEqual(self.dates(year=20245, month=3), [])
+        self.assertEqual(self.dates(year=0), [])
+
+    def test_month_query_uses_index(self):
+        first, last = month_range(2024, 2)
+        with self.engine.connect() as connection:
+            plan = connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT DISTINCT date FROM appointments WHERE date BETWEEN ? AND ?",
+                (first.isoformat(), last.isoformat())
+            ).fetchall()
+        # Cualquiera de los dos índices que empiezan por la fecha sirve para el rango
+        self.assertRegex(' '.join(row[-1] for row in plan),
+                         r'SEARCH appointments USING (COVERING )?INDEX ix_appointments_date_(time|start)')
+
+    def test_conflict_lookup_is_an_index_seek(self):
+        # La consulta de appointment_service.find_conflict: sin recorrer ni ordenar el día
+        with self.engine.connect() as connection:
+            plan = ' '.join(row[-1] for row in connection.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id, start_minute, end_minute FROM appointments "
+                "WHERE date = ? AND start_minute < ? ORDER BY start_minute DESC LIMIT 1",
+                ('2024-02-01', 600)
+            ))
+        self.assertIn('ix_appointments_date_start', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class TestChangeLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def log(self):
+        rows = self.session.query(ChangeLog.table_name, ChangeLog.op, ChangeLog.date).order_by(ChangeLog.version)
+        return [tuple(row) for row in rows]
+
+    def test_triggers_record_changes_with_dates(self):
+        self.assertEqual(get_data_version(self.session.connection()), 0)
+        client = Client(lastname="Pérez")
+        self.session.add(client)
+        self.session.flush()
+        appointment = Appointment(date=datetime.date(2024, 1, 1), time=datetime.time(9, 0), client_id=client.id)
+        self.session.add(appointment)
+        self.session.commit()
+
+        appointment.confirmed = True
+        self.session.commit()
+        appointment.date = datetime.date(2024, 1, 2)
+        self.session.commit()
+        self.session.delete(appointment)
+        self.session.commit()
+
+        self.assertEqual(self.log(), [
+            ('clients', 'I', None),
+            ('appointments', 'I', datetime.date(2024, 1, 1)),
+            ('appointments', 'U', datetime.date(2024, 1, 1)),
+            ('appointments', 'U', datetime.date(2024, 1, 2)),
+            ('appointments', 'U', datetime.date(2024, 1, 1)),
+            ('appointments', 'D', datetime.date(2024, 1, 2)),
+        ])
+        self.assertEqual(get_data_version(self.session.connection()), 6)
+
+    def test_version_does_not_go_back_when_the_log_is_pruned(self):
+        self.session.add(Client(lastname="Pérez"))
+        self.session.commit()
+        self.session.close()
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("UPDATE change_log SET changed_at = datetime('now', '-31 days')")
+        prune_change_log(self.engine)
+        self.assertEqual(self.session.query(ChangeLog).count(), 0)
+        self.assertEqual(get_data_version(self.session.connection()), 1)
+        self.assertEqual(get_last_change(self.session.connection()), (1, None))
+        self.session.add(Client(lastname="Gómez"))
+        self.session.commit()
+        self.assertEqual(get_data_version(self.session.connection()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestIntegrityCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.pragmas = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: self.pragmas.append(statement)
+                     if 'check' in statement else None)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_first_check_is_full_and_does_not_read_tables(self):
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.assertEqual(self.pragmas, ['PRAGMA integrity_check'])
+        self.assertFalse([s for s in statements if s.startswith('SELECT') and 'FROM appointments' in s])
+
+    def test_unchanged_database_is_skipped(self):
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.pragmas.clear()
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.assertEqual(self.pragmas, [])
+
+    def test_changed_database_gets_quick_check(self):
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        with self.engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), {'lastname': "Pérez", 'name': "Juan"})
+        self.pragmas.clear()
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.assertEqual(self.pragmas, ['PRAGMA quick_check'])
+
+    def test_full_check_is_scheduled(self):
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        with self.engine.begin() as connection:
+            connection.execute(Client.__table__.insert(), {'lastname': "Pérez", 'name': "Juan"})
+        self.pragmas.clear()
+        later = datetime.datetime.now() + datetime.timedelta(days=8)
+        with patch('database.local_now', return_value=later):
+            self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.assertEqual(self.pragmas, ['PRAGMA integrity_check'])
+
+    def test_explicit_modes_always_run(self):
+        self.assertTrue(verify_database_integrity(bind=self.engine))
+        self.pragmas.clear()
+        self.assertTrue(verify_database_integrity('quick', bind=self.engine))
+        self.assertTrue(verify_database_integrity('full', bind=self.engine))
+        self.assertEqual(self.pragmas, ['PRAGMA quick_check', 'PRAGMA integrity_check'])
+
+    def test_missing_table_fails(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE breeds")
+        self.assertFalse(verify_database_integrity(bind=self.engine))
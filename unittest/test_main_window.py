@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+from unittest.mock import patch, MagicMock
+from PyQt5.QtWidgets import QApplication, QWidget
+from PyQt5.QtTest import QTest
+
+app = QApplication(sys.argv)
+
+import main_window
+from main_window import MainWindow
+
+
+def fake_section(name):
+    """Sección de prueba que registra cuándo se crea y cuándo se refresca"""
+    class FakeSection(QWidget):
+        created = []
+
+        def __init__(self):
+            super().__init__()
+            FakeSection.created.append(name)
+            self.search_clients = MagicMock()
+            self.search_appointments = MagicMock()
+    FakeSection.__name__ = name
+    return FakeSection
+
+
+class TestLazySections(unittest.TestCase):
+
+    def setUp(self):
+        self.classes = {name: fake_section(name) for name in
+                        ('CreateClientWidget', 'ClientListWidget', 'AppointmentCalendarWidget',
+                         'AppointmentSearchWidget', 'BackupWidget')}
+        for name, fake in self.classes.items():
+            patcher = patch.object(main_window, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.window = MainWindow()
+
+    def tearDown(self):
+        self.window.close()
+
+    def created(self):
+        return [name for name, fake in self.classes.items() if fake.created]
+
+    def test_only_calendar_is_built_up_front(self):
+        self.assertEqual(self.created(), ['AppointmentCalendarWidget'])
+        self.assertIs(self.window.stacked_widget.currentWidget(), self.window.appointment_calendar_widget)
+        self.assertIs(self.window.active_button, self.window.appointments_btn)
+        self.assertIsNone(self.window.appointment_search_widget)
+
+    def test_section_is_built_on_first_activation(self):
+        self.window.appointment_search_btn.click()
+        self.assertIsNotNone(self.window.appointment_search_widget)
+        self.assertIs(self.window.stacked_widget.currentWidget(), self.window.appointment_search_widget)
+        # Recién creada ya tiene sus datos: no se busca de nuevo
+        self.window.appointment_search_widget.search_appointments.assert_not_called()
+
+        self.window.appointments_btn.click()
+        self.window.appointment_search_btn.click()
+        self.window.appointment_search_widget.search_appointments.assert_called_once_with()
+        self.assertEqual(self.classes['AppointmentSearchWidget'].created, ['AppointmentSearchWidget'])
+
+    def test_remaining_sections_are_built_after_first_paint(self):
+        self.window.show()
+        QTest.qWaitForWindowExposed(self.window)
+        for _ in range(20):
+            QTest.qWait(10)
+        self.assertIsNotNone(self.window.first_paint_ms)
+        self.assertEqual(sorted(self.created()), sorted(self.classes))
+        self.assertIs(self.window.stacked_widget.currentWidget(), self.window.appointment_calendar_widget)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations, sort_key
+import datetime
+from pagination import KeysetPaginator, FIRST, NEXT, PREVIOUS, CURRENT
+
+
+class TestKeysetPaginator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        # Apellidos repetidos y nulos para probar el desempate por id
+        for i in range(50):
+            self.session.add(Client(lastname=None if i % 10 == 0 else f"Apellido{i % 7}", name=f"Nombre{i}"))
+        self.session.commit()
+        self.sort_keys = [sort_key(Client.lastname)]
+        self.paginator = KeysetPaginator(page_size=7)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def fetch(self, move, descending=False):
+        clients = self.paginator.fetch(self.session.query(Client), self.sort_keys, Client.id, descending, move)
+        return [client.id for client in clients]
+
+    def expected_order(self, descending=False):
+        clients = self.session.query(Client).all()
+        ordered = sorted(clients, key=lambda client: (client.lastname or '', client.id), reverse=descending)
+        return [client.id for client in ordered]
+
+    def walk_forward(self, descending=False):
+        pages = [self.fetch(FIRST, descending)]
+        while self.paginator.has_next:
+            pages.append(self.fetch(NEXT, descending))
+        return pages
+
+    def test_pages_cover_all_rows_in_order(self):
+        pages = self.walk_forward()
+        self.assertEqual(len(pages), 8)
+        self.assertEqual(self.paginator.page, 8)
+        self.assertEqual([client_id for page in pages for client_id in page], self.expected_order())
+
+    def test_descending_order(self):
+        pages = self.walk_forward(descending=True)
+        self.assertEqual([client_id for page in pages for client_id in page], self.expected_order(descending=True))
+
+    def test_previous_page_uses_remembered_start(self):
+        pages = self.walk_forward()
+        for page_number in range(len(pages) - 1, 0, -1):
+            self.assertEqual(self.fetch(PREVIOUS), pages[page_number - 1])
+            self.assertEqual(self.paginator.page, page_number)
+        self.assertEqual(self.fetch(CURRENT), pages[0])
+
+    def test_total_is_cached_until_the_data_changes(self):
+        counts = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: counts.append(statement) if 'count(*)' in statement else None)
+        query = self.session.query(Client)
+        self.assertEqual(self.paginator.total(query, "busqueda"), 50)
+        self.assertEqual(self.paginator.total(query, "busqueda"), 50)
+        self.assertEqual(len(counts), 1)
+        # Un alta cambia la versión de los datos: se cuenta de nuevo con el mismo filtro
+        self.session.add(Client(lastname="Nuevo"))
+        self.session.commit()
+        self.assertEqual(self.paginator.total(query, "busqueda"), 51)
+        self.assertEqual(self.paginator.total(query, "otra"), 51)
+        self.assertEqual(len(counts), 3)
+        self.paginator.invalidate_count()
+        self.assertEqual(self.paginator.total(query, "otra"), 51)
+        self.assertEqual(len(counts), 4)
+        self.assertEqual(self.paginator.total_pages(51), 8)
+
+    def test_sort_key_uses_the_expression_index(self):
+        self.fetch(FIRST)
+        start_key = self.paginator.last_key
+        plan = self.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM clients "
+            "WHERE (coalesce(lastname, ''), id) > (?, ?) AND coalesce(lastname, '') >= ? "
+            "ORDER BY coalesce(lastname, ''), id LIMIT 8",
+            (*start_key, start_key[0])
+        ).fetchall()
+        detail = ' '.join(row[-1] for row in plan)
+        self.assertIn('SEARCH clients USING INDEX ix_clients_lastname_sort', detail)
+        self.assertNotIn('TEMP B-TREE', detail)
+
+    def test_appointments_without_time_are_paged_once(self):
+        # Orden por fecha de la búsqueda de turnos: la hora puede ser NULL
+        for i in range(20):
+            self.session.add(Appointment(date=datetime.date(2024, 1, 1 + i % 3),
+                                         time=None if i % 4 == 0 else datetime.time(9 + i % 5, 0)))
+        self.session.commit()
+        sort_keys = [sort_key(Appointment.date), sort_key(Appointment.time)]
+        pages = [self.paginator.fetch(self.session.query(Appointment), sort_keys, Appointment.id, False, FIRST)]
+        while self.paginator.has_next:
+            pages.append(self.paginator.fetch(self.session.query(Appointment), sort_keys, Appointment.id, False, NEXT))
+        ids = [appointment.id for page in pages for appointment in page]
+        expected = sorted(self.session.query(Appointment).all(),
+                          key=lambda appointment: (appointment.date, appointment.time or datetime.time.min, appointment.id))
+        self.assertEqual(ids, [appointment.id for appointment in expected])
+
+        plan = self.session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT id FROM appointments "
+            "WHERE (coalesce(date, ''), coalesce(time, ''), id) > ('2024-01-01', '', 0) "
+            "AND coalesce(date, '') >= '2024-01-01' "
+            "ORDER BY coalesce(date, ''), coalesce(time, ''), id LIMIT 8"
+        ).fetchall()
+        detail = ' '.join(row[-1] for row in plan)
+        self.assertIn('ix_appointments_date_time_sort', detail)
+        self.assertNotIn('TEMP B-TREE', detail)
+
+
+if __name__ == '__main__':
+    unittest.main()
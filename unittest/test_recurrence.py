@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations
+from recurrence import expand_recurring, horizon_date
+
+
+class TestExpandRecurring(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        self.session.add_all([Client(lastname="Pérez"), Client(lastname="Gómez")])
+        self.session.commit()
+        self.today = datetime.date(2024, 1, 10)
+        cache_patcher = patch('recurrence.appointment_cache')
+        self.cache = cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def add(self, day, client_id=1, hour=9, weekly=False, monthly=False):
+        self.session.add(Appointment(date=day, time=datetime.time(hour, 0), client_id=client_id,
+                                     status="Baño", price=1500.0, repeat_weekly=weekly, repeat_monthly=monthly))
+        self.session.commit()
+
+    def dates(self, client_id=1, hour=9):
+        return [day for (day,) in self.session.query(Appointment.date).filter(
+            Appointment.client_id == client_id, Appointment.time == datetime.time(hour, 0)
+        ).order_by(Appointment.date)]
+
+    def expand(self, weeks=4, today=None):
+        today = today or self.today
+        return expand_recurring(self.session, horizon_date(today, weeks), today)
+
+    def test_weekly_series_up_to_horizon(self):
+        self.add(datetime.date(2024, 1, 8), weekly=True)
+        result = self.expand(weeks=4)
+        self.assertEqual(self.dates(), [datetime.date(2024, 1, 8) + datetime.timedelta(weeks=n) for n in range(5)])
+        self.assertEqual(result.created, 4)
+        self.cache.invalidate.assert_called_once_with(result.dates)
+
+        copy = self.session.query(Appointment).order_by(Appointment.date.desc()).first()
+        self.assertEqual((copy.status, copy.price, copy.confirmed, copy.repeat_weekly), ("Baño", 1500.0, False, True))
+
+    def test_monthly_series_keeps_day_of_month(self):
+        self.add(datetime.date(2023, 12, 31), monthly=True)
+        self.expand(weeks=21)
+        self.assertEqual(self.dates(), [datetime.date(2023, 12, 31), datetime.date(2024, 1, 31), datetime.date(2024, 2, 29),
+                                        datetime.date(2024, 3, 31), datetime.date(2024, 4, 30), datetime.date(2024, 5, 31)])
+
+    def test_is_incremental_and_skips_existing(self):
+        self.add(datetime.date(2024, 1, 8), weekly=True)
+        # Turno ya cargado a mano en una de las fechas de la serie
+        self.add(datetime.date(2024, 1, 15))
+        self.assertEqual(self.expand(weeks=1).created, 0)
+
+        self.add(datetime.date(2024, 1, 15), client_id=2, hour=10, weekly=True)
+        self.session.query(Appointment).filter(Appointment.client_id == 1).update({'repeat_weekly': True})
+        self.session.commit()
+        self.assertEqual(self.expand(weeks=2).created, 2)
+        self.assertEqual(self.expand(weeks=2).created, 0)
+        self.assertEqual(self.expand(weeks=3).created, 2)
+        self.assertEqual(self.dates(client_id=2, hour=10)[-1], datetime.date(2024, 1, 29))
+
+    def test_copies_duration_and_skips_overlapping_dates(self):
+        self.session.add(Appointment(date=datetime.date(2024, 1, 8), time=datetime.time(9, 0), client_id=1,
+                                     status="Baño y corte", duration=90, repeat_weekly=True))
+        self.session.commit()
+        # Otro cliente a las 10:00 del 22/1: el turno de 9:00 a 10:30 no entra ese día
+        self.add(datetime.date(2024, 1, 22), client_id=2, hour=10)
+        self.assertEqual(self.expand(weeks=3).created, 2)
+        self.assertEqual(self.dates(), [datetime.date(2024, 1, 8), datetime.date(2024, 1, 15), datetime.date(2024, 1, 29)])
+        self.assertEqual({duration for (duration,) in self.session.query(Appointment.duration)
+                          .filter(Appointment.client_id == 1)}, {90})
+
+    def test_occurrences_of_the_same_pass_do_not_overlap(self):
+        self.session.add(Appointment(date=datetime.date(2024, 1, 8), time=datetime.time(9, 0), client_id=1,
+                                     status="Baño y corte", duration=90, repeat_weekly=True))
+        self.session.commit()
+        # De 10:00 a 11:00 choca con el de 9:00 a 10:30 en todas las fechas nuevas
+        self.add(datetime.date(2024, 1, 1), client_id=2, hour=10, weekly=True)
+        self.assertEqual(self.expand(weeks=2).created, 2)
+        self.assertEqual(self.dates(), [datetime.date(2024, 1, 8), datetime.date(2024, 1, 15),
+                                        datetime.date(2024, 1, 22)])
+        self.assertEqual(self.dates(client_id=2, hour=10), [datetime.date(2024, 1, 1)])
+
+    def test_series_ends_when_last_appointment_is_not_marked(self):
+        self.add(datetime.date(2024, 1, 8), weekly=True)
+        self.assertEqual(self.expand(weeks=1).created, 1)
+        self.session.query(Appointment).filter(Appointment.date == datetime.date(2024, 1, 15)).update(
+            {'repeat_weekly': False})
+        self.session.commit()
+        self.assertEqual(self.expand().created, 0)
+
+    def test_moved_occurrence_is_not_recreated(self):
+        self.add(datetime.date(2024, 1, 8), hour=10, weekly=True)
+        self.assertEqual(self.expand(weeks=4).created, 4)
+        # La última repetición pasa a las 11:00: no vuelve a aparecer a las 10:00
+        # y la serie sigue a las 10:00, no desde el turno movido
+        moved = self.session.query(Appointment).filter(Appointment.date == datetime.date(2024, 2, 5)).one()
+        moved.time = datetime.time(11, 0)
+        self.session.commit()
+        self.assertEqual(self.expand(weeks=4).created, 0)
+        self.assertEqual(self.expand(weeks=5).created, 1)
+        self.assertEqual(self.dates(hour=10), [datetime.date(2024, 1, 8) + datetime.timedelta(weeks=n) for n in range(4)]
+                         + [datetime.date(2024, 2, 12)])
+        self.assertEqual(self.dates(hour=11), [datetime.date(2024, 2, 5)])
+
+    def test_deleted_occurrence_is_not_recreated(self):
+        self.add(datetime.date(2024, 1, 8), hour=10, weekly=True)
+        self.assertEqual(self.expand(weeks=4).created, 4)
+        self.session.query(Appointment).filter(Appointment.date == datetime.date(2024, 2, 5)).delete()
+        self.session.commit()
+        self.assertEqual(self.expand(weeks=4).created, 0)
+        self.assertEqual(self.expand(weeks=5).created, 1)
+        self.assertEqual(self.dates(hour=10)[-2:], [datetime.date(2024, 1, 29), datetime.date(2024, 2, 12)])
+
+    def test_old_and_past_occurrences_are_not_created(self):
+        self.add(datetime.date(2023, 6, 1), weekly=True)
+        self.add(datetime.date(2023, 12, 20), client_id=2, weekly=True)
+        self.assertEqual(self.expand(weeks=1).created, 2)
+        # 27/12 y 3/1 ya pasaron: se crean desde hoy
+        self.assertEqual(self.dates(client_id=2), [datetime.date(2023, 12, 20), datetime.date(2024, 1, 10),
+                                                   datetime.date(2024, 1, 17)])
+        self.assertEqual(self.dates(client_id=1), [datetime.date(2023, 6, 1)])
+
+    def test_set_based_statements(self):
+        for client_id, day in ((1, datetime.date(2024, 1, 8)), (2, datetime.date(2024, 1, 9))):
+            for hour in range(9, 15):
+                self.add(day, client_id=client_id, hour=hour, weekly=True)
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        self.assertEqual(self.expand(weeks=12).created, 12 * 12)
+        # Alta de las 12 series, un executemany que las enlaza, el INSERT ... SELECT y el avance
+        self.assertEqual(statements, ['INSERT', 'UPDATE', 'WITH', 'WITH'])
+        statements.clear()
+        self.assertEqual(self.expand(weeks=12).created, 0)
+        self.assertEqual(statements, ['INSERT', 'WITH', 'WITH'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations
+from search_index import build_match_query, client_search_subquery, appointment_search_subquery
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+        # Un cliente cargado antes de crear el índice, para probar el 'rebuild'
+        self.session.add(Client(lastname="Pérez", name="Juan", address="Calle 123", phone="1234",
+                                dog_name="Firulais", breed="Caniche", comments="Muerde"))
+        self.session.commit()
+        run_migrations(self.engine)
+        self.session.add(Client(lastname="Gómez", name="María", address="Avenida 456", phone="5678",
+                                dog_name="Luna", breed="Labrador", comments=""))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def search_clients(self, term):
+        matches = client_search_subquery(self.session, term)
+        query = self.session.query(Client).join(matches, matches.c.id == Client.id).order_by(matches.c.rank)
+        return [client.lastname for client in query.all()]
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query("per ju"), '"per"* "ju"*')
+        self.assertEqual(build_match_query('"; DROP'), '"DROP"*')
+        self.assertIsNone(build_match_query("  - "))
+        self.assertEqual(build_match_query("lu", ['dog_name']), '{dog_name} : ("lu"*)')
+
+    def test_prefix_and_accent_insensitive(self):
+        self.assertEqual(self.search_clients("perez"), ["Pérez"])
+        self.assertEqual(self.search_clients("GOM"), ["Gómez"])
+        self.assertEqual(self.search_clients("avenida 45"), ["Gómez"])
+        self.assertEqual(self.search_clients("muer"), ["Pérez"])
+
+    def test_triggers_keep_index_in_sync(self):
+        client = self.session.query(Client).filter_by(lastname="Gómez").one()
+        client.dog_name = "Toby"
+        self.session.commit()
+        self.assertEqual(self.search_clients("luna"), [])
+        self.assertEqual(self.search_clients("toby"), ["Gómez"])
+
+        self.session.delete(client)
+        self.session.commit()
+        self.assertEqual(self.search_clients("toby"), [])
+
+    def test_appointment_search(self):
+        perez = self.session.query(Client).filter_by(lastname="Pérez").one()
+        gomez = self.session.query(Client).filter_by(lastname="Gómez").one()
+        self.session.add_all([
+            Appointment(date=datetime.date(2024, 1, 1), time=datetime.time(9, 0), client_id=perez.id,
+                        status="Baño", appoint_comment="Traer correa"),
+            Appointment(date=datetime.date(2024, 1, 2), time=datetime.time(10, 0), client_id=gomez.id,
+                        status="Corte", appoint_comment="Firulais no viene"),
+        ])
+        self.session.commit()
+
+        def search(term):
+            matches = appointment_search_subquery(self.session, term)
+            query = self.session.query(Appointment).join(matches, matches.c.id == Appointment.id)
+            return sorted(appointment.appoint_comment for appointment in query.all())
+
+        self.assertEqual(search("correa"), ["Traer correa"])
+        self.assertEqual(search("corte"), ["Firulais no viene"])
+        # Coincide por el perro del cliente o por la nota del turno
+        self.assertEqual(search("firu"), ["Firulais no viene", "Traer correa"])
+        # La dirección del cliente no se busca desde los turnos
+        self.assertEqual(search("avenida"), [])
+
+    def test_fallback_without_index(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE clients_fts")
+        self.assertIsNone(client_search_subquery(self.session, "perez"))
+        self.assertIsNone(appointment_search_subquery(self.session, "perez"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import tempfile
+import datetime
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database import Base, Client, Appointment, run_migrations
+from slot_finder import SlotFinder
+
+SETTINGS = {'day_start': '09:00', 'day_end': '13:00', 'bucket_minutes': 15,
+            'appointment_minutes': 60, 'closed_weekdays': [6]}
+
+MONDAY = datetime.date(2024, 1, 8)
+
+
+def at(day, hour, minute=0):
+    return datetime.datetime.combine(day, datetime.time(hour, minute))
+
+
+class TestSlotFinder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'test.db')}")
+        Base.metadata.create_all(self.engine)
+        run_migrations(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.session = self.Session()
+        self.session.add(Client(lastname="Pérez"))
+        self.session.commit()
+        self.finder = SlotFinder(SETTINGS, self.Session)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def book(self, day, hour, minute=0, duration=None):
+        self.session.add(Appointment(date=day, time=datetime.time(hour, minute), client_id=1, duration=duration))
+        self.session.commit()
+
+    def test_free_day_gives_consecutive_non_overlapping_slots(self):
+        self.assertEqual(self.finder.find_free_slots(MONDAY, MONDAY, count=10),
+                         [at(MONDAY, 9), at(MONDAY, 10), at(MONDAY, 11), at(MONDAY, 12)])
+
+    def test_slots_fit_between_appointments(self):
+        self.book(MONDAY, 9)
+        self.book(MONDAY, 10, 30)
+        self.book(MONDAY, 12)
+        # 10:00-10:30 es muy corto; 11:30-12:00 también
+        tuesday = MONDAY + datetime.timedelta(days=1)
+        self.assertEqual(self.finder.find_free_slots(MONDAY, tuesday, count=2), [at(tuesday, 9), at(tuesday, 10)])
+        self.assertEqual(self.finder.find_free_slots(MONDAY, MONDAY, minutes=30), [at(MONDAY, 10), at(MONDAY, 11, 30)])
+
+    def test_each_appointment_occupies_its_duration(self):
+        self.book(MONDAY, 9, duration=90)
+        self.book(MONDAY, 12, 30, duration=15)
+        self.assertEqual(self.finder.find_free_slots(MONDAY, MONDAY, count=3), [at(MONDAY, 10, 30), at(MONDAY, 11, 30)])
+
+    def test_gaps_do_not_cross_days_or_closed_days(self):
+        saturday = MONDAY + datetime.timedelta(days=5)
+        for hour in (9, 10, 11):
+            self.book(saturday, hour)
+        next_monday = MONDAY + datetime.timedelta(days=7)
+        # Sábado 12:00-13:00 libre; domingo cerrado
+        self.assertEqual(self.finder.find_free_slots(saturday, next_monday, count=3, minutes=90),
+                         [at(next_monday, 9), at(next_monday, 10, 30)])
+        self.assertEqual(self.finder.find_free_slots(saturday, next_monday, count=2),
+                         [at(saturday, 12), at(next_monday, 9)])
+
+    def test_past_slots_are_skipped(self):
+        self.assertEqual(self.finder.find_free_slots(MONDAY - datetime.timedelta(days=1), MONDAY, count=2,
+                                                     now=at(MONDAY, 10, 5)),
+                         [at(MONDAY, 10, 15), at(MONDAY, 11, 15)])
+
+    def test_bitmaps_are_reused_until_data_changes(self):
+        end = MONDAY + datetime.timedelta(weeks=8)
+        statements = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        # Versión de datos + una consulta por ventana de scan_days días recorrida
+        self.assertEqual(len(self.finder.find_free_slots(MONDAY, end, count=200)), 196)
+        self.assertEqual(len(statements), 4)
+
+        statements.clear()
+        self.finder.find_free_slots(MONDAY + datetime.timedelta(days=3), end, count=200)
+        self.assertEqual(len(statements), 1)
+
+        self.book(MONDAY, 9)
+        self.assertEqual(self.finder.find_free_slots(MONDAY, end, count=1), [at(MONDAY, 10)])
+
+    def test_eviction_keeps_the_requested_range(self):
+        finder = SlotFinder(SETTINGS, self.Session, max_days=60)
+        self.book(MONDAY + datetime.timedelta(days=45), 9)
+        finder.load_days(self.session, MONDAY, MONDAY + datetime.timedelta(days=49))
+        start, end = MONDAY + datetime.timedelta(days=40), MONDAY + datetime.timedelta(days=60)
+        finder.load_days(self.session, start, end)
+        self.assertEqual(set(finder.days), {start + datetime.timedelta(days=offset) for offset in range(21)})
+        self.assertEqual(finder.range_bitmap(start, end) >> (5 * finder.stride) & finder.day_mask, 0b1111)
+
+    def test_appointment_longer_than_day(self):
+        self.assertEqual(self.finder.find_free_slots(MONDAY, MONDAY, minutes=300), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
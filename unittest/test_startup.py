@@ -0,0 +1,119 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import unittest
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import patch, MagicMock
+from PyQt5.QtWidgets import QApplication, QMainWindow
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtTest import QTest
+
+app = QApplication(sys.argv)
+
+from startup import StartupPipeline
+
+
+class FakeWindow(QMainWindow):
+    first_painted = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.appointment_calendar_widget = MagicMock()
+
+
+class TestStartupPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.threads = {}
+        self.windows = []
+        self.on_database_error = MagicMock(return_value=True)
+
+        def verify(mode):
+            self.threads['integrity_check'] = threading.current_thread().name
+            time.sleep(0.05)
+            return self.healthy
+
+        def auto_backup():
+            self.threads['auto_backup'] = threading.current_thread().name
+
+        self.healthy = True
+        patches = [patch('startup.init_db'), patch('startup.verify_database_integrity', side_effect=verify),
+                   patch('startup.create_auto_backup', side_effect=auto_backup)]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        for window in self.windows:
+            window.close()
+        self.tmp_dir.cleanup()
+
+    def window_factory(self):
+        window = FakeWindow()
+        self.windows.append(window)
+        return window
+
+    def run_pipeline(self):
+        pipeline = StartupPipeline(app, self.window_factory, self.on_database_error, time.perf_counter())
+        pipeline.profile_path = os.path.join(self.tmp_dir.name, 'startup_profile.json')
+        return pipeline, pipeline.run()
+
+    def wait_for_profile(self, pipeline):
+        for _ in range(100):
+            if os.path.exists(pipeline.profile_path):
+                break
+            QTest.qWait(10)
+        with open(pipeline.profile_path, encoding='utf-8') as profile_file:
+            return json.load(profile_file)
+
+    def test_stages_run_in_parallel_and_backup_after_first_paint(self):
+        pipeline, window = self.run_pipeline()
+        self.assertIs(window, self.windows[0])
+        self.assertTrue(window.isVisible())
+        self.assertNotEqual(self.threads['integrity_check'], 'MainThread')
+        self.assertNotIn('auto_backup', self.threads)
+
+        window.first_painted.emit()
+        profile = self.wait_for_profile(pipeline)
+        self.assertNotEqual(self.threads['auto_backup'], 'MainThread')
+        stages = {stage['name']: stage for stage in profile['stages']}
+        self.assertEqual(set(stages), {'init_db', 'integrity_check (auto)', 'main_window', 'first_paint', 'auto_backup'})
+        # La ventana se construye mientras corre la verificación
+        self.assertLess(stages['main_window']['start_ms'], stages['integrity_check (auto)']['end_ms'])
+        self.assertGreaterEqual(stages['auto_backup']['start_ms'], stages['first_paint']['start_ms'])
+        self.on_database_error.assert_not_called()
+
+    def test_failed_check_restores_and_rebuilds_window(self):
+        self.healthy = False
+        pipeline, window = self.run_pipeline()
+        self.on_database_error.assert_called_once()
+        self.assertEqual(len(self.windows), 2)
+        self.assertIs(window, self.windows[1])
+        self.windows[0].appointment_calendar_widget.close.assert_called_once_with()
+
+    def test_failed_restore_stops_startup(self):
+        self.healthy = False
+        self.on_database_error.return_value = False
+        pipeline, window = self.run_pipeline()
+        self.assertIsNone(window)
+        self.assertTrue(os.path.exists(pipeline.profile_path))
+
+    def test_auto_backup_error_only_warns(self):
+        with patch('startup.create_auto_backup', side_effect=OSError("disco lleno")), \
+             patch('startup.QMessageBox') as message_box:
+            pipeline, window = self.run_pipeline()
+            window.first_painted.emit()
+            self.wait_for_profile(pipeline)
+        # Con la ventana en uso no se restaura la base
+        self.on_database_error.assert_not_called()
+        message_box.warning.assert_called_once()
+        self.assertIn("disco lleno", message_box.warning.call_args[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()